@@ -5,7 +5,6 @@ from __future__ import annotations
 import asyncio
 import hashlib
 import re
-import struct
 import time
 from collections.abc import Callable
 from collections.abc import Mapping
@@ -939,20 +938,9 @@ async def handle_osu_login_request(
 
     if not player.restricted:
         # player is unrestricted, two way data
-        for o in app.state.sessions.players:
-            # enqueue us to them
-            o.enqueue(user_data)
-
-            # enqueue them to us.
-            if not o.restricted:
-                if o is app.state.sessions.bot:
-                    # optimization for bot since it's
-                    # the most frequently requested user
-                    data += app.packets.bot_presence(o)
-                    data += app.packets.bot_stats(o)
-                else:
-                    data += app.packets.user_presence(o)
-                    data += app.packets.user_stats(o)
+        # enqueue us to them, and them to us.
+        app.state.sessions.players.enqueue(user_data)
+        data += app.state.sessions.players.roster
 
         # the player may have been sent mail while offline,
         # enqueue any messages from their respective authors.
@@ -1010,16 +998,8 @@ async def handle_osu_login_request(
 
     else:
         # player is restricted, one way data
-        for o in app.state.sessions.players.unrestricted:
-            # enqueue them to us.
-            if o is app.state.sessions.bot:
-                # optimization for bot since it's
-                # the most frequently requested user
-                data += app.packets.bot_presence(o)
-                data += app.packets.bot_stats(o)
-            else:
-                data += app.packets.user_presence(o)
-                data += app.packets.user_stats(o)
+        # enqueue them to us.
+        data += app.state.sessions.players.roster
 
         data += app.packets.account_restricted()
         data += app.packets.send_message(
@@ -1120,17 +1100,7 @@ class SpectateFrames(BasePacket):
 
         # NOTE: this is given a fastpath here for efficiency due to the
         # sheer rate of usage of these packets in spectator mode.
-
-        # data = app.packets.spectateFrames(self.frame_bundle.raw_data)
-        data = (
-            struct.pack("<HxI", 15, len(self.frame_bundle.raw_data))
-            + self.frame_bundle.raw_data
-        )
-
-        # enqueue the data
-        # to all spectators.
-        for spectator in player.spectators:
-            spectator.enqueue(data)
+        player.relay_spectator_frames(self.frame_bundle)
 
 
 @register(ClientPackets.CANT_SPECTATE)
@@ -1308,21 +1278,24 @@ class SendPrivateMessage(BasePacket):
                                 for acc in app.settings.PP_CACHED_ACCURACIES
                             ]
 
-                            results = app.usecases.performance.calculate_performances(
-                                osu_file_path=str(BEATMAPS_PATH / f"{bmap.id}.osu"),
-                                scores=scores,
-                            )
-
-                            resp_msg = " | ".join(
-                                f"{acc}%: {result['performance']['pp']:,.2f}pp"
-                                for acc, result in zip(
-                                    app.settings.PP_CACHED_ACCURACIES,
-                                    results,
+                            try:
+                                results = await app.usecases.performance.engine.calculate(
+                                    osu_file_path=str(BEATMAPS_PATH / f"{bmap.id}.osu"),
+                                    scores=scores,
+                                )
+                            except TimeoutError:
+                                resp_msg = "Performance calculation timed out."
+                            else:
+                                resp_msg = " | ".join(
+                                    f"{acc}%: {result['performance']['pp']:,.2f}pp"
+                                    for acc, result in zip(
+                                        app.settings.PP_CACHED_ACCURACIES,
+                                        results,
+                                    )
                                 )
-                            )
 
-                            elapsed = time.time_ns() - pp_calc_st
-                            resp_msg += f" | Elapsed: {magnitude_fmt_time(elapsed)}"
+                                elapsed = time.time_ns() - pp_calc_st
+                                resp_msg += f" | Elapsed: {magnitude_fmt_time(elapsed)}"
                     else:
                         resp_msg = "Could not find map."
 
@@ -2142,14 +2115,14 @@ class StatsRequest(BasePacket):
         self.user_ids = reader.read_i32_list_i16l()
 
     async def handle(self, player: Player) -> None:
-        unrestrcted_ids = [p.id for p in app.state.sessions.players.unrestricted]
+        unrestricted = app.state.sessions.players.unrestricted
 
-        def is_online(o: int) -> bool:
-            return o in unrestrcted_ids and o != player.id
+        for user_id in self.user_ids:
+            if user_id == player.id:
+                continue
 
-        for online in filter(is_online, self.user_ids):
-            target = app.state.sessions.players.get(id=online)
-            if target:
+            target = app.state.sessions.players.get(id=user_id)
+            if target and target in unrestricted:
                 if target is app.state.sessions.bot:
                     # optimization for bot since it's
                     # the most frequently requested user
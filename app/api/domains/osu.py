@@ -3,7 +3,6 @@
 from __future__ import annotations
 
 import orjson
-import asyncio
 import copy
 from datetime import datetime, timezone
 import hashlib
@@ -11,12 +10,14 @@ import os
 import random
 import secrets
 from collections import defaultdict
+from collections.abc import AsyncIterator
 from collections.abc import Awaitable
 from collections.abc import Callable
 from collections.abc import Mapping
 from enum import IntEnum
 from enum import unique
 from functools import cache
+from functools import partial
 from pathlib import Path as SystemPath
 from typing import Any
 from typing import Literal
@@ -42,6 +43,7 @@ from fastapi.responses import FileResponse
 from fastapi.responses import ORJSONResponse
 from fastapi.responses import RedirectResponse
 from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
 from starlette.datastructures import UploadFile as StarletteUploadFile
 
@@ -75,14 +77,16 @@ from app.repositories import ratings as ratings_repo
 from app.repositories import scores as scores_repo
 from app.repositories import stats as stats_repo
 from app.repositories import users as users_repo
-from app.repositories.achievements import Achievement
-from app.usecases import achievements as achievements_usecases
-from app.usecases import user_achievements as user_achievements_usecases
+from app.state.cache import Leaderboard
+from app.usecases import achievement_engine
+from app.usecases import map_rankings as map_rankings_usecases
+from app.usecases import ranked_scores as ranked_scores_usecases
+from app.usecases import replays as replays_usecases
+from app.usecases import write_behind as write_behind_usecases
 from app.utils import escape_enum
 from app.utils import pymysql_encode
 
 BEATMAPS_PATH = SystemPath.cwd() / ".data/osu"
-REPLAYS_PATH = SystemPath.cwd() / ".data/osr"
 SCREENSHOTS_PATH = SystemPath.cwd() / ".data/ss"
 
 file_path = ".config/caps.json"
@@ -222,6 +226,11 @@ def bancho_to_osuapi_status(bancho_status: int) -> int:
     }[bancho_status]
 
 
+# the number of filenames looked up per query; players with large
+# libraries request info for thousands of maps when opening song select.
+BEATMAP_INFO_CHUNK_SIZE = 1000
+
+
 @router.post("/web/osu-getbeatmapinfo.php")
 async def osuGetBeatmapInfo(
     form_data: models.OsuBeatmapRequestForm,
@@ -230,47 +239,74 @@ async def osuGetBeatmapInfo(
     num_requests = len(form_data.Filenames) + len(form_data.Ids)
     log(f"{player} requested info for {num_requests} maps.", Ansi.LCYAN)
 
-    response_lines: list[str] = []
+    if form_data.Ids:  # still have yet to see this used
+        await app.state.services.log_strange_occurrence(
+            f"{player} requested map(s) info by id ({form_data.Ids})",
+        )
 
-    for idx, map_filename in enumerate(form_data.Filenames):
-        # try getting the map from sql
+    return StreamingResponse(resolve_beatmap_info(form_data.Filenames, player))
 
-        beatmap = await maps_repo.fetch_one(filename=map_filename)
 
-        if not beatmap:
-            continue
+async def resolve_beatmap_info(
+    filenames: list[str],
+    player: Player,
+) -> AsyncIterator[bytes]:
+    """\
+    Resolve the maps requested by filename into beatmap info lines, in
+    chunks of `BEATMAP_INFO_CHUNK_SIZE`, with one query for the chunk's maps
+    & one for the player's grades on them.
+    """
+    # NOTE: osu! only allows us to send back one per gamemode,
+    #       so we've decided to send back *vanilla* grades.
+    #       (in theory we could make this user-customizable)
+    mode = player.status.mode.as_vanilla
+    first_line = True
 
-        # try to get the user's grades on the map
-        # NOTE: osu! only allows us to send back one per gamemode,
-        #       so we've decided to send back *vanilla* grades.
-        #       (in theory we could make this user-customizable)
-        grades = ["N", "N", "N", "N"]
-
-        for score in await scores_repo.fetch_many(
-            map_md5=beatmap["md5"],
-            user_id=player.id,
-            mode=player.status.mode.as_vanilla,
-            status=SubmissionStatus.BEST,
-        ):
-            grades[score["mode"]] = score["grade"]
+    for chunk_start in range(0, len(filenames), BEATMAP_INFO_CHUNK_SIZE):
+        chunk = filenames[chunk_start : chunk_start + BEATMAP_INFO_CHUNK_SIZE]
 
-        response_lines.append(
-            "{i}|{id}|{set_id}|{md5}|{status}|{grades}".format(
-                i=idx,
-                id=beatmap["id"],
-                set_id=beatmap["set_id"],
-                md5=beatmap["md5"],
-                status=bancho_to_osuapi_status(beatmap["status"]),
-                grades="|".join(grades),
-            ),
-        )
+        # filenames are compared case-insensitively by sql
+        beatmaps: dict[str, maps_repo.Map] = {}
+        for beatmap in await maps_repo.fetch_many(filenames=chunk):
+            beatmaps.setdefault(beatmap["filename"].lower(), beatmap)
 
-    if form_data.Ids:  # still have yet to see this used
-        await app.state.services.log_strange_occurrence(
-            f"{player} requested map(s) info by id ({form_data.Ids})",
-        )
+        if not beatmaps:
+            continue
 
-    return Response("\n".join(response_lines).encode())
+        grades = {
+            score["map_md5"]: score["grade"]
+            for score in await scores_repo.fetch_many(
+                map_md5s=[beatmap["md5"] for beatmap in beatmaps.values()],
+                user_id=player.id,
+                mode=mode,
+                status=SubmissionStatus.BEST,
+            )
+        }
+
+        response_lines: list[str] = []
+        for idx, map_filename in enumerate(chunk, start=chunk_start):
+            beatmap = beatmaps.get(map_filename.lower())
+            if beatmap is None:
+                continue
+
+            map_grades = ["N", "N", "N", "N"]
+            map_grades[mode] = grades.get(beatmap["md5"], "N")
+
+            response_lines.append(
+                "{i}|{id}|{set_id}|{md5}|{status}|{grades}".format(
+                    i=idx,
+                    id=beatmap["id"],
+                    set_id=beatmap["set_id"],
+                    md5=beatmap["md5"],
+                    status=bancho_to_osuapi_status(beatmap["status"]),
+                    grades="|".join(map_grades),
+                ),
+            )
+
+        if response_lines:
+            separator = "" if first_line else "\n"
+            yield (separator + "\n".join(response_lines)).encode()
+            first_line = False
 
 
 @router.get("/web/osu-getfavourites.php")
@@ -425,12 +461,27 @@ async def osuSearchHandler(
         # convert to osu!api status
         params["status"] = RankedStatus.from_osudirect(ranked_status).osu_api
 
+    # the default pages (e.g. "Newest") are opened by every user, so the
+    # formatted responses are cached, & concurrent identical searches are
+    # coalesced into a single request to the mirror.
+    response = await app.state.cache.searches.get_or_build(
+        ("search", query, mode, ranked_status, page_num),
+        partial(fetch_direct_search, params),
+    )
+    if response is None:
+        return Response(b"-1\nFailed to retrieve data from the beatmap mirror.")
+
+    return Response(response)
+
+
+async def fetch_direct_search(params: dict[str, Any]) -> bytes | None:
+    """Search the beatmap mirror, formatting the results for osu!direct."""
     response = await app.state.services.http_client.get(
         app.settings.MIRROR_SEARCH_ENDPOINT,
         params=params,
     )
     if response.status_code != status.HTTP_200_OK:
-        return Response(b"-1\nFailed to retrieve data from the beatmap mirror.")
+        return None
 
     result = response.json()
 
@@ -485,7 +536,7 @@ async def osuSearchHandler(
             ),
         )
 
-    return Response("\n".join(ret).encode())
+    return "\n".join(ret).encode()
 
 
 # TODO: video support (needs db change)
@@ -510,6 +561,19 @@ async def osuSearchSetHandler(
     else:
         return Response(b"")  # invalid args
 
+    response = await app.state.cache.searches.get_or_build(
+        ("set", k, v),
+        partial(fetch_direct_set, k, v),
+    )
+    if response is None:
+        # TODO: get from osu!
+        return Response(b"")
+
+    return Response(response)
+
+
+async def fetch_direct_set(k: str, v: int | str) -> bytes | None:
+    """Fetch a beatmap set's info, formatted for osu!direct."""
     # Get all set data.
     bmapset = await app.state.services.database.fetch_one(
         "SELECT DISTINCT set_id, artist, "
@@ -518,19 +582,18 @@ async def osuSearchSetHandler(
         {"v": v},
     )
     if bmapset is None:
-        # TODO: get from osu!
-        return Response(b"")
+        return None
 
     rating = 10.0  # TODO: real data
 
-    return Response(
+    return (
         (
             "{set_id}.osz|{artist}|{title}|{creator}|"
             "{status}|{rating:.1f}|{last_update}|{set_id}|"
             "0|0|0|0|0"
         )
         .format(**bmapset, rating=rating)
-        .encode(),
+        .encode()
     )
     # 0s are threadid, has_vid, has_story, filesize, filesize_novid
 
@@ -582,6 +645,8 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
     ) -> Response:
         """Handle a score submission from an osu! client with an active session."""
 
+        stages = app.metrics.StageTimer("ex_submission_stage_time")
+
         # NOTE: the bancho protocol uses the "score" parameter name for both
         # the base64'ed score data, and the replay file in the multipart
         # starlette/fastapi do not support this, so we've moved it out
@@ -693,6 +758,8 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
             if not score.player.restricted:
                 app.state.sessions.players.enqueue(app.packets.user_stats(score.player))
 
+        stages.lap("validation")
+
         # hold a lock around (check if submitted, submission) to ensure no duplicates
         # are submitted to the database, and potentially award duplicate score/pp/etc.
         async with app.state.score_submission_locks[score.client_checksum]:
@@ -713,7 +780,7 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                 expected_md5=bmap.md5,
             )
             if osu_file_available:
-                score.pp, score.sr = score.calculate_performance(bmap.id)
+                score.pp, score.sr = await score.calculate_performance(bmap.id)
 
                 if score.passed:
                     await score.calculate_status()
@@ -724,6 +791,7 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                     score.status = SubmissionStatus.FAILED
 
             score.time_elapsed = score_time if score.passed else fail_time
+            stages.lap("performance")
         
             score_eligible = score.bmap.awards_ranked_pp and score.passed
             player_eligible = not score.player.priv & Privileges.WHITELISTED and not score.player.restricted
@@ -841,7 +909,10 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                             webhook = Webhook(url=webhook_url)
                             webhook.add_embed(embed)
 
-                            asyncio.create_task(webhook.post())
+                            await write_behind_usecases.pipeline.submit(
+                                "first_place_webhook",
+                                webhook.post,
+                            )
 
                             if app.metrics.enabled:
                                 app.metrics.increment("ex_first_place_webhook")
@@ -894,8 +965,26 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                 },
             )
 
-            pubsub = app.state.services.redis.pubsub()
-            await pubsub.execute_command("PUBLISH", "ex:submit", score.toJSON())
+            if score.status == SubmissionStatus.BEST:
+                app.state.cache.leaderboards.invalidate_map(score.bmap.md5, score.mode)
+
+                if not score.player.restricted:
+                    await map_rankings_usecases.add_score(
+                        score.bmap.md5,
+                        score.mode,
+                        score.player.id,
+                        score.pp if score.mode >= GameMode.RELAX_OSU else score.score,
+                    )
+
+            await write_behind_usecases.pipeline.submit(
+                "publish_score",
+                partial(
+                    app.state.services.redis.publish,
+                    "ex:submit",
+                    score.toJSON(),
+                ),
+            )
+            stages.lap("score")
             
 
         if score.passed:
@@ -904,8 +993,7 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
             MIN_REPLAY_SIZE = 24
 
             if len(replay_data) >= MIN_REPLAY_SIZE:
-                replay_disk_file = REPLAYS_PATH / f"{score.id}.osr"
-                replay_disk_file.write_bytes(replay_data)
+                await replays_usecases.save(score.id, replay_data)
             else:
                 log(f"{score.player} submitted a score without a replay!", Ansi.LRED)
 
@@ -917,6 +1005,8 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                     if score.player.is_online:
                         score.player.logout()
 
+        stages.lap("replay")
+
         """ Update the user's & beatmap's stats """
 
         # get the current stats, and take a
@@ -980,32 +1070,21 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
                 stats.rscore += additional_rscore
                 stats_updates["rscore"] = stats.rscore
 
-                # fetch scores sorted by pp for total acc/pp calc
-                # NOTE: we select all plays (and not just top100)
-                # because bonus pp counts the total amount of ranked
-                # scores. I'm aware this scales horribly, and it'll
-                # likely be split into two queries in the future.
-                best_scores = await app.state.services.database.fetch_all(
-                    "SELECT s.pp, s.acc FROM scores s "
-                    "INNER JOIN maps m ON s.map_md5 = m.md5 "
-                    "WHERE s.userid = :user_id AND s.mode = :mode "
-                    "AND s.status = 2 AND m.status IN (2, 3) "  # ranked, approved
-                    "ORDER BY s.pp DESC",
-                    {"user_id": score.player.id, "mode": score.mode},
+                # update our top ranked scores with the new best,
+                # and recalculate our total weighted acc & pp from them.
+                ranked_scores = await ranked_scores_usecases.update_best_score(
+                    score.player.id,
+                    score.mode,
+                    score.id,
+                    score.pp,
+                    score.acc,
+                    prev_best_id=score.prev_best.id if score.prev_best else None,
                 )
 
-                # calculate new total weighted accuracy
-                weighted_acc = sum(
-                    row["acc"] * 0.95**i for i, row in enumerate(best_scores)
-                )
-                bonus_acc = 100.0 / (20 * (1 - 0.95 ** len(best_scores)))
-                stats.acc = (weighted_acc * bonus_acc) / 100
+                stats.acc = ranked_scores.acc
                 stats_updates["acc"] = stats.acc
 
-                # calculate new total weighted pp
-                weighted_pp = sum(row["pp"] * 0.95**i for i, row in enumerate(best_scores))
-                bonus_pp = 416.6667 * (1 - 0.9994 ** len(best_scores))
-                stats.pp = round(weighted_pp + bonus_pp)
+                stats.pp = ranked_scores.pp
                 stats_updates["pp"] = stats.pp
 
                 # update global & country ranking
@@ -1038,18 +1117,16 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
             if score.passed:
                 score.bmap.passes += 1
 
-            await app.state.services.database.execute(
-                "UPDATE maps SET plays = :plays, passes = :passes WHERE md5 = :map_md5",
-                {
-                    "plays": score.bmap.plays,
-                    "passes": score.bmap.passes,
-                    "map_md5": score.bmap.md5,
-                },
-            )
+            write_behind_usecases.pipeline.add_map_play(score.bmap.md5, score.passed)
 
         # update their recent score
         score.player.recent_scores[score.mode] = score
 
+        # a scrim may be awaiting this score to update its match points
+        if score.player.match is not None:
+            score.player.match.add_submitted_score(score)
+        stages.lap("stats")
+
         """ score submission charts """
 
         # charts are only displayed for passes vanilla gamemodes.
@@ -1058,33 +1135,10 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
         else:
             # construct and send achievements & ranking charts to the client
             if score.bmap.awards_ranked_pp and not score.player.restricted:
-                unlocked_achievements: list[Achievement] = []
-
-                server_achievements = await achievements_usecases.fetch_many()
-                player_achievements = await user_achievements_usecases.fetch_many(
-                    user_id=score.player.id,
-                )
-
-                for server_achievement in server_achievements:
-                    player_unlocked_achievement = any(
-                        player_achievement
-                        for player_achievement in player_achievements
-                        if player_achievement["achid"] == server_achievement["id"]
-                    )
-                    if player_unlocked_achievement:
-                        # player already has this achievement.
-                        continue
-
-                    achievement_condition = server_achievement["cond"]
-                    if achievement_condition(score, score.mode.as_vanilla):
-                        await user_achievements_usecases.create(
-                            score.player.id,
-                            server_achievement["id"],
-                        )
-                        unlocked_achievements.append(server_achievement)
+                unlocked_achievements = await achievement_engine.engine.unlock(score)
 
                 achievements_str = "/".join(
-                    format_achievement_string(a["file"], a["name"], a["desc"])
+                    format_achievement_string(a.file, a.name, a.desc)
                     for a in unlocked_achievements
                 )
             else:
@@ -1156,6 +1210,8 @@ if(not app.settings.DISALLOW_OLD_CLIENTS):
             Ansi.LGREEN,
         )
 
+        stages.lap("charts")
+
         return Response(response)
 
 
@@ -1187,6 +1243,8 @@ async def osuSubmitModularSelector(
         stacktrace = app.utils.get_appropriate_stacktrace()
         await app.state.services.log_strange_occurrence(stacktrace)
 
+    stages = app.metrics.StageTimer("ex_submission_stage_time")
+
     # NOTE: the bancho protocol uses the "score" parameter name for both
     # the base64'ed score data, and the replay file in the multipart
     # starlette/fastapi do not support this, so we've moved it out
@@ -1303,6 +1361,8 @@ async def osuSubmitModularSelector(
         if not score.player.restricted:
             app.state.sessions.players.enqueue(app.packets.user_stats(score.player))
 
+    stages.lap("validation")
+
     # hold a lock around (check if submitted, submission) to ensure no duplicates
     # are submitted to the database, and potentially award duplicate score/pp/etc.
     async with app.state.score_submission_locks[score.client_checksum]:
@@ -1323,7 +1383,7 @@ async def osuSubmitModularSelector(
             expected_md5=bmap.md5,
         )
         if osu_file_available:
-            score.pp, score.sr = score.calculate_performance(bmap.id)
+            score.pp, score.sr = await score.calculate_performance(bmap.id)
 
             if score.passed:
                 await score.calculate_status()
@@ -1334,6 +1394,7 @@ async def osuSubmitModularSelector(
                 score.status = SubmissionStatus.FAILED
 
         score.time_elapsed = score_time if score.passed else fail_time
+        stages.lap("performance")
         score_eligible = score.bmap.awards_ranked_pp and score.passed
         player_eligible = not score.player.priv & Privileges.WHITELISTED and not score.player.restricted
         if score_eligible and player_eligible and capData["enabled"]:
@@ -1449,7 +1510,10 @@ async def osuSubmitModularSelector(
                         webhook = Webhook(url=webhook_url)
                         webhook.add_embed(embed)
 
-                        asyncio.create_task(webhook.post())
+                        await write_behind_usecases.pipeline.submit(
+                            "first_place_webhook",
+                            webhook.post,
+                        )
 
                         if app.metrics.enabled:
                             app.metrics.increment("ex_first_place_webhook")
@@ -1503,8 +1567,26 @@ async def osuSubmitModularSelector(
             },
         )
 
-        pubsub = app.state.services.redis.pubsub()
-        await pubsub.execute_command("PUBLISH", "ex:submit", score.toJSON())
+        if score.status == SubmissionStatus.BEST:
+            app.state.cache.leaderboards.invalidate_map(score.bmap.md5, score.mode)
+
+            if not score.player.restricted:
+                await map_rankings_usecases.add_score(
+                    score.bmap.md5,
+                    score.mode,
+                    score.player.id,
+                    score.pp if score.mode >= GameMode.RELAX_OSU else score.score,
+                )
+
+        await write_behind_usecases.pipeline.submit(
+            "publish_score",
+            partial(
+                app.state.services.redis.publish,
+                "ex:submit",
+                score.toJSON(),
+            ),
+        )
+        stages.lap("score")
         
     if score.passed:
         replay_data = await replay_file.read()
@@ -1512,8 +1594,7 @@ async def osuSubmitModularSelector(
         MIN_REPLAY_SIZE = 24
 
         if len(replay_data) >= MIN_REPLAY_SIZE:
-            replay_disk_file = REPLAYS_PATH / f"{score.id}.osr"
-            replay_disk_file.write_bytes(replay_data)
+            await replays_usecases.save(score.id, replay_data)
         else:
             log(f"{score.player} submitted a score without a replay!", Ansi.LRED)
 
@@ -1525,6 +1606,8 @@ async def osuSubmitModularSelector(
                 if score.player.is_online:
                     score.player.logout()
 
+    stages.lap("replay")
+
     """ Update the user's & beatmap's stats """
 
     # get the current stats, and take a
@@ -1588,32 +1671,21 @@ async def osuSubmitModularSelector(
             stats.rscore += additional_rscore
             stats_updates["rscore"] = stats.rscore
 
-            # fetch scores sorted by pp for total acc/pp calc
-            # NOTE: we select all plays (and not just top100)
-            # because bonus pp counts the total amount of ranked
-            # scores. I'm aware this scales horribly, and it'll
-            # likely be split into two queries in the future.
-            best_scores = await app.state.services.database.fetch_all(
-                "SELECT s.pp, s.acc FROM scores s "
-                "INNER JOIN maps m ON s.map_md5 = m.md5 "
-                "WHERE s.userid = :user_id AND s.mode = :mode "
-                "AND s.status = 2 AND m.status IN (2, 3) "  # ranked, approved
-                "ORDER BY s.pp DESC",
-                {"user_id": score.player.id, "mode": score.mode},
+            # update our top ranked scores with the new best,
+            # and recalculate our total weighted acc & pp from them.
+            ranked_scores = await ranked_scores_usecases.update_best_score(
+                score.player.id,
+                score.mode,
+                score.id,
+                score.pp,
+                score.acc,
+                prev_best_id=score.prev_best.id if score.prev_best else None,
             )
 
-            # calculate new total weighted accuracy
-            weighted_acc = sum(
-                row["acc"] * 0.95**i for i, row in enumerate(best_scores)
-            )
-            bonus_acc = 100.0 / (20 * (1 - 0.95 ** len(best_scores)))
-            stats.acc = (weighted_acc * bonus_acc) / 100
+            stats.acc = ranked_scores.acc
             stats_updates["acc"] = stats.acc
 
-            # calculate new total weighted pp
-            weighted_pp = sum(row["pp"] * 0.95**i for i, row in enumerate(best_scores))
-            bonus_pp = 416.6667 * (1 - 0.9994 ** len(best_scores))
-            stats.pp = round(weighted_pp + bonus_pp)
+            stats.pp = ranked_scores.pp
             stats_updates["pp"] = stats.pp
 
             # update global & country ranking
@@ -1646,18 +1718,16 @@ async def osuSubmitModularSelector(
         if score.passed:
             score.bmap.passes += 1
 
-        await app.state.services.database.execute(
-            "UPDATE maps SET plays = :plays, passes = :passes WHERE md5 = :map_md5",
-            {
-                "plays": score.bmap.plays,
-                "passes": score.bmap.passes,
-                "map_md5": score.bmap.md5,
-            },
-        )
+        write_behind_usecases.pipeline.add_map_play(score.bmap.md5, score.passed)
 
     # update their recent score
     score.player.recent_scores[score.mode] = score
 
+    # a scrim may be awaiting this score to update its match points
+    if score.player.match is not None:
+        score.player.match.add_submitted_score(score)
+    stages.lap("stats")
+
     """ score submission charts """
 
     # charts are only displayed for passes vanilla gamemodes.
@@ -1666,21 +1736,10 @@ async def osuSubmitModularSelector(
     else:
         # construct and send achievements & ranking charts to the client
         if score.bmap.awards_ranked_pp and not score.player.restricted:
-            unlocked_achievements: list[Achievement] = []
-
-            locked_achievements = await achievements_usecases.fetch_user_locked(user_id=score.player.id)
-
-            for server_achievement in locked_achievements:
-                achievement_condition = server_achievement["cond"]
-                if achievement_condition(score, score.mode.as_vanilla):
-                    await user_achievements_usecases.create(
-                        score.player.id,
-                        server_achievement["id"],
-                    )
-                    unlocked_achievements.append(server_achievement)
+            unlocked_achievements = await achievement_engine.engine.unlock(score)
 
             achievements_str = "/".join(
-                format_achievement_string(a["file"], a["name"], a["desc"])
+                format_achievement_string(a.file, a.name, a.desc)
                 for a in unlocked_achievements
             )
         else:
@@ -1752,6 +1811,8 @@ async def osuSubmitModularSelector(
         Ansi.LGREEN,
     )
 
+    stages.lap("charts")
+
     return Response(response)
 
 
@@ -1765,8 +1826,8 @@ async def getReplay(
     if not score:
         return Response(b"", status_code=404)
 
-    file = REPLAYS_PATH / f"{score_id}.osr"
-    if not file.exists():
+    file = await replays_usecases.find(score_id)
+    if file is None:
         return Response(b"", status_code=404)
 
     # increment replay views for this score
@@ -1820,20 +1881,28 @@ class LeaderboardType(IntEnum):
     Country = 4
 
 
-async def get_leaderboard_scores(
+LEADERBOARD_SIZE = 50
+
+LEADERBOARD_COLUMNS = (
+    "s.max_combo, s.n50, s.n100, s.n300, "
+    "s.nmiss, s.nkatu, s.ngeki, s.perfect, s.mods, "
+    "UNIX_TIMESTAMP(s.play_time) time, u.id userid, u.country, "
+    "COALESCE(CONCAT('[', c.tag, '] ', u.name), u.name) AS name "
+)
+
+
+async def _fetch_leaderboard_scores_from_sql(
     leaderboard_type: LeaderboardType | int,
     map_md5: str,
     mode: int,
     mods: Mods,
     player: Player,
     scoring_metric: Literal["pp", "score"],
-) -> tuple[list[dict[str, Any]], dict[str, Any] | None]:
+    limit: int = LEADERBOARD_SIZE,
+) -> list[dict[str, Any]]:
     query = [
         f"SELECT s.id, s.{scoring_metric} AS _score, "
-        "s.max_combo, s.n50, s.n100, s.n300, "
-        "s.nmiss, s.nkatu, s.ngeki, s.perfect, s.mods, "
-        "UNIX_TIMESTAMP(s.play_time) time, u.id userid, "
-        "COALESCE(CONCAT('[', c.tag, '] ', u.name), u.name) AS name "
+        f"{LEADERBOARD_COLUMNS}"
         "FROM scores s "
         "INNER JOIN users u ON u.id = s.userid "
         "LEFT JOIN clans c ON c.id = u.clan_id "
@@ -1845,6 +1914,7 @@ async def get_leaderboard_scores(
         "map_md5": map_md5,
         "user_id": player.id,
         "mode": mode,
+        "limit": limit,
     }
 
     if leaderboard_type == LeaderboardType.Mods:
@@ -1857,49 +1927,173 @@ async def get_leaderboard_scores(
         query.append("AND u.country = :country")
         params["country"] = player.geoloc["country"]["acronym"]
 
-    # TODO: customizability of the number of scores
-    query.append("ORDER BY _score DESC LIMIT 50")
+    query.append("ORDER BY _score DESC LIMIT :limit")
 
-    score_rows = await app.state.services.database.fetch_all(
+    return await app.state.services.database.fetch_all(
         " ".join(query),
         params,
     )
 
-    if score_rows:  # None or []
-        # fetch player's personal best score
-        personal_best_score_row = await app.state.services.database.fetch_one(
-            f"SELECT id, {scoring_metric} AS _score, "
-            "max_combo, n50, n100, n300, "
-            "nmiss, nkatu, ngeki, perfect, mods, "
-            "UNIX_TIMESTAMP(play_time) time "
-            "FROM scores "
-            "WHERE map_md5 = :map_md5 AND mode = :mode "
-            "AND userid = :user_id AND status = 2 "
-            "ORDER BY _score DESC LIMIT 1",
-            {"map_md5": map_md5, "mode": mode, "user_id": player.id},
+
+async def _fetch_personal_best_from_sql(
+    map_md5: str,
+    mode: int,
+    player: Player,
+    scoring_metric: Literal["pp", "score"],
+) -> dict[str, Any] | None:
+    personal_best_score_row = await app.state.services.database.fetch_one(
+        f"SELECT id, {scoring_metric} AS _score, "
+        "max_combo, n50, n100, n300, "
+        "nmiss, nkatu, ngeki, perfect, mods, "
+        "UNIX_TIMESTAMP(play_time) time "
+        "FROM scores "
+        "WHERE map_md5 = :map_md5 AND mode = :mode "
+        "AND userid = :user_id AND status = 2 "
+        "ORDER BY _score DESC LIMIT 1",
+        {"map_md5": map_md5, "mode": mode, "user_id": player.id},
+    )
+
+    if personal_best_score_row is not None:
+        # calculate the rank of the score.
+        p_best_rank = 1 + await map_rankings_usecases.count_better_scores(
+            map_md5,
+            GameMode(mode),
+            personal_best_score_row["_score"],
         )
 
-        if personal_best_score_row is not None:
-            # calculate the rank of the score.
-            p_best_rank = 1 + await app.state.services.database.fetch_val(
-                "SELECT COUNT(*) FROM scores s "
-                "INNER JOIN users u ON u.id = s.userid "
-                "WHERE s.map_md5 = :map_md5 AND s.mode = :mode "
-                "AND s.status = 2 AND u.priv & 1 "
-                f"AND s.{scoring_metric} > :score",
-                {
-                    "map_md5": map_md5,
-                    "mode": mode,
-                    "score": personal_best_score_row["_score"],
-                },
-                column=0,  # COUNT(*)
+        # attach rank to personal best row
+        personal_best_score_row["rank"] = p_best_rank
+
+    return personal_best_score_row
+
+
+async def _fetch_cached_leaderboard(
+    map_md5: str,
+    mode: int,
+    player: Player,
+    scoring_metric: Literal["pp", "score"],
+) -> Leaderboard:
+    key = (map_md5, mode, scoring_metric)
+
+    leaderboard = app.state.cache.leaderboards.get(key)
+    if leaderboard is None:
+        generation = app.state.cache.leaderboards.generation
+        depth = max(app.settings.LEADERBOARD_CACHE_DEPTH, LEADERBOARD_SIZE)
+
+        # (player is unrestricted, so only their
+        # own scores are shown to them as usual)
+        score_rows = await _fetch_leaderboard_scores_from_sql(
+            LeaderboardType.Top,
+            map_md5,
+            mode,
+            Mods.NOMOD,
+            player,
+            scoring_metric,
+            limit=depth,
+        )
+
+        leaderboard = Leaderboard(
+            scores=score_rows,
+            complete=len(score_rows) < depth,
+        )
+        app.state.cache.leaderboards.add(key, leaderboard, generation)
+
+    return leaderboard
+
+
+async def get_leaderboard_scores(
+    leaderboard_type: LeaderboardType | int,
+    map_md5: str,
+    mode: int,
+    mods: Mods,
+    player: Player,
+    scoring_metric: Literal["pp", "score"],
+) -> tuple[list[dict[str, Any]], dict[str, Any] | None]:
+    if player.restricted:
+        # restricted players see their own scores on the
+        # leaderboards, which the cached leaderboards exclude.
+        score_rows = await _fetch_leaderboard_scores_from_sql(
+            leaderboard_type,
+            map_md5,
+            mode,
+            mods,
+            player,
+            scoring_metric,
+        )
+        if not score_rows:
+            return [], None
+
+        personal_best_score_row = await _fetch_personal_best_from_sql(
+            map_md5,
+            mode,
+            player,
+            scoring_metric,
+        )
+        return score_rows, personal_best_score_row
+
+    leaderboard = await _fetch_cached_leaderboard(
+        map_md5,
+        mode,
+        player,
+        scoring_metric,
+    )
+
+    if leaderboard_type in (
+        LeaderboardType.Mods,
+        LeaderboardType.Friends,
+        LeaderboardType.Country,
+    ):
+        if leaderboard_type == LeaderboardType.Mods:
+            score_rows = [s for s in leaderboard.scores if s["mods"] == mods]
+        elif leaderboard_type == LeaderboardType.Friends:
+            friends = player.friends | {player.id}
+            score_rows = [s for s in leaderboard.scores if s["userid"] in friends]
+        else:  # leaderboard_type == LeaderboardType.Country
+            country = player.geoloc["country"]["acronym"]
+            score_rows = [s for s in leaderboard.scores if s["country"] == country]
+
+        # the filtered scores are only the true leaderboard if we
+        # have them all, or found enough within the top scores.
+        if len(score_rows) < LEADERBOARD_SIZE and not leaderboard.complete:
+            score_rows = await _fetch_leaderboard_scores_from_sql(
+                leaderboard_type,
+                map_md5,
+                mode,
+                mods,
+                player,
+                scoring_metric,
             )
+        else:
+            score_rows = score_rows[:LEADERBOARD_SIZE]
+    else:
+        score_rows = leaderboard.scores[:LEADERBOARD_SIZE]
 
-            # attach rank to personal best row
-            personal_best_score_row["rank"] = p_best_rank
+    if not score_rows:
+        return [], None
+
+    # find the player's personal best & its rank
+    # on the cached leaderboard, if it's there.
+    for score_row in leaderboard.scores:
+        if score_row["userid"] == player.id:
+            personal_best_score_row = {
+                k: v
+                for k, v in score_row.items()
+                if k not in ("userid", "country", "name")
+            }
+            personal_best_score_row["rank"] = 1 + sum(
+                1 for s in leaderboard.scores if s["_score"] > score_row["_score"]
+            )
+            break
     else:
-        score_rows = []
-        personal_best_score_row = None
+        if leaderboard.complete:
+            personal_best_score_row = None
+        else:
+            personal_best_score_row = await _fetch_personal_best_from_sql(
+                map_md5,
+                mode,
+                player,
+                scoring_metric,
+            )
 
     return score_rows, personal_best_score_row
 
@@ -2022,7 +2216,6 @@ async def getScores(
         return Response(f"{int(bmap.status)}|false".encode())
 
     # fetch scores & personal best
-    # TODO: create a leaderboard cache
     if not requesting_from_editor_song_select:
         score_rows, personal_best_score_row = await get_leaderboard_scores(
             leaderboard_type,
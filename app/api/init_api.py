@@ -7,6 +7,7 @@ import pprint
 import sys
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from pathlib import Path
 from typing import Any
 
 from app import metrics
@@ -29,6 +30,9 @@ from .start import *
 import app.bg_loops
 import app.settings
 import app.state
+import app.usecases.achievement_engine
+import app.usecases.performance
+import app.usecases.write_behind
 import app.utils
 from app.api import api_router  # type: ignore[attr-defined]
 from app.api import domains
@@ -113,9 +117,15 @@ async def lifespan(asgi_app: BanchoAPI) -> AsyncIterator[None]:
 
     app.state.services.ip_resolver = app.state.services.IPResolver()
 
+    if app.settings.GEOLOCATION_DATABASE_PATH:
+        await app.state.services.geoloc_resolver.load_database(
+            Path(app.settings.GEOLOCATION_DATABASE_PATH),
+        )
+
     await app.state.services.run_sql_migrations()
 
     await collections.initialize_ram_caches()
+    await app.usecases.achievement_engine.engine.reload()
 
     await app.bg_loops.initialize_housekeeping_tasks()
 
@@ -131,8 +141,13 @@ async def lifespan(asgi_app: BanchoAPI) -> AsyncIterator[None]:
     # and shut down any of the housekeeping tasks running in the background.
     await app.state.sessions.cancel_housekeeping_tasks()
 
+    # finish any writes which were deferred to the background.
+    await app.usecases.write_behind.pipeline.shutdown()
+
     # shutdown services
 
+    app.usecases.performance.engine.shutdown()
+
     await app.state.services.http_client.aclose()
     await app.state.services.database.disconnect()
     await app.state.services.redis.aclose()
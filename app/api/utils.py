@@ -1,5 +1,8 @@
 import time
 import app
+import app.usecases.map_rankings
+import app.usecases.player_rankings
+import app.usecases.ranked_scores
 from app.constants.gamemodes import GameMode
 from app.constants.privileges import Privileges
 from app.objects.beatmap import Beatmap, ensure_osu_file_is_available
@@ -25,8 +28,12 @@ async def wipe_user(id: int, mode: GameMode) -> str:
     if not target:
         return "user not found"
     
+    await app.usecases.map_rankings.remove_user(id, GameMode(mode))
     await app.state.services.database.execute("DELETE FROM scores WHERE userid = :user_id AND mode = :mode",
         {"user_id": id, "mode": mode},)
+    await app.usecases.ranked_scores.invalidate(id, mode)
+    app.state.cache.leaderboards.invalidate_user(id)
+    app.state.cache.replay_headers.invalidate_user(id)
     
     await app.state.services.database.execute(
         """
@@ -75,14 +82,10 @@ async def wipe_user(id: int, mode: GameMode) -> str:
         return "unknown user id"
     
 
-    await app.state.services.redis.zrem(
-        f"bancho:leaderboard:{mode}",
-        str(id),
-    )
-
-    await app.state.services.redis.zrem(
-        f"bancho:leaderboard:{mode}:{user_info['country']}",
-        str(id),
+    await app.usecases.player_rankings.remove(
+        id,
+        user_info["country"],
+        (GameMode(mode),),
     )
 
     return "success"
@@ -91,6 +94,10 @@ async def change_user_flag(id: int, flag: str) -> str:
     target = await app.state.sessions.players.from_cache_or_sql(id=id)
     if not target:
         return "user not found"
+
+    country_code = flag.lower()
+    if country_code not in app.state.services.country_codes:
+        return "invalid country code"
     
     countryBefore = await app.state.services.database.fetch_one(
         "SELECT country FROM users WHERE id = :id",
@@ -99,24 +106,31 @@ async def change_user_flag(id: int, flag: str) -> str:
 
     await app.state.services.database.execute(
         "UPDATE users SET country = :country WHERE id = :user_id",
-        {"country": flag.lower(), "user_id": id},
+        {"country": country_code, "user_id": id},
     )
+    app.state.cache.leaderboards.invalidate_user(id)
+
+    # geolocations may be shared between players, so replace theirs
+    target.geoloc = {
+        **target.geoloc,
+        "country": {
+            "acronym": country_code,
+            "numeric": app.state.services.country_codes[country_code],
+        },
+    }
 
-    for mode in GameMode:
-        modequery = await app.state.services.database.fetch_one(
-            "SELECT pp FROM stats WHERE id = :id AND mode = :mode",
-            {"id": id, "mode": mode},
-        ) 
-
-        key = f"bancho:leaderboard:{mode}:{countryBefore['country']}"
-        if await app.state.services.redis.zscore(key, str(id)) is not None:
-            await app.state.services.redis.zrem(key, str(id))
-
-        if modequery:
-            if modequery["pp"] == 0:
-                continue
-            newkey = f"bancho:leaderboard:{mode}:{flag.lower()}"
-            await app.state.services.redis.zadd(newkey, {str(id): modequery["pp"]})
+    await app.usecases.player_rankings.remove(id, countryBefore["country"])
+
+    stats_rows = await app.state.services.database.fetch_all(
+        "SELECT mode, pp FROM stats WHERE id = :id AND pp != 0",
+        {"id": id},
+    )
+    if stats_rows and not target.restricted:
+        await app.usecases.player_rankings.update(
+            id,
+            country_code,
+            {GameMode(row["mode"]): row["pp"] for row in stats_rows},
+        )
             
     return "success"
 
@@ -129,8 +143,11 @@ async def change_user_name(id: int, name: str) -> str:
         "UPDATE users SET name = :name WHERE id = :user_id",
         {"name": name, "user_id": id},
     )
+    app.state.cache.leaderboards.invalidate_user(id)
+    app.state.cache.replay_headers.invalidate_user(id)
 
     target.name = name
+    app.state.sessions.players.reindex(target)
 
     if target.is_online:
         target.logout()
@@ -155,6 +172,9 @@ async def change_bm_status(beatmap_id: int, status: int, frozen: bool) -> str:
     beatmap.status = status
     beatmap.frozen = frozen
 
+    # scores on the map may have become (un)ranked
+    await app.usecases.ranked_scores.invalidate_all()
+
     return "success"
 
 async def restrict(id: int, userId: int, reason: str) -> str:
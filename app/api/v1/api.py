@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import struct
+from collections.abc import AsyncIterator
+from collections.abc import Mapping
 from pathlib import Path as SystemPath
+from typing import Any
 from typing import Literal
 from urllib.parse import quote
 
@@ -12,14 +16,18 @@ from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import status
 from fastapi.param_functions import Query
+from fastapi.responses import FileResponse
 from fastapi.responses import ORJSONResponse
 from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials as HTTPCredentials
 from fastapi.security import HTTPBearer
 
 import app.packets
 import app.state
 import app.usecases.performance
+import app.usecases.player_rankings
+import app.usecases.replays
 from app.constants import regexes
 from app.constants.gamemodes import GameMode
 from app.constants.mods import Mods
@@ -31,11 +39,11 @@ from app.repositories import stats as stats_repo
 from app.repositories import tourney_pool_maps as tourney_pool_maps_repo
 from app.repositories import tourney_pools as tourney_pools_repo
 from app.repositories import users as users_repo
+from app.state.cache import ReplayHeader
 from app.usecases.performance import ScoreParams
 
 AVATARS_PATH = SystemPath.cwd() / ".data/avatars"
 BEATMAPS_PATH = SystemPath.cwd() / ".data/osu"
-REPLAYS_PATH = SystemPath.cwd() / ".data/osr"
 SCREENSHOTS_PATH = SystemPath.cwd() / ".data/ss"
 
 
@@ -125,10 +133,16 @@ async def api_calculate_pp(
             ),
         )
 
-    results = app.usecases.performance.calculate_performances(
-        str(BEATMAPS_PATH / f"{beatmap.id}.osu"),
-        scores,
-    )
+    try:
+        results = await app.usecases.performance.engine.calculate(
+            str(BEATMAPS_PATH / f"{beatmap.id}.osu"),
+            scores,
+        )
+    except TimeoutError:
+        return ORJSONResponse(
+            {"status": "Performance calculation timed out."},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
 
     # "Inject" the accuracy into the list of results
     final_results = [
@@ -199,7 +213,7 @@ async def api_get_player_count() -> Response:
             "status": "success",
             "counts": {
                 # -1 for the bot, who is always online
-                "online": len(app.state.sessions.players.unrestricted) - 1,
+                "online": app.state.sessions.players.unrestricted_count - 1,
                 "total": await users_repo.fetch_count(),
             },
         },
@@ -247,15 +261,15 @@ async def api_get_player_info(
         # get all stats
         all_stats = await stats_repo.fetch_many(player_id=resolved_user_id)
 
+        # get all ranks in one round-trip
+        all_ranks = await app.usecases.player_rankings.fetch(
+            resolved_user_id,
+            resolved_country,
+            (GameMode(mode_stats["mode"]) for mode_stats in all_stats),
+        )
+
         for mode_stats in all_stats:
-            rank = await app.state.services.redis.zrevrank(
-                f"bancho:leaderboard:{mode_stats['mode']}",
-                str(resolved_user_id),
-            )
-            country_rank = await app.state.services.redis.zrevrank(
-                f"bancho:leaderboard:{mode_stats['mode']}:{resolved_country}",
-                str(resolved_user_id),
-            )
+            ranks = all_ranks[GameMode(mode_stats["mode"])]
 
             # NOTE: this dict-like return is intentional.
             #       but quite cursed.
@@ -278,8 +292,8 @@ async def api_get_player_info(
                 "s_count": mode_stats["s_count"],
                 "a_count": mode_stats["a_count"],
                 # extra fields are added to the api response
-                "rank": rank + 1 if rank is not None else 0,
-                "country_rank": country_rank + 1 if country_rank is not None else 0,
+                "rank": ranks.global_rank,
+                "country_rank": ranks.country_rank,
             }
 
     return ORJSONResponse({"status": "success", "player": api_data})
@@ -762,42 +776,79 @@ async def api_get_replay(
     the player's total replay views.
     """
     # fetch replay file & make sure it exists
-    replay_file = REPLAYS_PATH / f"{score_id}.osr"
-    if not replay_file.exists():
+    replay_file = await app.usecases.replays.find(score_id)
+    if replay_file is None:
         return ORJSONResponse(
             {"status": "Replay not found."},
             status_code=status.HTTP_404_NOT_FOUND,
         )
-    # read replay frames from file
-    raw_replay_data = replay_file.read_bytes()
     if not include_headers:
-        return Response(
-            bytes(raw_replay_data),
+        return FileResponse(
+            replay_file,
             media_type="application/octet-stream",
             headers={
                 "Content-Description": "File Transfer",
                 "Content-Disposition": "attachment; filename=\"replay.osr\"",
             },
         )
-    # add replay headers from sql
-    row = await app.state.services.database.fetch_one(
-        "SELECT u.name username, m.md5 map_md5, "
-        "m.artist, m.title, m.version, "
-        "s.mode, s.n300, s.n100, s.n50, s.ngeki, "
-        "s.nkatu, s.nmiss, s.score, s.max_combo, "
-        "s.perfect, s.mods, s.play_time "
-        "FROM scores s "
-        "INNER JOIN users u ON u.id = s.userid "
-        "INNER JOIN maps m ON m.md5 = s.map_md5 "
-        "WHERE s.id = :score_id",
-        {"score_id": score_id},
-    )
-    if not row:
-        # score not found in sql
-        return ORJSONResponse(
-            {"status": "Score not found."},
-            status_code=status.HTTP_404_NOT_FOUND,
+    header = app.state.cache.replay_headers.get(score_id)
+    if header is None:
+        generation = app.state.cache.replay_headers.generation
+
+        # add replay headers from sql
+        row = await app.state.services.database.fetch_one(
+            "SELECT s.userid, u.name username, m.md5 map_md5, "
+            "m.artist, m.title, m.version, "
+            "s.mode, s.n300, s.n100, s.n50, s.ngeki, "
+            "s.nkatu, s.nmiss, s.score, s.max_combo, "
+            "s.perfect, s.mods, s.play_time "
+            "FROM scores s "
+            "INNER JOIN users u ON u.id = s.userid "
+            "INNER JOIN maps m ON m.md5 = s.map_md5 "
+            "WHERE s.id = :score_id",
+            {"score_id": score_id},
         )
+        if not row:
+            # score not found in sql
+            return ORJSONResponse(
+                {"status": "Score not found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        header = ReplayHeader(
+            user_id=row["userid"],
+            map_md5=row["map_md5"],
+            data=encode_replay_header(row),
+            content_disposition=format_filename_rfc5987(row),
+        )
+        app.state.cache.replay_headers.add(score_id, header, generation)
+
+    replay_size = (await asyncio.to_thread(replay_file.stat)).st_size
+
+    async def stream_replay() -> AsyncIterator[bytes]:
+        yield header.data + struct.pack("<i", replay_size)
+
+        # pack the raw replay data, without buffering the whole file
+        async for chunk in app.usecases.replays.iter_chunks(replay_file):
+            yield chunk
+
+        # pack additional info buffer
+        yield struct.pack("<q", score_id)
+
+    # stream data back to the client
+    return StreamingResponse(
+        stream_replay(),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Description": "File Transfer",
+            "Content-Disposition": header.content_disposition,
+            "Content-Length": str(len(header.data) + 4 + replay_size + 8),
+        },
+    )
+
+
+def encode_replay_header(row: Mapping[str, Any]) -> bytes:
+    """Encode the .osr headers preceding the length of a score's replay frames."""
     # generate the replay's hash
     replay_md5 = hashlib.md5(
         "{}p{}o{}o{}t{}a{}r{}e{}y{}o{}u{}{}{}".format(
@@ -844,34 +895,21 @@ async def api_get_replay(
     timestamp = int(row["play_time"].timestamp() * 1e7)
     replay_data += struct.pack("<q", timestamp + DATETIME_OFFSET)
 
-    # pack the raw replay data into the buffer
-    replay_data += struct.pack("<i", len(raw_replay_data))
-    replay_data += raw_replay_data
+    return bytes(replay_data)
 
-    # pack additional info buffer
-    replay_data += struct.pack("<q", score_id)
 
-    def format_filename_rfc5987(params):
-        """Format filename according to RFC 5987 for proper Unicode support."""
-        filename = "{username} - {artist} - {title} [{version}] ({play_time:%Y-%m-%d}).osr".format(**params)
-        
-        # ASCII fallback for older clients
-        ascii_filename = filename.encode('ascii', 'ignore').decode('ascii')
-        
-        # UTF-8 encoded filename for modern clients
-        utf8_filename = "UTF-8''" + quote(filename.encode('utf-8'))
-        
-        return f"attachment; filename=\"{ascii_filename}\"; filename*={utf8_filename}"
+def format_filename_rfc5987(params: Mapping[str, Any]) -> str:
+    """Format filename according to RFC 5987 for proper Unicode support."""
+    filename = "{username} - {artist} - {title} [{version}] ({play_time:%Y-%m-%d}).osr".format(**params)
+
+    # ASCII fallback for older clients
+    ascii_filename = filename.encode('ascii', 'ignore').decode('ascii')
+
+    # UTF-8 encoded filename for modern clients
+    utf8_filename = "UTF-8''" + quote(filename.encode('utf-8'))
+
+    return f"attachment; filename=\"{ascii_filename}\"; filename*={utf8_filename}"
 
-    # stream data back to the client
-    return Response(
-        bytes(replay_data),
-        media_type="application/octet-stream",
-        headers={
-            "Content-Description": "File Transfer",
-            "Content-Disposition": format_filename_rfc5987(row),
-        },
-    )
 
 @router.get("/get_match")
 async def api_get_match(
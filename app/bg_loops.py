@@ -6,6 +6,7 @@ import time
 import app.packets
 import app.settings
 import app.state
+import app.usecases.achievement_engine
 from app.constants.privileges import Privileges
 from app.logging import Ansi
 from app.logging import log
@@ -26,6 +27,8 @@ async def initialize_housekeeping_tasks() -> None:
                 _remove_expired_donation_privileges(interval=30 * 60),
                 _update_bot_status(interval=5 * 60),
                 _disconnect_ghosts(interval=OSU_CLIENT_MIN_PING_INTERVAL // 3),
+                _evict_expired_beatmap_sets(interval=30 * 60),
+                _reload_achievements(interval=5 * 60),
             )
         },
     )
@@ -69,6 +72,28 @@ async def _remove_expired_donation_privileges(interval: int) -> None:
         await asyncio.sleep(interval)
 
 
+async def _evict_expired_beatmap_sets(interval: int) -> None:
+    """Evict beatmap sets with expired data from the cache."""
+    while True:
+        await asyncio.sleep(interval)
+
+        evicted = app.state.cache.beatmaps.evict_expired()
+
+        if app.settings.DEBUG:
+            log(f"Evicted {evicted} expired beatmap sets from cache.", Ansi.LMAGENTA)
+
+
+async def _reload_achievements(interval: int) -> None:
+    """Recompile the achievements, if they've been changed in sql."""
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            await app.usecases.achievement_engine.engine.reload()
+        except Exception as exc:
+            log(f"Failed to reload achievements: {exc!r}", Ansi.LRED)
+
+
 async def _disconnect_ghosts(interval: int) -> None:
     """Actively disconnect users above the
     disconnection time threshold on the osu! server."""
@@ -39,7 +39,9 @@ import app.logging
 import app.packets
 import app.settings
 import app.state
+import app.usecases.map_rankings
 import app.usecases.performance
+import app.usecases.ranked_scores
 import app.utils
 from app.constants import regexes
 from app.constants.gamemodes import GAMEMODE_REPR_LIST
@@ -50,6 +52,7 @@ from app.constants.privileges import Privileges
 from app.logging import Ansi
 from app.logging import log
 from app.objects.beatmap import Beatmap
+from app.objects.beatmap import BeatmapSet
 from app.objects.beatmap import RankedStatus
 from app.objects.beatmap import ensure_osu_file_is_available
 from app.objects.match import Match
@@ -333,6 +336,8 @@ async def changename(ctx: Context) -> str | None:
 
     # all checks passed, update their name
     await users_repo.partial_update(ctx.player.id, name=name)
+    app.state.cache.leaderboards.invalidate_user(ctx.player.id)
+    app.state.cache.replay_headers.invalidate_user(ctx.player.id)
 
     ctx.player.enqueue(
         app.packets.notification(f"Your username has been changed to {name}!"),
@@ -568,10 +573,13 @@ async def _with(ctx: Context) -> str | None:
         score_args.acc = acc
         msg_fields.append(f"{acc:.2f}%")
 
-    result = app.usecases.performance.calculate_performances(
-        osu_file_path=str(BEATMAPS_PATH / f"{bmap.id}.osu"),
-        scores=[score_args],  # calculate one score
-    )
+    try:
+        result = await app.usecases.performance.engine.calculate(
+            osu_file_path=str(BEATMAPS_PATH / f"{bmap.id}.osu"),
+            scores=[score_args],  # calculate one score
+        )
+    except TimeoutError:
+        return "Performance calculation timed out; please try again later."
 
     return "{msg}: {pp:.2f}pp ({stars:.2f}*)".format(
         msg=" ".join(msg_fields),
@@ -713,10 +721,16 @@ async def _map(ctx: Context) -> str | None:
             for _bmap in bmap.set.maps:
                 await maps_repo.partial_update(_bmap.id, status=new_status, frozen=True)
 
-            # make sure cache and db are synced about the newest change
-            for _bmap in app.state.cache.beatmapset[bmap.set_id].maps:
-                _bmap.status = new_status
-                _bmap.frozen = True
+            # make sure cache and db are synced about the newest change;
+            # the set may have been evicted from the cache since it was /np'd.
+            bmap_set = app.state.cache.beatmapset.get(bmap.set_id)
+            if bmap_set is None:
+                bmap_set = await BeatmapSet.from_bsid(bmap.set_id)
+
+            if bmap_set is not None:
+                for _bmap in bmap_set.maps:
+                    _bmap.status = new_status
+                    _bmap.frozen = True
 
             # select all map ids for clearing map requests.
             modified_beatmap_ids = [
@@ -740,6 +754,10 @@ async def _map(ctx: Context) -> str | None:
 
         # deactivate rank requests for all ids
         await map_requests_repo.mark_batch_as_inactive(map_ids=modified_beatmap_ids)
+
+    # scores on the map(s) may have become (un)ranked
+    await app.usecases.ranked_scores.invalidate_all()
+
     pubsub = app.state.services.redis.pubsub()
     data = json.dumps({"map_ids": modified_beatmap_ids, "ranktype": ranktype, "type": ctx.args[0]})
     await pubsub.execute_command("PUBLISH", "ex:map_status_change", data)
@@ -1297,6 +1315,10 @@ async def wipemap(ctx: Context) -> str | None:
         "DELETE FROM scores WHERE map_md5 = :map_md5",
         {"map_md5": map_md5},
     )
+    await app.usecases.ranked_scores.invalidate_all()
+    await app.usecases.map_rankings.delete(map_md5)
+    app.state.cache.leaderboards.invalidate_map(map_md5)
+    app.state.cache.replay_headers.invalidate_map(map_md5)
 
     return "Scores wiped."
 
@@ -2452,6 +2474,7 @@ async def clan_create(ctx: Context) -> str | None:
         clan_id=new_clan["id"],
         clan_priv=ClanPrivileges.Owner,
     )
+    app.state.cache.leaderboards.invalidate_user(ctx.player.id)
 
     # announce clan creation
     announce_chan = app.state.sessions.channels.get_by_name("#announce")
@@ -2492,6 +2515,8 @@ async def clan_disband(ctx: Context) -> str | None:
         update(users_repo.UsersTable).where(users_repo.UsersTable.clan_id == clan["id"]).values(clan_id=0, clan_priv=0)
     )
     for member_id in clan_member_ids:
+        app.state.cache.leaderboards.invalidate_user(member_id)
+
         member = app.state.sessions.players.get(id=member_id)
         if member:
             member.clan_id = None
@@ -2546,6 +2571,7 @@ async def clan_leave(ctx: Context) -> str | None:
     await users_repo.partial_update(ctx.player.id, clan_id=0, clan_priv=0)
     ctx.player.clan_id = None
     ctx.player.clan_priv = None
+    app.state.cache.leaderboards.invalidate_user(ctx.player.id)
 
     clan_display_name = f"[{clan['tag']}] {clan['name']}"
 
@@ -1,4 +1,7 @@
+import time
+
 import app
+import app.settings
 from app.logging import Ansi, log
 from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
@@ -12,6 +15,31 @@ METRICS = {
     "ex_first_place_webhook": Counter("ex_first_place_webhook", "First place webhooks send"),
     "ex_chat_messages": Counter("ex_chat_messages", "Total number of chat messages sent"),
     "ex_logins": Counter("ex_logins", "Total number of logins"),
+    "ex_spectator_relay_bundles": Counter("ex_spectator_relay_bundles", "Total number of spectator frame bundles relayed"),
+    "ex_spectator_relay_bytes": Counter("ex_spectator_relay_bytes", "Total bytes of spectator frames relayed to spectators"),
+    "ex_beatmap_cache_hits": Counter("ex_beatmap_cache_hits", "Total number of beatmap cache hits"),
+    "ex_beatmap_cache_misses": Counter("ex_beatmap_cache_misses", "Total number of beatmap cache misses"),
+    "ex_beatmap_cache_evictions": Counter("ex_beatmap_cache_evictions", "Total number of beatmap sets evicted from the cache"),
+    "ex_beatmap_cache_bytes": Gauge("ex_beatmap_cache_bytes", "Estimated memory used by the beatmap cache in bytes"),
+    "ex_leaderboard_cache_hits": Counter("ex_leaderboard_cache_hits", "Total number of leaderboard cache hits"),
+    "ex_leaderboard_cache_misses": Counter("ex_leaderboard_cache_misses", "Total number of leaderboard cache misses"),
+    "ex_replay_header_cache_hits": Counter("ex_replay_header_cache_hits", "Total number of replay header cache hits"),
+    "ex_replay_header_cache_misses": Counter("ex_replay_header_cache_misses", "Total number of replay header cache misses"),
+    "ex_search_cache_hits": Counter("ex_search_cache_hits", "Total number of osu!direct search cache hits"),
+    "ex_search_cache_misses": Counter("ex_search_cache_misses", "Total number of osu!direct search cache misses"),
+    "ex_search_cache_coalesced": Counter("ex_search_cache_coalesced", "Total number of osu!direct searches which awaited an identical in-flight search"),
+    "ex_search_cache_hit_ratio": Gauge("ex_search_cache_hit_ratio", "Ratio of osu!direct searches served without querying for them"),
+    "ex_pp_calc_time": Histogram("ex_pp_calc_time", "Performance calculation latency in seconds"),
+    "ex_pp_calc_wait_time": Histogram("ex_pp_calc_wait_time", "Time performance calculations spent waiting for a worker in seconds"),
+    "ex_pp_calc_pending": Gauge("ex_pp_calc_pending", "Number of performance calculations queued or running"),
+    "ex_pp_calc_timeouts": Counter("ex_pp_calc_timeouts", "Total number of performance calculations which timed out"),
+    "ex_submission_stage_time": Histogram("ex_submission_stage_time", "Score submission latency by stage in seconds", ["stage"]),
+    "ex_write_behind_time": Histogram("ex_write_behind_time", "Background write latency (including time queued) by stage in seconds", ["stage"]),
+    "ex_write_behind_pending": Gauge("ex_write_behind_pending", "Number of background writes waiting for a worker"),
+    "ex_write_behind_inline_jobs": Counter("ex_write_behind_inline_jobs", "Total number of background writes run inline because the queue was full"),
+    "ex_geolocation_lookup_time": Histogram("ex_geolocation_lookup_time", "Geolocation lookup latency by source in seconds", ["source"]),
+    "ex_geolocation_cache_hits": Counter("ex_geolocation_cache_hits", "Total number of geolocation cache hits"),
+    "ex_geolocation_cache_misses": Counter("ex_geolocation_cache_misses", "Total number of geolocation cache misses"),
 }
 
 enabled = app.settings.ENABLE_PROMETHEUS
@@ -28,8 +56,8 @@ def start_metrics_server():
 
     start_http_server(app.settings.PROMETHEUS_PORT)
 
-def increment(metric: str):
-    """Increments the specified metric by 1."""
+def increment(metric: str, amount: float = 1):
+    """Increments the specified metric by `amount` (1 by default)."""
     if not enabled:
         return
 
@@ -37,7 +65,7 @@ def increment(metric: str):
     if metric_object is None:
         raise ValueError(f"Invalid metric name: {metric}")
 
-    metric_object.inc()
+    metric_object.inc(amount)
 
 def decrement(metric: str):
     """Decrements the specified metric by 1."""
@@ -50,8 +78,34 @@ def decrement(metric: str):
 
     metric_object.dec()
 
-def histrogram(metric: str, value: float):
-    """Records a value for the specified histogram metric."""
+def histrogram(metric: str, value: float, **labels: str):
+    """Records a value for the specified histogram metric (with `labels`, if any)."""
+    if not enabled:
+        return
+
+    metric_object = METRICS.get(metric)
+    if metric_object is None:
+        raise ValueError(f"Invalid metric name: {metric}")
+
+    if labels:
+        metric_object = metric_object.labels(**labels)
+
+    metric_object.observe(value)
+
+class StageTimer:
+    """Records the time between consecutive laps to a histogram, labelled by stage."""
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.last_lap = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        histrogram(self.metric, now - self.last_lap, stage=stage)
+        self.last_lap = now
+
+def set_value(metric: str, value: float):
+    """Sets the specified gauge metric to `value`."""
     if not enabled:
         return
 
@@ -59,4 +113,4 @@ def histrogram(metric: str, value: float):
     if metric_object is None:
         raise ValueError(f"Invalid metric name: {metric}")
 
-    metric_object.observe(value)
\ No newline at end of file
+    metric_object.set(value)
@@ -19,6 +19,8 @@ from tenacity.stop import stop_after_attempt
 
 import app.settings
 import app.state
+import app.usecases.map_rankings
+import app.usecases.ranked_scores
 import app.utils
 from app.constants.gamemodes import GameMode
 from app.logging import Ansi
@@ -579,12 +581,12 @@ class Beatmap:
     @staticmethod
     async def _from_md5_cache(md5: str) -> Beatmap | None:
         """Fetch a map from the cache by md5."""
-        return app.state.cache.beatmap.get(md5, None)
+        return app.state.cache.beatmaps.get_map(md5)
 
     @staticmethod
     async def _from_bid_cache(bid: int) -> Beatmap | None:
         """Fetch a map from the cache by id."""
-        return app.state.cache.beatmap.get(bid, None)
+        return app.state.cache.beatmaps.get_map(bid)
 
 
 class BeatmapSet:
@@ -708,6 +710,7 @@ class BeatmapSet:
 
             updated_maps: list[Beatmap] = []
             map_md5s_to_delete: set[str] = set()
+            ranked_maps_changed = False
 
             # temp value for building the new beatmap
             bmap: Beatmap
@@ -727,6 +730,7 @@ class BeatmapSet:
                         or old_map.status != new_ranked_status
                     ):
                         # update map from old_maps
+                        ranked_maps_changed = True
                         bmap = old_maps[old_id]
                         bmap._parse_from_osuapi_resp(new_map)
                         updated_maps.append(bmap)
@@ -753,6 +757,8 @@ class BeatmapSet:
 
             # save changes to cache
             self.maps = updated_maps
+            if self.id in app.state.cache.beatmapset:
+                cache_beatmap_set(self)
 
             # save changes to sql
 
@@ -768,6 +774,10 @@ class BeatmapSet:
                     "DELETE FROM scores WHERE map_md5 IN :map_md5s",
                     {"map_md5s": map_md5s_to_delete},
                 )
+                for map_md5 in map_md5s_to_delete:
+                    await app.usecases.map_rankings.delete(map_md5)
+                    app.state.cache.leaderboards.invalidate_map(map_md5)
+                    app.state.cache.replay_headers.invalidate_map(map_md5)
 
             # update last_osuapi_check
             await app.state.services.database.execute(
@@ -783,6 +793,14 @@ class BeatmapSet:
 
             # update maps in sql
             await self._save_to_sql()
+
+            # replays are named after their map's (possibly updated) metadata
+            for bmap in self.maps:
+                app.state.cache.replay_headers.invalidate_map(bmap.md5)
+
+            if ranked_maps_changed or map_md5s_to_delete:
+                # scores on the maps may have become (un)ranked
+                await app.usecases.ranked_scores.invalidate_all()
         elif api_data["status_code"] in (404, 200):
             # NOTE: 200 can return an empty array of beatmaps,
             #       so we still delete in this case if the beatmap data is None
@@ -804,12 +822,18 @@ class BeatmapSet:
                     "DELETE FROM scores WHERE map_md5 IN :map_md5s",
                     {"map_md5s": map_md5s_to_delete},
                 )
+                for map_md5 in map_md5s_to_delete:
+                    await app.usecases.map_rankings.delete(map_md5)
+                    app.state.cache.leaderboards.invalidate_map(map_md5)
+                    app.state.cache.replay_headers.invalidate_map(map_md5)
+                await app.usecases.ranked_scores.invalidate_all()
 
             # delete set
             await app.state.services.database.execute(
                 "DELETE FROM mapsets WHERE id = :set_id",
                 {"set_id": self.id},
             )
+            app.state.cache.beatmaps.remove_set(self.id)
 
     async def _save_to_sql(self) -> None:
         """Save the object's attributes into the database."""
@@ -862,7 +886,7 @@ class BeatmapSet:
     @staticmethod
     async def _from_bsid_cache(bsid: int) -> BeatmapSet | None:
         """Fetch a mapset from the cache by set id."""
-        return app.state.cache.beatmapset.get(bsid, None)
+        return app.state.cache.beatmaps.get_set(bsid)
 
     @classmethod
     async def _from_bsid_sql(cls, bsid: int) -> BeatmapSet | None:
@@ -1011,15 +1035,6 @@ class BeatmapSet:
         return bmap_set
 
 
-def cache_beatmap(beatmap: Beatmap) -> None:
-    """Add the beatmap to the cache."""
-    app.state.cache.beatmap[beatmap.md5] = beatmap
-    app.state.cache.beatmap[beatmap.id] = beatmap
-
-
 def cache_beatmap_set(beatmap_set: BeatmapSet) -> None:
     """Add the beatmap set, and each beatmap to the cache."""
-    app.state.cache.beatmapset[beatmap_set.id] = beatmap_set
-
-    for beatmap in beatmap_set.maps:
-        cache_beatmap(beatmap)
+    app.state.cache.beatmaps.add_set(beatmap_set)
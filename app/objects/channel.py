@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+from collections.abc import Collection
 from typing import TYPE_CHECKING
 
 import app.packets
@@ -130,8 +130,17 @@ class Channel:
             # the channel from the global list.
             app.state.sessions.channels.remove(self)
 
-    def enqueue(self, data: bytes, immune: Sequence[int] = []) -> None:
+    def enqueue(self, data: bytes, immune: Collection[int] = ()) -> None:
         """Enqueue `data` to all connected clients not in `immune`."""
+        # share a single immutable buffer between all recipients.
+        data = bytes(data)
+
+        if not immune:
+            for player in self.players:
+                player.enqueue(data)
+            return
+
+        immune = set(immune)
         for player in self.players:
             if player.id not in immune:
                 player.enqueue(data)
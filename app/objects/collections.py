@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+from collections.abc import Collection
 from collections.abc import Iterable
 from collections.abc import Iterator
-from collections.abc import Sequence
 from typing import Any
 
 import databases.core
 
+import app.packets
 import app.settings
 import app.state
 import app.utils
@@ -120,11 +121,52 @@ class Matches(list[Match | None]):
 
 
 class Players(list[Player]):
-    """The currently active players on the server."""
+    """The currently active players on the server.
+
+    Possibly confusing attributes
+    -----------
+    _by_token, _by_id, _by_safe_name, _by_irc_key: `dict[..., list[Player]]`
+        Secondary indexes over the list, used for O(1) lookups in `get()`.
+        XXX: multiple sessions may share a key (tourney clients); these are
+             kept in the order they were added, & lookups return the first.
+
+    _keys: `dict[Player, tuple[str, int, str, str | None]]`
+        The (token, id, safe_name, irc_key) each player is currently indexed
+        under; this lets us drop stale entries after an attribute changes.
+
+    _staff, _restricted, _unrestricted: `set[Player]`
+        Privilege partitions of the list, kept up to date incrementally
+        so the `*_count` properties are O(1) & the `staff`, `restricted`
+        & `unrestricted` views needn't scan the whole list.
+
+    _roster: `dict[Player, tuple[bytes, bytes] | None]`
+        The presence & stats packets of each unrestricted player as of the
+        last roster built, or None if it hasn't been in one yet.
+
+    _roster_buffer: `bytes | None`
+        The concatenated roster entries, shared by all logins until any of
+        the players' packets change; None when players have joined or left.
+    """
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
+        self._by_token: dict[str, list[Player]] = {}
+        self._by_id: dict[int, list[Player]] = {}
+        self._by_safe_name: dict[str, list[Player]] = {}
+        self._by_irc_key: dict[str, list[Player]] = {}
+        self._keys: dict[Player, tuple[str, int, str, str | None]] = {}
+
+        self._staff: set[Player] = set()
+        self._restricted: set[Player] = set()
+        self._unrestricted: set[Player] = set()
+
+        self._roster: dict[Player, tuple[bytes, bytes] | None] = {}
+        self._roster_buffer: bytes | None = b""
+
+        for player in self:
+            self._index(player)
+
     def __iter__(self) -> Iterator[Player]:
         return super().__iter__()
 
@@ -132,35 +174,170 @@ class Players(list[Player]):
         # allow us to either pass in the player
         # obj, or the player name as a string.
         if isinstance(player, str):
-            return player in (player.name for player in self)
+            sessions = self._by_safe_name.get(make_safe_name(player), ())
+            return any(session.name == player for session in sessions)
         else:
-            return super().__contains__(player)
+            return player in self._keys
 
     def __repr__(self) -> str:
         return f'[{", ".join(map(repr, self))}]'
 
+    def _index(self, player: Player) -> None:
+        """Add `player` to the secondary indexes."""
+        keys = (player.token, player.id, player.safe_name, player.irc_key)
+        self._keys[player] = keys
+
+        token, id, safe_name, irc_key = keys
+        self._by_token.setdefault(token, []).append(player)
+        self._by_id.setdefault(id, []).append(player)
+        self._by_safe_name.setdefault(safe_name, []).append(player)
+        if irc_key is not None:
+            self._by_irc_key.setdefault(irc_key, []).append(player)
+
+        self._partition(player)
+
+    def _partition(self, player: Player) -> None:
+        """Place `player` into the privilege partitions matching their privs."""
+        self._unpartition(player)
+
+        if player.priv & Privileges.UNRESTRICTED:
+            self._unrestricted.add(player)
+
+            self._roster[player] = None
+            self._roster_buffer = None
+        else:
+            self._restricted.add(player)
+
+        if player.priv & Privileges.STAFF:
+            self._staff.add(player)
+
+    def _unpartition(self, player: Player) -> None:
+        """Remove `player` from all privilege partitions."""
+        self._staff.discard(player)
+        self._restricted.discard(player)
+        self._unrestricted.discard(player)
+
+        if player in self._roster:
+            del self._roster[player]
+            self._roster_buffer = None
+
+    def _unindex(self, player: Player) -> None:
+        """Remove `player` from the secondary indexes."""
+        self._unpartition(player)
+
+        keys = self._keys.pop(player)
+        indexes = (self._by_token, self._by_id, self._by_safe_name, self._by_irc_key)
+
+        for index, key in zip(indexes, keys):
+            if key is None:
+                continue
+
+            # there's only >1 session per key for tourney clients,
+            # so removing from these lists is effectively O(1).
+            sessions = index[key]  # type: ignore[index]
+            sessions.remove(player)
+            if not sessions:
+                del index[key]  # type: ignore[arg-type]
+
+    def reindex(self, player: Player) -> None:
+        """\
+        Refresh the indexes & privilege partitions for `player`.
+
+        This must be called after an online player's token, name,
+        irc key or privileges change; offline players are ignored.
+        """
+        keys = self._keys.get(player)
+        if keys is None:
+            return
+
+        if keys != (player.token, player.id, player.safe_name, player.irc_key):
+            self._unindex(player)
+            self._index(player)
+        else:
+            self._partition(player)
+
     @property
     def ids(self) -> set[int]:
         """Return a set of the current ids in the list."""
-        return {p.id for p in self}
+        return set(self._by_id)
+
+    # NOTE: the partition properties below return snapshots of the sets
+    # maintained by the collection, which callers may keep across awaits;
+    # the *_count properties below are cheaper if only the size is needed.
 
     @property
-    def staff(self) -> set[Player]:
+    def staff(self) -> frozenset[Player]:
         """Return a set of the current staff online."""
-        return {p for p in self if p.priv & Privileges.STAFF}
+        return frozenset(self._staff)
 
     @property
-    def restricted(self) -> set[Player]:
+    def restricted(self) -> frozenset[Player]:
         """Return a set of the current restricted players."""
-        return {p for p in self if not p.priv & Privileges.UNRESTRICTED}
+        return frozenset(self._restricted)
 
     @property
-    def unrestricted(self) -> set[Player]:
+    def unrestricted(self) -> frozenset[Player]:
         """Return a set of the current unrestricted players."""
-        return {p for p in self if p.priv & Privileges.UNRESTRICTED}
+        return frozenset(self._unrestricted)
+
+    @property
+    def staff_count(self) -> int:
+        """Return the number of staff online."""
+        return len(self._staff)
+
+    @property
+    def restricted_count(self) -> int:
+        """Return the number of restricted players online."""
+        return len(self._restricted)
+
+    @property
+    def unrestricted_count(self) -> int:
+        """Return the number of unrestricted players online."""
+        return len(self._unrestricted)
 
-    def enqueue(self, data: bytes, immune: Sequence[Player] = []) -> None:
+    @property
+    def roster(self) -> bytes:
+        """\
+        Return the presence & stats packets of all unrestricted
+        players, as sent to a client when they log in.
+        """
+        changed = self._roster_buffer is None
+        packets: list[bytes] = []
+
+        for player, entry in self._roster.items():
+            if player.is_bot_client:
+                # the bot's packets are cached separately.
+                presence = app.packets.bot_presence(player)
+                stats = app.packets.bot_stats(player)
+            else:
+                # these return the player's cached packets
+                # unless any of the fields they encode changed.
+                presence = app.packets.user_presence(player)
+                stats = app.packets.user_stats(player)
+
+            if entry is None or entry[0] is not presence or entry[1] is not stats:
+                self._roster[player] = (presence, stats)
+                changed = True
+
+            packets += (presence, stats)
+
+        if changed:
+            self._roster_buffer = b"".join(packets)
+
+        assert self._roster_buffer is not None
+        return self._roster_buffer
+
+    def enqueue(self, data: bytes, immune: Collection[Player] = ()) -> None:
         """Enqueue `data` to all players, except for those in `immune`."""
+        # share a single immutable buffer between all recipients.
+        data = bytes(data)
+
+        if not immune:
+            for player in self:
+                player.enqueue(data)
+            return
+
+        immune = set(immune)
         for player in self:
             if player not in immune:
                 player.enqueue(data)
@@ -173,21 +350,17 @@ class Players(list[Player]):
         name: str | None = None,
     ) -> Player | None:
         """Get a player by token, id, or name from cache."""
-        for player in self:
-            if token is not None:
-                if player.token == token:
-                    return player
-            elif irc_key is not None:
-                if player.irc_key == irc_key:
-                    return player
-            elif id is not None:
-                if player.id == id:
-                    return player
-            elif name is not None:
-                if player.safe_name == make_safe_name(name):
-                    return player
-
-        return None
+        sessions: list[Player] | None = None
+        if token is not None:
+            sessions = self._by_token.get(token)
+        elif irc_key is not None:
+            sessions = self._by_irc_key.get(irc_key)
+        elif id is not None:
+            sessions = self._by_id.get(id)
+        elif name is not None:
+            sessions = self._by_safe_name.get(make_safe_name(name))
+
+        return sessions[0] if sessions else None
 
     async def get_sql(
         self,
@@ -280,6 +453,7 @@ class Players(list[Player]):
             return
 
         super().append(player)
+        self._index(player)
 
     def remove(self, player: Player) -> None:
         """Remove `p` from the list."""
@@ -289,6 +463,7 @@ class Players(list[Player]):
             return
 
         super().remove(player)
+        self._unindex(player)
 
 
 async def initialize_ram_caches() -> None:
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 from collections import defaultdict
+from collections.abc import Collection
 from collections.abc import Sequence
 from datetime import datetime as datetime
 from datetime import timedelta as timedelta
@@ -26,10 +27,14 @@ if TYPE_CHECKING:
 
     from app.objects.channel import Channel
     from app.objects.player import Player
+    from app.objects.score import Score
 
 
 MAX_MATCH_NAME_LENGTH = 50
 
+# how long to wait for all players' scores after a scrim map, in seconds
+SUBMISSION_TIMEOUT = 10
+
 
 @unique
 @pymysql_encode(escape_enum)
@@ -200,6 +205,9 @@ class Match:
 
         self.tourney_clients: set[int] = set()  # player ids
 
+        # {player id: (map md5, future)} of scores awaited after a scrim map
+        self._submission_waiters: dict[int, tuple[str, asyncio.Future[Score]]] = {}
+
     @property
     def host(self) -> Player:
         player = app.state.sessions.players.get(id=self.host_id)
@@ -285,7 +293,7 @@ class Match:
         self,
         data: bytes,
         lobby: bool = True,
-        immune: Sequence[int] = [],
+        immune: Collection[int] = (),
     ) -> None:
         """Add data to be sent to all clients in the match."""
         self.chat.enqueue(data, immune)
@@ -339,6 +347,18 @@ class Match:
         self.winners.clear()
         self.bans.clear()
 
+    def add_submitted_score(self, score: Score) -> None:
+        """Hand a score submitted by a player in `self` to its awaiting match."""
+        assert score.player is not None
+
+        waiter = self._submission_waiters.get(score.player.id)
+        if waiter is None:
+            return
+
+        map_md5, future = waiter
+        if score.bmap and score.bmap.md5 == map_md5 and not future.done():
+            future.set_result(score)
+
     async def await_submissions(
         self,
         was_playing: Sequence[Slot],
@@ -346,7 +366,6 @@ class Match:
         """Await score submissions from all players in completed state."""
         scores: dict[MatchTeams | Player, int] = defaultdict(int)
         didnt_submit: list[Player] = []
-        time_waited = 0.0  # allow up to 10s (total, not per player)
 
         ffa = self.team_type in (MatchTeamTypes.head_to_head, MatchTeamTypes.tag_coop)
 
@@ -355,46 +374,63 @@ class Match:
         else:
             win_cond = ("score", "acc", "max_combo", "score")[self.win_condition]
 
-        bmap = await Beatmap.from_md5(self.map_md5)
+        # the host may pick the next map before all scores arrive
+        map_md5 = self.map_md5
+        bmap = await Beatmap.from_md5(map_md5)
 
         if not bmap:
             # map isn't submitted
             return {}, ()
 
+        loop = asyncio.get_running_loop()
+        waiters: list[tuple[Slot, asyncio.Future[Score]]] = []
+
         for s in was_playing:
-            # continue trying to fetch each player's
-            # scores until they've all been submitted.
-            while True:
-                assert s.player is not None
-                rc_score = s.player.recent_score
+            assert s.player is not None
+            future: asyncio.Future[Score] = loop.create_future()
+
+            # their score may have been submitted before the match completed
+            rc_score = s.player.recent_score
+            max_age = datetime.now() - timedelta(seconds=bmap.total_length + 0.5)
+
+            if (
+                rc_score
+                and rc_score.bmap
+                and rc_score.bmap.md5 == map_md5
+                and rc_score.server_time > max_age
+            ):
+                future.set_result(rc_score)
+            else:
+                self._submission_waiters[s.player.id] = (map_md5, future)
 
-                max_age = datetime.now() - timedelta(
-                    seconds=bmap.total_length + time_waited + 0.5,
-                )
+            waiters.append((s, future))
 
-                if (
-                    rc_score
-                    and rc_score.bmap
-                    and rc_score.bmap.md5 == self.map_md5
-                    and rc_score.server_time > max_age
-                ):
-                    # score found, add to our scores dict if != 0.
-                    score: int = getattr(rc_score, win_cond)
-                    if score:
-                        key: MatchTeams | Player = s.player if ffa else s.team
-                        scores[key] += score
-
-                    break
-
-                # wait 0.5s and try again
-                await asyncio.sleep(0.5)
-                time_waited += 0.5
-
-                if time_waited > 10:
-                    # inform the match this user didn't
-                    # submit a score in time, and skip them.
-                    didnt_submit.append(s.player)
-                    break
+        # wait for all players' scores at once, under one deadline
+        pending = [future for _, future in waiters if not future.done()]
+        try:
+            if pending:
+                await asyncio.wait(pending, timeout=SUBMISSION_TIMEOUT)
+        finally:
+            for s, future in waiters:
+                assert s.player is not None
+                waiter = self._submission_waiters.get(s.player.id)
+                if waiter is not None and waiter[1] is future:
+                    del self._submission_waiters[s.player.id]
+
+        for s, future in waiters:
+            assert s.player is not None
+
+            if not future.done():
+                # inform the match this user didn't
+                # submit a score in time, and skip them.
+                didnt_submit.append(s.player)
+                continue
+
+            # score found, add to our scores dict if != 0.
+            score: int = getattr(future.result(), win_cond)
+            if score:
+                key: MatchTeams | Player = s.player if ffa else s.team
+                scores[key] += score
 
         # all scores retrieved, update the match.
         return scores, didnt_submit
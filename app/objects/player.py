@@ -3,6 +3,8 @@ from __future__ import annotations
 import asyncio
 import time
 import uuid
+from collections import deque
+from collections.abc import Iterable
 from dataclasses import dataclass
 from datetime import date
 from enum import IntEnum
@@ -11,7 +13,6 @@ from enum import unique
 from functools import cached_property
 from typing import TYPE_CHECKING
 from typing import TypedDict
-from typing import cast
 
 import app.metrics
 import databases.core
@@ -19,6 +20,8 @@ import databases.core
 import app.packets
 import app.settings
 import app.state
+import app.usecases.map_rankings
+import app.usecases.player_rankings
 from app._typing import IPAddress
 from app.constants.gamemodes import GameMode
 from app.constants.mods import Mods
@@ -35,6 +38,7 @@ from app.objects.match import Slot
 from app.objects.match import SlotStatus
 from app.objects.score import Grade
 from app.objects.score import Score
+from app.packets import ReplayAction
 from app.repositories import clans as clans_repo
 from app.repositories import logs as logs_repo
 from app.repositories import stats as stats_repo
@@ -48,6 +52,11 @@ if TYPE_CHECKING:
     from app.constants.privileges import ClanPrivileges
     from app.objects.beatmap import Beatmap
     from app.objects.score import Score
+    from app.packets import ReplayFrameBundle
+
+# the number of recent spectator frame bundles
+# kept to catch up spectators joining mid-play.
+SPECTATOR_FRAME_BUFFER_SIZE = 16
 
 
 @unique
@@ -201,11 +210,29 @@ class Player:
     is_tourney_client: `bool`
         Whether this is a management/spectator tourney client.
 
-    _packet_queue: `bytearray`
-        Bytes enqueued to the player which will be transmitted
+    _packet_queue: `list[bytes]`
+        Packets enqueued to the player which will be transmitted
         at the tail end of their next connection to the server.
         XXX: cls.enqueue() will add data to this queue, and
              cls.dequeue() will return the data, and remove it.
+        NOTE: only references are stored, so a broadcast shares one
+              immutable buffer between all of its recipients; the
+              buffers are only joined together in cls.dequeue().
+
+    _coalesced: `dict[tuple[int, int | bytes], int]`
+        The queue position of the latest stats/presence/channel info
+        packet per (packet id, subject); a newer packet with the same
+        key blanks out the queued one so only the latest is sent.
+
+    _spectator_frames: `deque[bytes]`
+        The most recent (framed) spectator frame bundles of the player's
+        current play, sent to spectators as soon as they start spectating
+        so they needn't wait for the next bundle to see anything.
+
+    _stats_packet, _presence_packet: `tuple[tuple[object, ...], bytes] | None`
+        The player's last serialized user stats & presence packets, along
+        with the fields they were built from; app.packets.user_stats() and
+        app.packets.user_presence() only re-encode when those fields change.
     """
 
     def __init__(
@@ -278,6 +305,9 @@ class Player:
 
         self.channels: list[Channel] = []
         self.spectators: list[Player] = []
+        self._spectator_frames: deque[bytes] = deque(
+            maxlen=SPECTATOR_FRAME_BUFFER_SIZE,
+        )
         self.spectating: Player | None = None
         self.match: Match | None = None
         self.stealth = False
@@ -289,10 +319,18 @@ class Player:
             mode: None for mode in GameMode
         }
 
+        # ids of the user's unlocked achievements; fetched on their first
+        # ranked submission, & then kept up to date by the achievement engine.
+        self.unlocked_achievements: set[int] | None = None
+
         # store the last beatmap /np'ed by the user.
         self.last_np: LastNp | None = None
 
-        self._packet_queue = bytearray()
+        self._packet_queue: list[bytes] = []
+        self._coalesced: dict[tuple[int, int | bytes], int] = {}
+
+        self._stats_packet: tuple[tuple[object, ...], bytes] | None = None
+        self._presence_packet: tuple[tuple[object, ...], bytes] | None = None
 
     def __repr__(self) -> str:
         return f"<{self.name} ({self.id})>"
@@ -440,6 +478,8 @@ class Player:
         if "bancho_priv" in vars(self):
             del self.bancho_priv  # wipe cached_property
 
+        app.state.sessions.players.reindex(self)
+
         await users_repo.partial_update(
             id=self.id,
             priv=self.priv,
@@ -452,11 +492,18 @@ class Player:
         if "bancho_priv" in vars(self):
             del self.bancho_priv  # wipe cached_property
 
+        app.state.sessions.players.reindex(self)
+
         await users_repo.partial_update(
             id=self.id,
             priv=self.priv,
         )
 
+        if bits & Privileges.UNRESTRICTED:
+            # our scores are shown on leaderboards again
+            await app.usecases.map_rankings.add_user(self.id)
+            await self.invalidate_leaderboards()
+
         if self.is_online:
             # if they're online, send a packet
             # to update their client-side privileges
@@ -469,16 +516,36 @@ class Player:
         if "bancho_priv" in vars(self):
             del self.bancho_priv  # wipe cached_property
 
+        app.state.sessions.players.reindex(self)
+
         await users_repo.partial_update(
             id=self.id,
             priv=self.priv,
         )
 
+        if bits & Privileges.UNRESTRICTED:
+            # our scores are hidden from leaderboards
+            await app.usecases.map_rankings.remove_user(self.id)
+            app.state.cache.leaderboards.invalidate_user(self.id)
+
         if self.is_online:
             # if they're online, send a packet
             # to update their client-side privileges
             self.enqueue(app.packets.bancho_privileges(self.bancho_priv))
 
+    async def invalidate_leaderboards(self) -> None:
+        """Invalidate the cached leaderboards of all maps we have best scores on."""
+        rows = await app.state.services.database.fetch_all(
+            "SELECT DISTINCT map_md5, mode FROM scores "
+            "WHERE userid = :user_id AND status = 2",
+            {"user_id": self.id},
+        )
+        for row in rows:
+            app.state.cache.leaderboards.invalidate_map(
+                row["map_md5"],
+                GameMode(row["mode"]),
+            )
+
     async def restrict(self, admin: Player, reason: str) -> None:
         """Restrict `self` for `reason`, and log to sql."""
         await self.remove_privs(Privileges.UNRESTRICTED)
@@ -490,15 +557,10 @@ class Player:
             msg=reason,
         )
 
-        for mode in (0, 1, 2, 3, 4, 5, 6, 8):
-            await app.state.services.redis.zrem(
-                f"bancho:leaderboard:{mode}",
-                self.id,
-            )
-            await app.state.services.redis.zrem(
-                f'bancho:leaderboard:{mode}:{self.geoloc["country"]["acronym"]}',
-                self.id,
-            )
+        await app.usecases.player_rankings.remove(
+            self.id,
+            self.geoloc["country"]["acronym"],
+        )
 
         log_msg = f"{admin} restricted {self} for: {reason}."
 
@@ -527,15 +589,11 @@ class Player:
         if not self.is_online:
             await self.stats_from_sql_full()
 
-        for mode, stats in self.stats.items():
-            await app.state.services.redis.zadd(
-                f"bancho:leaderboard:{mode.value}",
-                {str(self.id): stats.pp},
-            )
-            await app.state.services.redis.zadd(
-                f"bancho:leaderboard:{mode.value}:{self.geoloc['country']['acronym']}",
-                {str(self.id): stats.pp},
-            )
+        await app.usecases.player_rankings.update(
+            self.id,
+            self.geoloc["country"]["acronym"],
+            {mode: stats.pp for mode, stats in self.stats.items()},
+        )
 
         log_msg = f"{admin} unrestricted {self} for: {reason}."
 
@@ -822,6 +880,10 @@ class Player:
         self.spectators.append(player)
         player.spectating = self
 
+        # catch the spectator up with the current play.
+        for data in self._spectator_frames:
+            player.enqueue(data)
+
         log(f"{player} is now spectating {self}.")
 
     def remove_spectator(self, player: Player) -> None:
@@ -837,6 +899,7 @@ class Player:
         if not self.spectators:
             # remove host from channel, deleting it.
             self.leave_channel(channel)
+            self._spectator_frames.clear()
         else:
             # send new playercount
             channel_info = app.packets.channel_info(
@@ -854,6 +917,30 @@ class Player:
         self.enqueue(app.packets.spectator_left(player.id))
         log(f"{player} is no longer spectating {self}.")
 
+    def relay_spectator_frames(self, frame_bundle: ReplayFrameBundle) -> None:
+        """Relay `frame_bundle` from `self` to all of their spectators."""
+        # frame the bundle once; all spectators share the buffer.
+        data = app.packets.spectate_frames(frame_bundle.raw_data)
+
+        if frame_bundle.action in (ReplayAction.Completion, ReplayAction.SongSelect):
+            # the play is over; its frames are of no use to late joiners.
+            self._spectator_frames.clear()
+        else:
+            if frame_bundle.action == ReplayAction.NewSong:
+                self._spectator_frames.clear()
+
+            self._spectator_frames.append(data)
+
+        for spectator in self.spectators:
+            spectator.enqueue(data)
+
+        if app.metrics.enabled:
+            app.metrics.increment("ex_spectator_relay_bundles")
+            app.metrics.increment(
+                "ex_spectator_relay_bytes",
+                len(data) * len(self.spectators),
+            )
+
     async def add_friend(self, player: Player) -> None:
         """Attempt to add `player` to `self`'s friends."""
         if player.id in self.friends:
@@ -936,50 +1023,43 @@ class Player:
         # always have bot added to friends.
         self.friends.add(1)
 
-    async def get_global_rank(self, mode: GameMode) -> int:
+    async def get_ranks(
+        self,
+        modes: Iterable[GameMode] = GameMode,
+    ) -> dict[GameMode, app.usecases.player_rankings.Ranks]:
+        """Fetch `self`'s global & country ranks in `modes` (in one round-trip)."""
         if self.restricted:
-            return 0
+            return {mode: app.usecases.player_rankings.Ranks() for mode in modes}
 
-        rank = await app.state.services.redis.zrevrank(
-            f"bancho:leaderboard:{mode.value}",
-            str(self.id),
+        return await app.usecases.player_rankings.fetch(
+            self.id,
+            self.geoloc["country"]["acronym"],
+            modes,
         )
-        return cast(int, rank) + 1 if rank is not None else 0
+
+    async def get_global_rank(self, mode: GameMode) -> int:
+        return (await self.get_ranks((mode,)))[mode].global_rank
 
     async def get_country_rank(self, mode: GameMode) -> int:
+        return (await self.get_ranks((mode,)))[mode].country_rank
+
+    async def update_rank(self, mode: GameMode) -> int:
         if self.restricted:
             return 0
 
-        country = self.geoloc["country"]["acronym"]
-        rank = await app.state.services.redis.zrevrank(
-            f"bancho:leaderboard:{mode.value}:{country}",
-            str(self.id),
+        ranks = await app.usecases.player_rankings.update(
+            self.id,
+            self.geoloc["country"]["acronym"],
+            {mode: self.stats[mode].pp},
         )
-
-        return cast(int, rank) + 1 if rank is not None else 0
-
-    async def update_rank(self, mode: GameMode) -> int:
-        country = self.geoloc["country"]["acronym"]
-        stats = self.stats[mode]
-
-        if not self.restricted:
-            # global rank
-            await app.state.services.redis.zadd(
-                f"bancho:leaderboard:{mode.value}",
-                {str(self.id): stats.pp},
-            )
-
-            # country rank
-            await app.state.services.redis.zadd(
-                f"bancho:leaderboard:{mode.value}:{country}",
-                {str(self.id): stats.pp},
-            )
-
-        return await self.get_global_rank(mode)
+        return ranks[mode].global_rank
 
     async def stats_from_sql_full(self) -> None:
         """Retrieve `self`'s stats (all modes) from sql."""
-        for row in await stats_repo.fetch_many(player_id=self.id):
+        rows = await stats_repo.fetch_many(player_id=self.id)
+        ranks = await self.get_ranks(GameMode(row["mode"]) for row in rows)
+
+        for row in rows:
             game_mode = GameMode(row["mode"])
             self.stats[game_mode] = ModeData(
                 tscore=row["tscore"],
@@ -990,7 +1070,7 @@ class Player:
                 playtime=row["playtime"],
                 max_combo=row["max_combo"],
                 total_hits=row["total_hits"],
-                rank=await self.get_global_rank(game_mode),
+                rank=ranks[game_mode].global_rank,
                 grades={
                     Grade.XH: row["xh_count"],
                     Grade.X: row["x_count"],
@@ -1010,14 +1090,30 @@ class Player:
 
     def enqueue(self, data: bytes) -> None:
         """Add data to be sent to the client."""
-        self._packet_queue += data
+        # the queue keeps a reference until the next dequeue, so a mutable
+        # buffer is copied; bytes are immutable & shared as-is.
+        data = bytes(data)
+
+        key = app.packets.coalesce_key(data)
+        if key is not None:
+            idx = self._coalesced.get(key)
+            if idx is not None:
+                # superseded by this packet; we drop the old one and
+                # append the new one so ordering relative to packets
+                # enqueued in between (e.g. logouts) is preserved.
+                self._packet_queue[idx] = b""
+
+            self._coalesced[key] = len(self._packet_queue)
+
+        self._packet_queue.append(data)
 
     def dequeue(self) -> bytes | None:
         """Get data from the queue to send to the client."""
         if self._packet_queue:
-            data = bytes(self._packet_queue)
+            data = b"".join(self._packet_queue)
             self._packet_queue.clear()
-            return data
+            self._coalesced.clear()
+            return data or None
 
         return None
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import functools
 import hashlib
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from enum import IntEnum
 from enum import unique
@@ -10,11 +11,14 @@ from typing import TYPE_CHECKING
 
 from app.api.v2.common import json
 import app.state
+import app.usecases.map_rankings
 import app.usecases.performance
 import app.utils
 from app.constants.clientflags import ClientFlags
 from app.constants.gamemodes import GameMode
 from app.constants.mods import Mods
+from app.logging import Ansi
+from app.logging import log
 from app.objects.beatmap import Beatmap
 from app.repositories import scores as scores_repo
 from app.usecases.performance import ScoreParams
@@ -334,29 +338,18 @@ class Score:
         assert self.bmap is not None
 
         if self.mode >= GameMode.RELAX_OSU:
-            scoring_metric = "pp"
             score = self.pp
         else:
-            scoring_metric = "score"
             score = self.score
 
-        num_better_scores: int | None = await app.state.services.database.fetch_val(
-            "SELECT COUNT(*) AS c FROM scores s "
-            "INNER JOIN users u ON u.id = s.userid "
-            "WHERE s.map_md5 = :map_md5 AND s.mode = :mode "
-            "AND s.status = 2 AND u.priv & 1 "
-            f"AND s.{scoring_metric} > :score",
-            {
-                "map_md5": self.bmap.md5,
-                "mode": self.mode,
-                "score": score,
-            },
-            column=0,  # COUNT(*)
+        num_better_scores = await app.usecases.map_rankings.count_better_scores(
+            self.bmap.md5,
+            self.mode,
+            score,
         )
-        assert num_better_scores is not None
         return num_better_scores + 1
 
-    def calculate_performance(self, beatmap_id: int) -> tuple[float, float]:
+    async def calculate_performance(self, beatmap_id: int) -> tuple[float, float]:
         """Calculate PP and star rating for our score."""
         mode_vn = self.mode.as_vanilla
 
@@ -372,10 +365,27 @@ class Score:
             nmiss=self.nmiss,
         )
 
-        result = app.usecases.performance.calculate_performances(
-            osu_file_path=str(BEATMAPS_PATH / f"{beatmap_id}.osu"),
-            scores=[score_args],
-        )
+        osu_file_path = str(BEATMAPS_PATH / f"{beatmap_id}.osu")
+
+        # a submitted score must not be lost to a busy engine, so this
+        # waits for its calculation however long it takes to get a slot.
+        for attempt in range(2):
+            try:
+                result = await app.usecases.performance.engine.calculate(
+                    osu_file_path=osu_file_path,
+                    scores=[score_args],
+                    timeout=None,
+                )
+                break
+            except BrokenProcessPool:
+                # a worker died; the engine replaces its pool, so retry once.
+                if attempt == 1:
+                    log(
+                        f"Failed to calculate performance on map {beatmap_id}; "
+                        "storing the score with 0pp (run tools/recalc.py).",
+                        Ansi.LRED,
+                    )
+                    return 0.0, 0.0
 
         return result[0]["performance"]["pp"], result[0]["difficulty"]["stars"]
 
@@ -303,6 +303,25 @@ class BasePacket(ABC):
 PacketMap = dict[ClientPackets, type[BasePacket]]
 
 
+# precompiled layouts for the reader
+I16 = struct.Struct("<h")
+U16 = struct.Struct("<H")
+I32 = struct.Struct("<i")
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+U64 = struct.Struct("<Q")
+F16 = struct.Struct("<e")
+F32 = struct.Struct("<f")
+F64 = struct.Struct("<d")
+
+PACKET_HEADER_FMT = struct.Struct("<HxI")
+REPLAYFRAME_FMT = struct.Struct("<BBffi")
+REPLAYFRAME_BUNDLE_HEADER_FMT = struct.Struct("<iH")
+MATCH_SLOTS_FMT = struct.Struct("<16b16b")
+MATCH_SLOT_MODS_FMT = struct.Struct("<16i")
+MATCH_FOOTER_FMT = struct.Struct("<ibbbb")
+
+
 class BanchoPacketReader:
     """\
     A class for reading bancho packets
@@ -313,6 +332,10 @@ class BanchoPacketReader:
     body_view: `memoryview`
         A readonly view of the request's body.
 
+    offset: `int`
+        The position of the reader's cursor within `body_view`;
+        reads never copy or re-slice the underlying buffer.
+
     packet_map: `dict[ClientPackets, BasePacket]`
         The map of registered packets the reader may handle.
 
@@ -329,24 +352,27 @@ class BanchoPacketReader:
         self.body_view = body_view  # readonly
         self.packet_map = packet_map
 
+        self.offset = 0
         self.current_len = 0  # last read packet's length
+        self._packet_end = 0  # offset of the end of the last read packet
 
     def __iter__(self) -> Iterator[BasePacket]:
         return self
 
     def __next__(self) -> BasePacket:
+        # skip anything the last packet's handler didn't read.
+        self.offset = max(self.offset, self._packet_end)
+
         # do not break until we've read the
         # header of a packet we can handle.
-        p_type = ClientPackets.UNKNOWN_PACKET
-        p_len = 0
-        while self.body_view:  # len(self.view) < 7?
+        body_len = len(self.body_view)
+        while body_len - self.offset >= 7:
             p_type, p_len = self._read_header()
 
             if p_type not in self.packet_map:
-                # packet type not handled, remove
-                # from internal buffer and continue.
-                if p_len != 0:
-                    self.body_view = self.body_view[p_len:]
+                # packet type not handled, skip
+                # over its data and continue.
+                self.offset += p_len
             else:
                 # we can handle this one.
                 break
@@ -356,80 +382,85 @@ class BanchoPacketReader:
         # we have a packet handler for this.
         packet_cls = self.packet_map[p_type]
         self.current_len = p_len
+        self._packet_end = self.offset + p_len
 
         return packet_cls(self)
 
     def _read_header(self) -> tuple[ClientPackets, int]:
         """Read the header of an osu! packet (id & length)."""
         # read type & length from the body
-        data = struct.unpack("<HxI", self.body_view[:7])
-        self.body_view = self.body_view[7:]
-        return ClientPackets(data[0]), data[1]
+        p_type, p_len = PACKET_HEADER_FMT.unpack_from(self.body_view, self.offset)
+        self.offset += 7
+
+        try:
+            return ClientPackets(p_type), p_len
+        except ValueError:
+            return ClientPackets.UNKNOWN_PACKET, p_len
 
     """ public API (exposed for packet handler's __init__ methods) """
 
     def read_raw(self) -> memoryview:
-        val = self.body_view[: self.current_len]
-        self.body_view = self.body_view[self.current_len :]
+        val = self.body_view[self.offset : self.offset + self.current_len]
+        self.offset += self.current_len
         return val
 
     # integral types
 
     def read_i8(self) -> int:
-        val = self.body_view[0]
-        self.body_view = self.body_view[1:]
+        val = self.body_view[self.offset]
+        self.offset += 1
         return val - 256 if val > 127 else val
 
     def read_u8(self) -> int:
-        val = self.body_view[0]
-        self.body_view = self.body_view[1:]
+        val = self.body_view[self.offset]
+        self.offset += 1
         return val
 
     def read_i16(self) -> int:
-        val = int.from_bytes(self.body_view[:2], "little", signed=True)
-        self.body_view = self.body_view[2:]
-        return val
+        (val,) = I16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
+        return cast(int, val)
 
     def read_u16(self) -> int:
-        val = int.from_bytes(self.body_view[:2], "little", signed=False)
-        self.body_view = self.body_view[2:]
-        return val
+        (val,) = U16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
+        return cast(int, val)
 
     def read_i32(self) -> int:
-        val = int.from_bytes(self.body_view[:4], "little", signed=True)
-        self.body_view = self.body_view[4:]
-        return val
+        (val,) = I32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
+        return cast(int, val)
 
     def read_u32(self) -> int:
-        val = int.from_bytes(self.body_view[:4], "little", signed=False)
-        self.body_view = self.body_view[4:]
-        return val
+        (val,) = U32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
+        return cast(int, val)
 
     def read_i64(self) -> int:
-        val = int.from_bytes(self.body_view[:8], "little", signed=True)
-        self.body_view = self.body_view[8:]
-        return val
+        (val,) = I64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
+        return cast(int, val)
 
     def read_u64(self) -> int:
-        val = int.from_bytes(self.body_view[:8], "little", signed=False)
-        self.body_view = self.body_view[8:]
-        return val
+        (val,) = U64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
+        return cast(int, val)
 
     # floating-point types
 
     def read_f16(self) -> float:
-        (val,) = struct.unpack_from("<e", self.body_view[:2])
-        self.body_view = self.body_view[2:]
+        (val,) = F16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
         return cast(float, val)
 
     def read_f32(self) -> float:
-        (val,) = struct.unpack_from("<f", self.body_view[:4])
-        self.body_view = self.body_view[4:]
+        (val,) = F32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
         return cast(float, val)
 
     def read_f64(self) -> float:
-        (val,) = struct.unpack_from("<d", self.body_view[:8])
-        self.body_view = self.body_view[8:]
+        (val,) = F64.unpack_from(self.body_view, self.offset)
+        self.offset += 8
         return cast(float, val)
 
     # complex types
@@ -437,35 +468,39 @@ class BanchoPacketReader:
     # XXX: some osu! packets use i16 for
     # array length, while others use i32
     def read_i32_list_i16l(self) -> tuple[int, ...]:
-        length = int.from_bytes(self.body_view[:2], "little")
-        self.body_view = self.body_view[2:]
+        (length,) = U16.unpack_from(self.body_view, self.offset)
+        self.offset += 2
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[: length * 4])
-        self.body_view = self.body_view[length * 4 :]
+        val = struct.unpack_from(f"<{length}I", self.body_view, self.offset)
+        self.offset += length * 4
         return val
 
     def read_i32_list_i32l(self) -> tuple[int, ...]:
-        length = int.from_bytes(self.body_view[:4], "little")
-        self.body_view = self.body_view[4:]
+        (length,) = U32.unpack_from(self.body_view, self.offset)
+        self.offset += 4
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[: length * 4])
-        self.body_view = self.body_view[length * 4 :]
+        val = struct.unpack_from(f"<{length}I", self.body_view, self.offset)
+        self.offset += length * 4
         return val
 
     def read_string(self) -> str:
-        exists = self.body_view[0] == 0x0B
-        self.body_view = self.body_view[1:]
+        view = self.body_view
+        offset = self.offset
+
+        exists = view[offset] == 0x0B
+        offset += 1
 
         if not exists:
             # no string sent.
+            self.offset = offset
             return ""
 
         # non-empty string, decode str length (uleb128)
         length = shift = 0
 
         while True:
-            byte = self.body_view[0]
-            self.body_view = self.body_view[1:]
+            byte = view[offset]
+            offset += 1
 
             length |= (byte & 0x7F) << shift
             if (byte & 0x80) == 0:
@@ -473,8 +508,8 @@ class BanchoPacketReader:
 
             shift += 7
 
-        val = self.body_view[:length].tobytes().decode()  # copy
-        self.body_view = self.body_view[length:]
+        val = str(view[offset : offset + length], "utf-8")
+        self.offset = offset + length
         return val
 
     # custom osu! types
@@ -508,31 +543,43 @@ class BanchoPacketReader:
             map_name=self.read_string(),
             map_id=self.read_i32(),
             map_md5=self.read_string(),
-            slot_statuses=[self.read_i8() for _ in range(16)],
-            slot_teams=[self.read_i8() for _ in range(16)],
-            # ^^ up to slot_ids, as it relies on slot_statuses ^^
         )
 
-        for status in match.slot_statuses:
-            if status & 124 != 0:  # slot has a player
-                match.slot_ids.append(self.read_i32())
+        slots = MATCH_SLOTS_FMT.unpack_from(self.body_view, self.offset)
+        self.offset += MATCH_SLOTS_FMT.size
+        match.slot_statuses = list(slots[:16])
+        match.slot_teams = list(slots[16:])
 
-        match.host_id = self.read_i32()
-        match.mode = self.read_i8()
-        match.win_condition = self.read_i8()
-        match.team_type = self.read_i8()
-        match.freemods = self.read_i8() == 1
+        # slot ids are only sent for slots which have a player
+        num_players = sum(1 for status in match.slot_statuses if status & 124 != 0)
+        match.slot_ids = list(
+            struct.unpack_from(f"<{num_players}i", self.body_view, self.offset),
+        )
+        self.offset += num_players * 4
+
+        (
+            match.host_id,
+            match.mode,
+            match.win_condition,
+            match.team_type,
+            freemods,
+        ) = MATCH_FOOTER_FMT.unpack_from(self.body_view, self.offset)
+        self.offset += MATCH_FOOTER_FMT.size
+        match.freemods = freemods == 1
 
         if match.freemods:
-            match.slot_mods = [self.read_i32() for _ in range(16)]
+            match.slot_mods = list(
+                MATCH_SLOT_MODS_FMT.unpack_from(self.body_view, self.offset),
+            )
+            self.offset += MATCH_SLOT_MODS_FMT.size
 
         match.seed = self.read_i32()  # used for mania random mod
 
         return match
 
     def read_scoreframe(self) -> ScoreFrame:
-        sf = ScoreFrame(*SCOREFRAME_FMT.unpack_from(self.body_view[:29]))
-        self.body_view = self.body_view[29:]
+        sf = ScoreFrame(*SCOREFRAME_FMT.unpack_from(self.body_view, self.offset))
+        self.offset += SCOREFRAME_FMT.size
 
         if sf.score_v2:
             sf.combo_portion = self.read_f64()
@@ -541,21 +588,33 @@ class BanchoPacketReader:
         return sf
 
     def read_replayframe(self) -> ReplayFrame:
-        return ReplayFrame(
-            button_state=self.read_u8(),
-            taiko_byte=self.read_u8(),  # pre-taiko support (<=2008)
-            x=self.read_f32(),
-            y=self.read_f32(),
-            time=self.read_i32(),
+        frame = ReplayFrame._make(
+            REPLAYFRAME_FMT.unpack_from(self.body_view, self.offset),
         )
+        self.offset += REPLAYFRAME_FMT.size
+        return frame
 
     def read_replayframe_bundle(self) -> ReplayFrameBundle:
         # save raw format to distribute to the other clients
-        raw_data = self.body_view[: self.current_len]
+        raw_data = self.body_view[self.offset : self.offset + self.current_len]
+
+        # bancho proto >= 18 for extra
+        extra, framecount = REPLAYFRAME_BUNDLE_HEADER_FMT.unpack_from(
+            self.body_view,
+            self.offset,
+        )
+        self.offset += REPLAYFRAME_BUNDLE_HEADER_FMT.size
+
+        # decode all frames in a single pass
+        frames_end = self.offset + framecount * REPLAYFRAME_FMT.size
+        frames = list(
+            map(
+                ReplayFrame._make,
+                REPLAYFRAME_FMT.iter_unpack(self.body_view[self.offset : frames_end]),
+            ),
+        )
+        self.offset = frames_end
 
-        extra = self.read_i32()  # bancho proto >= 18
-        framecount = self.read_u16()
-        frames = [self.read_replayframe() for _ in range(framecount)]
         action = ReplayAction(self.read_u8())
         scoreframe = self.read_scoreframe()
         sequence = self.read_u16()
@@ -593,6 +652,33 @@ def write_string(s: str) -> bytes:
     return ret
 
 
+# string headers for all lengths which fit in a single uleb128 byte
+_short_string_headers = [bytes((0x0B, length)) for length in range(0x80)]
+
+
+def write_string_into(buf: bytearray, s: str) -> None:
+    """Write `s` onto the end of `buf` (ULEB128 & string)."""
+    if not s:
+        buf.append(0x00)
+        return
+
+    encoded = s.encode()
+    length = len(encoded)
+
+    if length < 0x80:
+        buf += _short_string_headers[length]
+        buf += encoded
+        return
+
+    buf.append(0x0B)
+    while length >= 0x80:
+        buf.append((length & 0x7F) | 0x80)
+        length >>= 7
+    buf.append(length)
+
+    buf += encoded
+
+
 def write_i32_list(l: Collection[int]) -> bytearray:
     """Write `l` into bytes (int32 list)."""
     ret = bytearray(len(l).to_bytes(2, "little"))
@@ -638,41 +724,47 @@ def write_channel(name: str, topic: str, count: int) -> bytearray:
 
 def write_match(m: Match, send_pw: bool = True) -> bytearray:
     """Write `m` into bytes (osu! match)."""
+    ret = bytearray()
+    write_match_into(ret, m, send_pw)
+    return ret
+
+
+def write_match_into(buf: bytearray, m: Match, send_pw: bool = True) -> None:
+    """Write `m` onto the end of `buf` (osu! match)."""
     # 0 is for match type
-    ret = bytearray(struct.pack("<HbbI", m.id, m.in_progress, 0, m.mods))
-    ret += write_string(m.name)
+    buf += struct.pack("<HbbI", m.id, m.in_progress, 0, m.mods)
+    write_string_into(buf, m.name)
 
     # osu expects \x0b\x00 if there's a password, but it's
     # not being sent, and \x00 if there's no password.
     if m.passwd:
         if send_pw:
-            ret += write_string(m.passwd)
+            write_string_into(buf, m.passwd)
         else:
-            ret += b"\x0b\x00"
+            buf += b"\x0b\x00"
     else:
-        ret += b"\x00"
+        buf.append(0x00)
 
-    ret += write_string(m.map_name)
-    ret += m.map_id.to_bytes(4, "little", signed=True)
-    ret += write_string(m.map_md5)
+    write_string_into(buf, m.map_name)
+    buf += m.map_id.to_bytes(4, "little", signed=True)
+    write_string_into(buf, m.map_md5)
 
-    ret.extend([s.status for s in m.slots])
-    ret.extend([s.team for s in m.slots])
+    buf.extend([s.status for s in m.slots])
+    buf.extend([s.team for s in m.slots])
 
     for s in m.slots:
         if s.status & 0b01111100 != 0:  # SlotStatus.has_player
             assert s.player is not None
-            ret += s.player.id.to_bytes(4, "little")
+            buf += s.player.id.to_bytes(4, "little")
 
-    ret += m.host.id.to_bytes(4, "little")
-    ret.extend((m.mode, m.win_condition, m.team_type, m.freemods))
+    buf += m.host.id.to_bytes(4, "little")
+    buf.extend((m.mode, m.win_condition, m.team_type, m.freemods))
 
     if m.freemods:
         for s in m.slots:
-            ret += s.mods.to_bytes(4, "little")
+            buf += s.mods.to_bytes(4, "little")
 
-    ret += m.seed.to_bytes(4, "little")
-    return ret
+    buf += m.seed.to_bytes(4, "little")
 
 
 SCOREFRAME_FMT = struct.Struct("<iBHHHHHHiHH?BB?")
@@ -729,7 +821,8 @@ _expand_types: dict[osuTypes, Callable[..., bytearray]] = {
 
 def write(packid: int, *args: tuple[Any, osuTypes]) -> bytes:
     """Write `args` into bytes."""
-    ret = bytearray(struct.pack("<Hx", packid))
+    # reserve space for the header; the length is filled in at the end.
+    ret = bytearray(7)
 
     for p_args, p_type in args:
         if p_type == osuTypes.raw:
@@ -739,11 +832,204 @@ def write(packid: int, *args: tuple[Any, osuTypes]) -> bytes:
         elif p_type in _expand_types:
             ret += _expand_types[p_type](*p_args)
 
-    # add size
-    ret[3:3] = struct.pack("<I", len(ret) - 3)
+    PACKET_HEADER_FMT.pack_into(ret, 0, packid, len(ret) - 7)
     return bytes(ret)
 
 
+# struct format characters of osu!'s fixed-size types
+_fixed_size_formats = {
+    osuTypes.i8: "b",
+    osuTypes.u8: "B",
+    osuTypes.i16: "h",
+    osuTypes.u16: "H",
+    osuTypes.i32: "i",
+    osuTypes.u32: "I",
+    osuTypes.f32: "f",
+    osuTypes.i64: "q",
+    osuTypes.u64: "Q",
+    osuTypes.f64: "d",
+}
+
+# layouts of the composite types, flattened into their fields
+_composite_layouts = {
+    osuTypes.message: (osuTypes.string, osuTypes.string, osuTypes.string, osuTypes.i32),
+    osuTypes.channel: (osuTypes.string, osuTypes.string, osuTypes.u16),
+}
+
+
+# writes a field (or a run of fixed-size fields) into a packet's buffer
+_FieldWriter = Callable[[bytearray, Any], None]
+
+
+def _fixed_size_writer(fmt: str) -> _FieldWriter:
+    pack = struct.Struct(fmt).pack
+
+    def write_fixed_size(buf: bytearray, values: tuple[Any, ...]) -> None:
+        buf += pack(*values)
+
+    return write_fixed_size
+
+
+def _write_match_field(buf: bytearray, match_args: tuple[Any, ...]) -> None:
+    write_match_into(buf, *match_args)
+
+
+def _field_writer(p_type: osuTypes) -> _FieldWriter:
+    if p_type == osuTypes.string:
+        return write_string_into
+    elif p_type == osuTypes.raw:
+        return bytearray.extend
+    elif p_type == osuTypes.match:
+        return _write_match_field
+
+    writer = _noexpand_types[p_type]
+
+    def write_field(buf: bytearray, value: Any) -> None:
+        buf += writer(value)
+
+    return write_field
+
+
+def compile_encoder(packet_id: int, *layout: osuTypes) -> Callable[..., bytes]:
+    """\
+    Build a specialized encoder for a single packet layout.
+
+    The encoder is built once (at import time); runs of fixed-size fields
+    are merged into single precompiled structs (the first of which also
+    contains the header), strings are written directly into the output
+    buffer, and the packet's length is filled in afterwards with
+    `pack_into()` rather than by inserting it.
+
+    The encoder takes its arguments flat, in the order of the layout; e.g.
+    the encoder built for (`ServerPackets.USER_ID`, `osuTypes.i32`) is
+    called with the user's id alone.
+    """
+    fields: list[osuTypes] = []
+    for p_type in layout:
+        fields.extend(_composite_layouts.get(p_type, (p_type,)))
+
+    num_fields = len(fields)
+    packet_id = int(packet_id)
+
+    # the header is always part of the first struct, along
+    # with the run of fixed-size fields at the start (if any).
+    num_head_fields = 0
+    head_fmt = "<HxI"
+    for p_type in fields:
+        if p_type not in _fixed_size_formats:
+            break
+
+        head_fmt += _fixed_size_formats[p_type]
+        num_head_fields += 1
+
+    head_struct = struct.Struct(head_fmt)
+
+    if num_head_fields == num_fields:
+        # only fixed-size fields; the length is constant.
+        pack_packet = head_struct.pack
+        length = head_struct.size - 7
+
+        def encode_fixed_size(*args: Any) -> bytes:
+            if len(args) != num_fields:
+                raise TypeError(f"expected {num_fields} fields, got {len(args)}")
+
+            return pack_packet(packet_id, length, *args)
+
+        encode_fixed_size.__qualname__ = encode_fixed_size.__name__ = (
+            f"encode_{packet_id}"
+        )
+        return encode_fixed_size
+
+    # each writer is given the field at its index (or the run at its slice)
+    writers: list[tuple[_FieldWriter, int | slice]] = []
+    run_start: int | None = None
+    for idx in range(num_head_fields, num_fields + 1):
+        p_type = fields[idx] if idx < num_fields else None
+
+        if p_type in _fixed_size_formats:
+            if run_start is None:
+                run_start = idx
+            continue
+
+        if run_start is not None:
+            run_fmt = "<" + "".join(
+                _fixed_size_formats[p] for p in fields[run_start:idx]
+            )
+            writers.append((_fixed_size_writer(run_fmt), slice(run_start, idx)))
+            run_start = None
+
+        if p_type is not None:
+            writers.append((_field_writer(p_type), idx))
+
+    pack_head = head_struct.pack
+    pack_length_into = U32.pack_into
+
+    def encode(*args: Any) -> bytes:
+        if len(args) != num_fields:
+            raise TypeError(f"expected {num_fields} fields, got {len(args)}")
+
+        buf = bytearray(pack_head(packet_id, 0, *args[:num_head_fields]))
+        for write_field, idx in writers:
+            write_field(buf, args[idx])
+
+        pack_length_into(buf, 3, len(buf) - 7)
+        return bytes(buf)
+
+    encode.__qualname__ = encode.__name__ = f"encode_{packet_id}"
+    return encode
+
+
+# packets which are fully superseded by a newer
+# packet of the same kind about the same subject.
+COALESCABLE_PACKETS = frozenset(
+    (
+        ServerPackets.USER_STATS,
+        ServerPackets.USER_PRESENCE,
+        ServerPackets.CHANNEL_INFO,
+    ),
+)
+
+
+def coalesce_key(data: bytes) -> tuple[int, int | bytes] | None:
+    """\
+    Return the (packet id, subject) key of `data` if it's a single packet
+    which may be replaced by a newer one with the same key before it has
+    been sent, or None if `data` must be sent as is.
+
+    The subject is the user id for stats & presence packets,
+    and the (encoded) channel name for channel info packets.
+    """
+    # fastpath; most packets we send aren't coalescable.
+    if len(data) < 8 or data[1] != 0 or data[0] not in COALESCABLE_PACKETS:
+        return None
+
+    packet_id, length = PACKET_HEADER_FMT.unpack_from(data)
+    if len(data) != length + 7:
+        # multiple packets bundled together.
+        return None
+
+    if packet_id != ServerPackets.CHANNEL_INFO:
+        return packet_id, int.from_bytes(data[7:11], "little", signed=True)
+
+    if data[7] != 0x0B:
+        return packet_id, b""
+
+    # decode the channel name's length (uleb128)
+    offs = 8
+    name_len = shift = 0
+    while True:
+        byte = data[offs]
+        offs += 1
+
+        name_len |= (byte & 0x7F) << shift
+        if (byte & 0x80) == 0:
+            break
+
+        shift += 7
+
+    return packet_id, data[offs : offs + name_len]
+
+
 #
 # packets
 #
@@ -774,11 +1060,11 @@ def login_reply(user_id: int) -> bytes:
 
 
 # packet id: 7
+_encode_send_message = compile_encoder(ServerPackets.SEND_MESSAGE, osuTypes.message)
+
+
 def send_message(sender: str, msg: str, recipient: str, sender_id: int) -> bytes:
-    return write(
-        ServerPackets.SEND_MESSAGE,
-        ((sender, msg, recipient, sender_id), osuTypes.message),
-    )
+    return _encode_send_message(sender, msg, recipient, sender_id)
 
 
 # packet id: 8
@@ -837,6 +1123,24 @@ def bot_stats(player: Player) -> bytes:
 
 
 # packet id: 11
+_encode_user_stats = compile_encoder(
+    ServerPackets.USER_STATS,
+    osuTypes.i32,  # user id
+    osuTypes.u8,  # action
+    osuTypes.string,  # info text
+    osuTypes.string,  # map md5
+    osuTypes.i32,  # mods
+    osuTypes.u8,  # mode
+    osuTypes.i32,  # map id
+    osuTypes.i64,  # ranked score
+    osuTypes.f32,  # accuracy
+    osuTypes.i32,  # plays
+    osuTypes.i64,  # total score
+    osuTypes.i32,  # global rank
+    osuTypes.u16,  # pp
+)
+
+
 def _user_stats(
     user_id: int,
     action: int,
@@ -858,26 +1162,47 @@ def _user_stats(
         ranked_score = pp
         pp = 0
 
-    return write(
-        ServerPackets.USER_STATS,
-        (user_id, osuTypes.i32),
-        (action, osuTypes.u8),
-        (info_text, osuTypes.string),
-        (map_md5, osuTypes.string),
-        (mods, osuTypes.i32),
-        (mode, osuTypes.u8),
-        (map_id, osuTypes.i32),
-        (ranked_score, osuTypes.i64),
-        (accuracy / 100.0, osuTypes.f32),
-        (plays, osuTypes.i32),
-        (total_score, osuTypes.i64),
-        (global_rank, osuTypes.i32),
-        (pp, osuTypes.u16),
+    return _encode_user_stats(
+        user_id,
+        action,
+        info_text,
+        map_md5,
+        mods,
+        mode,
+        map_id,
+        ranked_score,
+        accuracy / 100.0,
+        plays,
+        total_score,
+        global_rank,
+        pp,
     )
 
 
 def user_stats(player: Player) -> bytes:
+    status = player.status
     gm_stats = player.gm_stats
+
+    # only re-serialize the packet when something it encodes has changed.
+    fields = (
+        player.id,
+        status.action,
+        status.info_text,
+        status.map_md5,
+        status.mods,
+        status.mode,
+        status.map_id,
+        gm_stats.rscore,
+        gm_stats.acc,
+        gm_stats.plays,
+        gm_stats.tscore,
+        gm_stats.rank,
+        gm_stats.pp,
+    )
+    cached = player._stats_packet
+    if cached is not None and cached[0] == fields:
+        return cached[1]
+
     if gm_stats.pp > 0xFFFF:
         # HACK: if pp is over osu!'s ingame cap,
         # we can instead display it as ranked score
@@ -887,22 +1212,23 @@ def user_stats(player: Player) -> bytes:
         rscore = gm_stats.rscore
         pp = gm_stats.pp
 
-    return write(
-        ServerPackets.USER_STATS,
-        (player.id, osuTypes.i32),
-        (player.status.action, osuTypes.u8),
-        (player.status.info_text, osuTypes.string),
-        (player.status.map_md5, osuTypes.string),
-        (player.status.mods, osuTypes.i32),
-        (player.status.mode.as_vanilla, osuTypes.u8),
-        (player.status.map_id, osuTypes.i32),
-        (rscore, osuTypes.i64),
-        (gm_stats.acc / 100.0, osuTypes.f32),
-        (gm_stats.plays, osuTypes.i32),
-        (gm_stats.tscore, osuTypes.i64),
-        (gm_stats.rank, osuTypes.i32),
-        (pp, osuTypes.u16),
+    packet = _encode_user_stats(
+        player.id,
+        status.action,
+        status.info_text,
+        status.map_md5,
+        status.mods,
+        status.mode.as_vanilla,
+        status.map_id,
+        rscore,
+        gm_stats.acc / 100.0,
+        gm_stats.plays,
+        gm_stats.tscore,
+        gm_stats.rank,
+        pp,
     )
+    player._stats_packet = (fields, packet)
+    return packet
 
 
 # packet id: 12
@@ -924,13 +1250,16 @@ def spectator_left(user_id: int) -> bytes:
 
 
 # packet id: 15
+_encode_spectate_frames = compile_encoder(ServerPackets.SPECTATE_FRAMES, osuTypes.raw)
+
+
 def spectate_frames(data: bytes) -> bytes:
     # NOTE: this is left as unvalidated (raw) for efficiency due to the
     # sheer rate of usage of these packets in spectator mode.
 
     # spectator frames *received* by the server are always validated.
 
-    return write(ServerPackets.SPECTATE_FRAMES, (data, osuTypes.raw))
+    return _encode_spectate_frames(data)
 
 
 # packet id: 19
@@ -958,8 +1287,11 @@ def notification(msg: str) -> bytes:
 
 
 # packet id: 26
+_encode_update_match = compile_encoder(ServerPackets.UPDATE_MATCH, osuTypes.match)
+
+
 def update_match(m: Match, send_pw: bool = True) -> bytes:
-    return write(ServerPackets.UPDATE_MATCH, ((m, send_pw), osuTypes.match))
+    return _encode_update_match((m, send_pw))
 
 
 # packet id: 27
@@ -1147,6 +1479,19 @@ def bot_presence(player: Player) -> bytes:
 
 
 # packet id: 83
+_encode_user_presence = compile_encoder(
+    ServerPackets.USER_PRESENCE,
+    osuTypes.i32,  # user id
+    osuTypes.string,  # name
+    osuTypes.u8,  # utc offset
+    osuTypes.u8,  # country code
+    osuTypes.u8,  # bancho privileges & mode
+    osuTypes.f32,  # longitude
+    osuTypes.f32,  # latitude
+    osuTypes.i32,  # global rank
+)
+
+
 def _user_presence(
     user_id: int,
     name: str,
@@ -1158,31 +1503,49 @@ def _user_presence(
     longitude: int,
     global_rank: int,
 ) -> bytes:
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (user_id, osuTypes.i32),
-        (name, osuTypes.string),
-        (utc_offset + 24, osuTypes.u8),
-        (country_code, osuTypes.u8),
-        (bancho_privileges | (mode << 5), osuTypes.u8),
-        (longitude, osuTypes.f32),
-        (latitude, osuTypes.f32),
-        (global_rank, osuTypes.i32),
+    return _encode_user_presence(
+        user_id,
+        name,
+        utc_offset + 24,
+        country_code,
+        bancho_privileges | (mode << 5),
+        longitude,
+        latitude,
+        global_rank,
     )
 
 
 def user_presence(player: Player) -> bytes:
-    return write(
-        ServerPackets.USER_PRESENCE,
-        (player.id, osuTypes.i32),
-        (player.name, osuTypes.string),
-        (player.utc_offset + 24, osuTypes.u8),
-        (player.geoloc["country"]["numeric"], osuTypes.u8),
-        (player.bancho_priv | (player.status.mode.as_vanilla << 5), osuTypes.u8),
-        (player.geoloc["longitude"], osuTypes.f32),
-        (player.geoloc["latitude"], osuTypes.f32),
-        (player.gm_stats.rank, osuTypes.i32),
+    geoloc = player.geoloc
+
+    # only re-serialize the packet when something it encodes has changed.
+    fields = (
+        player.id,
+        player.name,
+        player.utc_offset,
+        geoloc["country"]["numeric"],
+        player.bancho_priv,
+        player.status.mode,
+        geoloc["longitude"],
+        geoloc["latitude"],
+        player.gm_stats.rank,
+    )
+    cached = player._presence_packet
+    if cached is not None and cached[0] == fields:
+        return cached[1]
+
+    packet = _encode_user_presence(
+        player.id,
+        player.name,
+        player.utc_offset + 24,
+        geoloc["country"]["numeric"],
+        player.bancho_priv | (player.status.mode.as_vanilla << 5),
+        geoloc["longitude"],
+        geoloc["latitude"],
+        player.gm_stats.rank,
     )
+    player._presence_packet = (fields, packet)
+    return packet
 
 
 # packet id: 86
@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-from collections.abc import Callable
-from typing import TYPE_CHECKING
 from typing import TypedDict
 from typing import cast
 
@@ -11,9 +9,6 @@ from app._typing import _UnsetSentinel
 from app.repositories import Base
 from app.repositories import user_achievements as ua
 
-if TYPE_CHECKING:
-    from app.objects.score import Score
-
 from sqlalchemy import Column
 from sqlalchemy import Index
 from sqlalchemy import Integer
@@ -55,7 +50,7 @@ class Achievement(TypedDict):
     file: str
     name: str
     desc: str
-    cond: Callable[[Score, int], bool]
+    cond: str
 
 
 async def create(
@@ -77,7 +72,6 @@ async def create(
     achievement = await app.state.services.database.fetch_one(select_stmt)
     assert achievement is not None
 
-    achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
     return cast(Achievement, achievement)
 
 
@@ -100,7 +94,6 @@ async def fetch_one(
     if achievement is None:
         return None
 
-    achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
     return cast(Achievement, achievement)
 
 
@@ -123,9 +116,6 @@ async def fetch_many(
         select_stmt = select_stmt.limit(page_size).offset((page - 1) * page_size)
 
     achievements = await app.state.services.database.fetch_all(select_stmt)
-    for achievement in achievements:
-        achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
-
     return cast(list[Achievement], achievements)
 
 
@@ -146,9 +136,6 @@ async def fetch_user_locked(
     select_stmt = (select(*READ_PARAMS)).where(~subq)
 
     achievements = await app.state.services.database.fetch_all(select_stmt)
-    for achievement in achievements:
-        achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
-
     return cast(list[Achievement], achievements)
 
 
@@ -177,7 +164,6 @@ async def partial_update(
     if achievement is None:
         return None
 
-    achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
     return cast(Achievement, achievement)
 
 
@@ -193,5 +179,4 @@ async def delete_one(
     delete_stmt = delete(AchievementsTable).where(AchievementsTable.id == id)
     await app.state.services.database.execute(delete_stmt)
 
-    achievement["cond"] = eval(f'lambda score, mode_vn: {achievement["cond"]}')
     return cast(Achievement, achievement)
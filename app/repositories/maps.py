@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
 from datetime import datetime
 from enum import StrEnum
 from typing import TypedDict
@@ -255,6 +256,7 @@ async def fetch_many(
     page: int | None = None,
     page_size: int | None = None,
     order_by: str | None = None,  # Optional parameter for ordering
+    filenames: Sequence[str] | None = None,
 ) -> list[Map]:
     """Fetch a list of maps from the database."""
     select_stmt = select(*READ_PARAMS)
@@ -270,6 +272,8 @@ async def fetch_many(
         select_stmt = select_stmt.where(MapsTable.creator == creator)
     if filename is not None:
         select_stmt = select_stmt.where(MapsTable.filename == filename)
+    if filenames is not None:
+        select_stmt = select_stmt.where(MapsTable.filename.in_(filenames))
     if mode is not None:
         select_stmt = select_stmt.where(MapsTable.mode == mode)
     if frozen is not None:
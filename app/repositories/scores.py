@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
 from datetime import datetime
 from typing import TypedDict
 from typing import cast
@@ -204,10 +205,13 @@ async def fetch_many(
     user_id: int | None = None,
     page: int | None = None,
     page_size: int | None = None,
+    map_md5s: Sequence[str] | None = None,
 ) -> list[Score]:
     select_stmt = select(*READ_PARAMS)
     if map_md5 is not None:
         select_stmt = select_stmt.where(ScoresTable.map_md5 == map_md5)
+    if map_md5s is not None:
+        select_stmt = select_stmt.where(ScoresTable.map_md5.in_(map_md5s))
     if mods is not None:
         select_stmt = select_stmt.where(ScoresTable.mods == mods)
     if status is not None:
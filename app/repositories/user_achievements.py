@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
 from typing import TypedDict
 from typing import cast
 
@@ -56,6 +57,17 @@ async def create(user_id: int, achievement_id: int) -> UserAchievement:
     return cast(UserAchievement, user_achievement)
 
 
+async def create_many(user_id: int, achievement_ids: Sequence[int]) -> None:
+    """Creates many new user achievement entries, in a single statement."""
+    insert_stmt = insert(UserAchievementsTable).values(
+        [
+            {"userid": user_id, "achid": achievement_id}
+            for achievement_id in achievement_ids
+        ],
+    )
+    await app.state.services.database.execute(insert_stmt)
+
+
 async def fetch_many(
     user_id: int | _UnsetSentinel = UNSET,
     achievement_id: int | _UnsetSentinel = UNSET,
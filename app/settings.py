@@ -70,6 +70,28 @@ DEBUG = read_bool(os.environ["DEBUG"])
 REDIRECT_OSU_URLS = read_bool(os.environ["REDIRECT_OSU_URLS"])
 
 PP_CACHED_ACCURACIES = [int(acc) for acc in read_list(os.environ["PP_CACHED_ACCS"])]
+PP_CALC_WORKERS = int(os.environ["PP_CALC_WORKERS"])
+PP_CALC_MAX_QUEUE_SIZE = int(os.environ["PP_CALC_MAX_QUEUE_SIZE"])
+PP_CALC_TIMEOUT = float(os.environ["PP_CALC_TIMEOUT"])
+PP_CALC_BEATMAP_CACHE_SIZE = int(os.environ["PP_CALC_BEATMAP_CACHE_SIZE"])
+PP_CALC_DIFFICULTY_CACHE_SIZE = int(os.environ["PP_CALC_DIFFICULTY_CACHE_SIZE"])
+
+BEATMAP_CACHE_MAX_SETS = int(os.environ["BEATMAP_CACHE_MAX_SETS"])
+BEATMAP_CACHE_MAX_BYTES = int(os.environ["BEATMAP_CACHE_MAX_BYTES"])
+LEADERBOARD_CACHE_SIZE = int(os.environ["LEADERBOARD_CACHE_SIZE"])
+LEADERBOARD_CACHE_DEPTH = int(os.environ["LEADERBOARD_CACHE_DEPTH"])
+REPLAY_HEADER_CACHE_SIZE = int(os.environ["REPLAY_HEADER_CACHE_SIZE"])
+SEARCH_CACHE_SIZE = int(os.environ["SEARCH_CACHE_SIZE"])
+SEARCH_CACHE_TTL = float(os.environ["SEARCH_CACHE_TTL"])
+
+WRITE_BEHIND_WORKERS = int(os.environ["WRITE_BEHIND_WORKERS"])
+WRITE_BEHIND_MAX_QUEUE_SIZE = int(os.environ["WRITE_BEHIND_MAX_QUEUE_SIZE"])
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ["WRITE_BEHIND_FLUSH_INTERVAL"])
+
+GEOLOCATION_DATABASE_PATH = os.environ["GEOLOCATION_DATABASE_PATH"]
+GEOLOCATION_HTTP_FALLBACK = read_bool(os.environ["GEOLOCATION_HTTP_FALLBACK"])
+GEOLOCATION_CACHE_SIZE = int(os.environ["GEOLOCATION_CACHE_SIZE"])
+GEOLOCATION_NEGATIVE_CACHE_TTL = float(os.environ["GEOLOCATION_NEGATIVE_CACHE_TTL"])
 
 DISALLOWED_NAMES = read_list(os.environ["DISALLOWED_NAMES"])
 DISALLOWED_PASSWORDS = read_list(os.environ["DISALLOWED_PASSWORDS"])
@@ -1,14 +1,523 @@
 from __future__ import annotations
 
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from collections import defaultdict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from dataclasses import dataclass
 from typing import TYPE_CHECKING
+from typing import Any
+
+import app.metrics
+import app.settings
+from app.constants.gamemodes import GameMode
 
 if TYPE_CHECKING:
     from app.objects.beatmap import Beatmap
     from app.objects.beatmap import BeatmapSet
 
 
+class BeatmapCache:
+    """\
+    An LRU cache of beatmap sets & their beatmaps, bounded by both
+    a number of sets and an (estimated) number of bytes.
+
+    Sets are the unit of caching & eviction; each set's maps are indexed
+    by both md5 and id, and always enter & leave the cache together with
+    their set, so the md5, id & set id indexes can't disagree.
+
+    Possibly confusing attributes
+    -----------
+    _sets: `OrderedDict[int, BeatmapSet]`
+        The cached sets, in order of least to most recently used.
+
+    _keys: `dict[int, tuple[str | int, ...]]`
+        The map md5s & ids each set is currently indexed under; a set's
+        maps may change (e.g. after an osu!api update) while it's cached.
+
+    _sizes: `dict[int, int]`
+        The estimated memory usage of each cached set, in bytes.
+    """
+
+    def __init__(self, max_sets: int, max_bytes: int) -> None:
+        self.max_sets = max_sets
+        self.max_bytes = max_bytes
+
+        self._sets: OrderedDict[int, BeatmapSet] = OrderedDict()
+        self._maps: dict[str | int, Beatmap] = {}
+        self._keys: dict[int, tuple[str | int, ...]] = {}
+        self._sizes: dict[int, int] = {}
+        self.size_bytes = 0
+
+        self.maps = _BeatmapView(self)
+        self.sets = _BeatmapSetView(self)
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def get_map(self, key: str | int) -> Beatmap | None:
+        """Get a beatmap from the cache by md5 or id."""
+        bmap = self._maps.get(key)
+        if bmap is None:
+            app.metrics.increment("ex_beatmap_cache_misses")
+            return None
+
+        self._sets.move_to_end(bmap.set.id)
+        app.metrics.increment("ex_beatmap_cache_hits")
+        return bmap
+
+    def get_set(self, bsid: int) -> BeatmapSet | None:
+        """Get a beatmap set from the cache by set id."""
+        bmap_set = self._sets.get(bsid)
+        if bmap_set is None:
+            app.metrics.increment("ex_beatmap_cache_misses")
+            return None
+
+        self._sets.move_to_end(bsid)
+        app.metrics.increment("ex_beatmap_cache_hits")
+        return bmap_set
+
+    def add_set(self, bmap_set: BeatmapSet) -> None:
+        """Add (or refresh) `bmap_set` and its maps in the cache."""
+        if bmap_set.id in self._sets:
+            self._unindex(bmap_set.id)
+
+        keys: list[str | int] = []
+        for bmap in bmap_set.maps:
+            self._maps[bmap.md5] = bmap
+            self._maps[bmap.id] = bmap
+            keys += (bmap.md5, bmap.id)
+
+        self._sets[bmap_set.id] = bmap_set
+        self._keys[bmap_set.id] = tuple(keys)
+
+        size = _estimate_size(bmap_set)
+        self._sizes[bmap_set.id] = size
+        self.size_bytes += size
+
+        self._evict()
+
+    def remove_set(self, bsid: int) -> None:
+        """Remove a beatmap set and its maps from the cache."""
+        if bsid in self._sets:
+            self._unindex(bsid)
+
+    def evict_expired(self) -> int:
+        """\
+        Evict all sets whose cached data has expired; they would be
+        updated from the osu!api on their next use regardless.
+
+        Returns the number of sets evicted.
+        """
+        expired = [bsid for bsid, s in self._sets.items() if s._cache_expired()]
+        for bsid in expired:
+            self._unindex(bsid)
+
+        app.metrics.increment("ex_beatmap_cache_evictions", len(expired))
+        app.metrics.set_value("ex_beatmap_cache_bytes", self.size_bytes)
+        return len(expired)
+
+    def _unindex(self, bsid: int) -> None:
+        self._sets.pop(bsid)
+        for key in self._keys.pop(bsid):
+            bmap = self._maps.get(key)
+            if bmap is not None and bmap.set.id == bsid:
+                del self._maps[key]
+
+        self.size_bytes -= self._sizes.pop(bsid)
+
+    def _evict(self) -> None:
+        """Evict the least recently used sets until we're within budget."""
+        evicted = 0
+        while len(self._sets) > 1 and (
+            len(self._sets) > self.max_sets or self.size_bytes > self.max_bytes
+        ):
+            self._unindex(next(iter(self._sets)))
+            evicted += 1
+
+        if evicted:
+            app.metrics.increment("ex_beatmap_cache_evictions", evicted)
+
+        app.metrics.set_value("ex_beatmap_cache_bytes", self.size_bytes)
+
+
+class _BeatmapView(Mapping[str | int, "Beatmap"]):
+    """A read-only view of the cached beatmaps, by md5 and id."""
+
+    def __init__(self, cache: BeatmapCache) -> None:
+        self._cache = cache
+
+    def __getitem__(self, key: str | int) -> Beatmap:
+        bmap = self._cache.get_map(key)
+        if bmap is None:
+            raise KeyError(key)
+        return bmap
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._cache._maps
+
+    def __iter__(self) -> Iterator[str | int]:
+        return iter(self._cache._maps)
+
+    def __len__(self) -> int:
+        return len(self._cache._maps)
+
+
+class _BeatmapSetView(Mapping[int, "BeatmapSet"]):
+    """A read-only view of the cached beatmap sets, by set id."""
+
+    def __init__(self, cache: BeatmapCache) -> None:
+        self._cache = cache
+
+    def __getitem__(self, bsid: int) -> BeatmapSet:
+        bmap_set = self._cache.get_set(bsid)
+        if bmap_set is None:
+            raise KeyError(bsid)
+        return bmap_set
+
+    def __contains__(self, bsid: object) -> bool:
+        return bsid in self._cache._sets
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._cache._sets)
+
+    def __len__(self) -> int:
+        return len(self._cache._sets)
+
+
+def _estimate_size(bmap_set: BeatmapSet) -> int:
+    """Estimate the memory used by `bmap_set` and its maps, in bytes."""
+    size = sys.getsizeof(bmap_set) + sys.getsizeof(bmap_set.maps)
+    for bmap in bmap_set.maps:
+        attrs = vars(bmap)
+        size += sys.getsizeof(bmap) + sys.getsizeof(attrs)
+        size += sum(sys.getsizeof(v) for k, v in attrs.items() if k != "set")
+
+    return size
+
+
+LeaderboardKey = tuple[str, int, str]  # (map md5, mode, scoring metric)
+
+
+@dataclass
+class Leaderboard:
+    """\
+    The best scores of unrestricted players on a map, in a mode.
+
+    Possibly confusing attributes
+    -----------
+    scores: `list[dict[str, Any]]`
+        The top scores in descending order of the scoring metric.
+
+    complete: `bool`
+        Whether `scores` contains every score on the leaderboard, rather
+        than only the top scores; if so, it may be filtered freely.
+    """
+
+    scores: list[dict[str, Any]]
+    complete: bool
+
+
+class LeaderboardCache:
+    """\
+    An LRU cache of map leaderboards, by (map md5, mode, scoring metric).
+
+    Possibly confusing attributes
+    -----------
+    _user_keys: `defaultdict[int, set[LeaderboardKey]]`
+        The leaderboards each player has a cached score on, so their
+        leaderboards can be invalidated when e.g. they're restricted.
+
+    generation: `int`
+        Incremented with each invalidation; a leaderboard read from sql
+        is only cached if no invalidation occurred while it was read.
+    """
+
+    def __init__(self, max_leaderboards: int) -> None:
+        self.max_leaderboards = max_leaderboards
+
+        self._leaderboards: OrderedDict[LeaderboardKey, Leaderboard] = OrderedDict()
+        self._user_keys: defaultdict[int, set[LeaderboardKey]] = defaultdict(set)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._leaderboards)
+
+    def get(self, key: LeaderboardKey) -> Leaderboard | None:
+        leaderboard = self._leaderboards.get(key)
+        if leaderboard is None:
+            app.metrics.increment("ex_leaderboard_cache_misses")
+            return None
+
+        self._leaderboards.move_to_end(key)
+        app.metrics.increment("ex_leaderboard_cache_hits")
+        return leaderboard
+
+    def add(
+        self,
+        key: LeaderboardKey,
+        leaderboard: Leaderboard,
+        generation: int,
+    ) -> None:
+        """Cache a leaderboard read from sql when `self.generation` was `generation`."""
+        if generation != self.generation:
+            # it was invalidated while being read
+            return
+
+        if key in self._leaderboards:
+            self._remove(key)
+
+        self._leaderboards[key] = leaderboard
+        for score in leaderboard.scores:
+            self._user_keys[score["userid"]].add(key)
+
+        while len(self._leaderboards) > self.max_leaderboards:
+            self._remove(next(iter(self._leaderboards)))
+
+    def invalidate_map(self, map_md5: str, mode: GameMode | None = None) -> None:
+        """Invalidate a map's leaderboards in `mode` (or all modes)."""
+        self.generation += 1
+
+        modes = (mode,) if mode is not None else tuple(GameMode)
+        for _mode in modes:
+            for scoring_metric in ("pp", "score"):
+                key = (map_md5, _mode.value, scoring_metric)
+                if key in self._leaderboards:
+                    self._remove(key)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Invalidate all leaderboards a player has a cached score on."""
+        self.generation += 1
+
+        for key in self._user_keys.pop(user_id, ()):
+            if key in self._leaderboards:
+                self._remove(key)
+
+    def _remove(self, key: LeaderboardKey) -> None:
+        leaderboard = self._leaderboards.pop(key)
+        for score in leaderboard.scores:
+            user_keys = self._user_keys.get(score["userid"])
+            if user_keys is not None:
+                user_keys.discard(key)
+                if not user_keys:
+                    del self._user_keys[score["userid"]]
+
+
+@dataclass
+class ReplayHeader:
+    """\
+    The .osr headers of a score's replay, which don't change unless
+    its player is renamed or its score is deleted.
+
+    Possibly confusing attributes
+    -----------
+    data: `bytes`
+        The encoded headers preceding the length of the replay frames.
+
+    content_disposition: `str`
+        The content disposition of the replay's download, which names it
+        after its player & map.
+    """
+
+    user_id: int
+    map_md5: str
+    data: bytes
+    content_disposition: str
+
+
+class ReplayHeaderCache:
+    """\
+    An LRU cache of replays' .osr headers, by score id.
+
+    Possibly confusing attributes
+    -----------
+    _user_score_ids: `defaultdict[int, set[int]]`
+        The score ids of each player's cached headers.
+
+    _map_score_ids: `defaultdict[str, set[int]]`
+        The score ids of each map's cached headers.
+
+    generation: `int`
+        Incremented with each invalidation; headers read from sql
+        are only cached if no invalidation occurred while they were read.
+    """
+
+    def __init__(self, max_headers: int) -> None:
+        self.max_headers = max_headers
+
+        self._headers: OrderedDict[int, ReplayHeader] = OrderedDict()
+        self._user_score_ids: defaultdict[int, set[int]] = defaultdict(set)
+        self._map_score_ids: defaultdict[str, set[int]] = defaultdict(set)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def get(self, score_id: int) -> ReplayHeader | None:
+        header = self._headers.get(score_id)
+        if header is None:
+            app.metrics.increment("ex_replay_header_cache_misses")
+            return None
+
+        self._headers.move_to_end(score_id)
+        app.metrics.increment("ex_replay_header_cache_hits")
+        return header
+
+    def add(self, score_id: int, header: ReplayHeader, generation: int) -> None:
+        """Cache headers read from sql when `self.generation` was `generation`."""
+        if generation != self.generation:
+            # they were invalidated while being read
+            return
+
+        if score_id in self._headers:
+            self._remove(score_id)
+
+        self._headers[score_id] = header
+        self._user_score_ids[header.user_id].add(score_id)
+        self._map_score_ids[header.map_md5].add(score_id)
+
+        while len(self._headers) > self.max_headers:
+            self._remove(next(iter(self._headers)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Invalidate the headers of a player's replays, e.g. when they're renamed."""
+        self.generation += 1
+
+        for score_id in tuple(self._user_score_ids.get(user_id, ())):
+            self._remove(score_id)
+
+    def invalidate_map(self, map_md5: str) -> None:
+        """Invalidate the headers of a map's replays, e.g. when it's deleted."""
+        self.generation += 1
+
+        for score_id in tuple(self._map_score_ids.get(map_md5, ())):
+            self._remove(score_id)
+
+    def _remove(self, score_id: int) -> None:
+        header = self._headers.pop(score_id)
+
+        for index, key in (
+            (self._user_score_ids, header.user_id),
+            (self._map_score_ids, header.map_md5),
+        ):
+            score_ids = index[key]
+            score_ids.discard(score_id)
+            if not score_ids:
+                del index[key]
+
+
+class SearchCache:
+    """\
+    An LRU cache of formatted osu!direct search responses, which expire
+    after a short time; concurrent requests for a response which isn't
+    cached are coalesced, so that only one of them queries for it.
+
+    Possibly confusing attributes
+    -----------
+    _responses: `OrderedDict[Hashable, tuple[bytes, float]]`
+        The cached responses & the (monotonic) time they expire.
+
+    _in_flight: `dict[Hashable, asyncio.Task[bytes | None]]`
+        The responses currently being built, awaited by all of the
+        requests for them.
+    """
+
+    def __init__(self, max_responses: int, ttl: float) -> None:
+        self.max_responses = max_responses
+        self.ttl = ttl
+
+        self._responses: OrderedDict[Hashable, tuple[bytes, float]] = OrderedDict()
+        self._in_flight: dict[Hashable, asyncio.Task[bytes | None]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _record(self, metric: str, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        app.metrics.increment(metric)
+        app.metrics.set_value(
+            "ex_search_cache_hit_ratio",
+            self.hits / (self.hits + self.misses),
+        )
+
+    async def get_or_build(
+        self,
+        key: Hashable,
+        build: Callable[[], Awaitable[bytes | None]],
+    ) -> bytes | None:
+        """\
+        Get a cached response, or build it with `build`; responses
+        of `None` (failures) are returned, but not cached.
+        """
+        cached = self._responses.get(key)
+        if cached is not None:
+            response, expires_at = cached
+            if expires_at > time.monotonic():
+                self._responses.move_to_end(key)
+                self._record("ex_search_cache_hits", hit=True)
+                return response
+
+            del self._responses[key]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._record("ex_search_cache_coalesced", hit=True)
+        else:
+            self._record("ex_search_cache_misses", hit=False)
+            in_flight = asyncio.create_task(self._build(key, build))
+            self._in_flight[key] = in_flight
+
+        # the response is built in its own task, so requests which are
+        # cancelled (e.g. disconnect) don't cancel it for the others.
+        return await asyncio.shield(in_flight)
+
+    async def _build(
+        self,
+        key: Hashable,
+        build: Callable[[], Awaitable[bytes | None]],
+    ) -> bytes | None:
+        try:
+            response = await build()
+        finally:
+            del self._in_flight[key]
+
+        if response is not None:
+            self._responses[key] = (response, time.monotonic() + self.ttl)
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+
+        return response
+
+
 bcrypt: dict[bytes, bytes] = {}  # {bcrypt: md5, ...}
-beatmap: dict[str | int, Beatmap] = {}  # {md5: map, id: map, ...}
-beatmapset: dict[int, BeatmapSet] = {}  # {bsid: map_set}
+beatmaps = BeatmapCache(
+    max_sets=app.settings.BEATMAP_CACHE_MAX_SETS,
+    max_bytes=app.settings.BEATMAP_CACHE_MAX_BYTES,
+)
+beatmap = beatmaps.maps  # {md5: map, id: map, ...}
+beatmapset = beatmaps.sets  # {bsid: map_set}
+leaderboards = LeaderboardCache(
+    max_leaderboards=app.settings.LEADERBOARD_CACHE_SIZE,
+)
+replay_headers = ReplayHeaderCache(
+    max_headers=app.settings.REPLAY_HEADER_CACHE_SIZE,
+)
+searches = SearchCache(
+    max_responses=app.settings.SEARCH_CACHE_SIZE,
+    ttl=app.settings.SEARCH_CACHE_TTL,
+)
 unsubmitted: set[str] = set()  # {md5, ...}
 needs_update: set[str] = set()  # {md5, ...}
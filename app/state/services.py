@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
+import csv
 import ipaddress
 import logging
 import pickle
 import re
 import secrets
+import time
+from collections import OrderedDict
 from collections.abc import AsyncGenerator
+from collections.abc import Iterable
 from collections.abc import Mapping
 from collections.abc import MutableMapping
 from pathlib import Path
@@ -17,6 +23,7 @@ import httpx
 import pymysql
 from redis import asyncio as aioredis
 
+import app.metrics
 import app.settings
 import app.state
 from app._typing import IPAddress
@@ -121,6 +128,198 @@ class IPResolver:
         return ip
 
 
+class GeolocationRanges:
+    """\
+    A sorted array of ip ranges & their geolocations, for one ip version.
+
+    Possibly confusing attributes
+    -----------
+    starts: `list[int]`
+        The first address of each range, in ascending order; ranges are
+        found by bisecting this, and checking the address against `ends`.
+    """
+
+    def __init__(self, ranges: Iterable[tuple[int, int, Geolocation]] = ()) -> None:
+        sorted_ranges = sorted(ranges, key=lambda r: r[0])
+        self.starts = [start for start, _, _ in sorted_ranges]
+        self.ends = [end for _, end, _ in sorted_ranges]
+        self.geolocs = [geoloc for _, _, geoloc in sorted_ranges]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def lookup(self, ip: IPAddress) -> Geolocation | None:
+        address = int(ip)
+
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i < 0 or address > self.ends[i]:
+            return None
+
+        return self.geolocs[i]
+
+
+def _parse_geoloc_row(
+    row: list[str],
+) -> tuple[IPAddress, IPAddress, str, float, float] | None:
+    """\
+    Parse a row of a geolocation database; either a network (as in MaxMind's
+    csvs) or a range of addresses, followed by a country code & coordinates:
+
+    `network,country_code,latitude,longitude`
+    `start_ip,end_ip,country_code,latitude,longitude`
+    """
+    try:
+        if "/" in row[0]:
+            network = ipaddress.ip_network(row[0].strip())
+            start, end = network.network_address, network.broadcast_address
+            country_code, latitude, longitude = row[1:4]
+        else:
+            start_ip, end_ip = row[0].strip(), row[1].strip()
+            if start_ip.isdigit():
+                start = ipaddress.ip_address(int(start_ip))
+                end = ipaddress.ip_address(int(end_ip))
+            else:
+                start = ipaddress.ip_address(start_ip)
+                end = ipaddress.ip_address(end_ip)
+
+            country_code, latitude, longitude = row[2:5]
+
+        country_code = country_code.strip().lower()
+        return start, end, country_code, float(latitude), float(longitude)
+    except (ValueError, IndexError):
+        # headers, or malformed rows
+        return None
+
+
+def load_geoloc_database(path: Path) -> dict[int, GeolocationRanges]:
+    """Load a csv geolocation database into sorted ranges for each ip version."""
+    ranges: dict[int, list[tuple[int, int, Geolocation]]] = {4: [], 6: []}
+
+    # many ranges share a location, so share their geolocation objects
+    geolocs: dict[tuple[str, float, float], Geolocation] = {}
+
+    with path.open(newline="") as f:
+        for row in csv.reader(f):
+            parsed = _parse_geoloc_row(row)
+            if parsed is None:
+                continue
+
+            start, end, country_code, latitude, longitude = parsed
+            if country_code not in country_codes:
+                continue
+
+            key = (country_code, latitude, longitude)
+            geoloc = geolocs.get(key)
+            if geoloc is None:
+                geoloc = geolocs[key] = {
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "country": {
+                        "acronym": country_code,
+                        "numeric": country_codes[country_code],
+                    },
+                }
+
+            ranges[start.version].append((int(start), int(end), geoloc))
+
+    return {version: GeolocationRanges(r) for version, r in ranges.items()}
+
+
+class GeolocationResolver:
+    """\
+    Resolves the geolocation of ip addresses; from a local database when one
+    is loaded, falling back to ip-api (when enabled) for addresses it lacks.
+
+    Possibly confusing attributes
+    -----------
+    _cache: `OrderedDict[IPAddress, tuple[Geolocation | None, float | None]]`
+        The most recently resolved addresses, in lru order, with the time
+        their result expires. Failed lookups are cached too (for a shorter
+        time), so that e.g. a rate limited api isn't hammered by retries.
+    """
+
+    def __init__(
+        self,
+        cache_size: int,
+        negative_cache_ttl: float,
+        http_fallback: bool,
+    ) -> None:
+        self.cache_size = cache_size
+        self.negative_cache_ttl = negative_cache_ttl
+        self.http_fallback = http_fallback
+
+        self.ranges: dict[int, GeolocationRanges] = {}
+        self._cache: OrderedDict[
+            IPAddress,
+            tuple[Geolocation | None, float | None],
+        ] = OrderedDict()
+
+    async def load_database(self, path: Path) -> None:
+        """Load a local geolocation database (without blocking the event loop)."""
+        started_at = time.perf_counter()
+        self.ranges = await asyncio.to_thread(load_geoloc_database, path)
+        self._cache.clear()
+
+        num_ranges = sum(len(ranges) for ranges in self.ranges.values())
+        elapsed = time.perf_counter() - started_at
+        log(
+            f"Loaded {num_ranges:,} geolocation ranges in {elapsed:.2f}s.",
+            Ansi.LCYAN,
+        )
+
+    async def resolve(self, ip: IPAddress) -> Geolocation | None:
+        started_at = time.perf_counter()
+
+        cached = self._cache.get(ip)
+        if cached is not None:
+            geoloc, expires_at = cached
+            if expires_at is None or expires_at > time.monotonic():
+                self._cache.move_to_end(ip)
+                app.metrics.increment("ex_geolocation_cache_hits")
+                app.metrics.histrogram(
+                    "ex_geolocation_lookup_time",
+                    time.perf_counter() - started_at,
+                    source="cache",
+                )
+                return geoloc
+
+        app.metrics.increment("ex_geolocation_cache_misses")
+
+        source = "database"
+        ranges = self.ranges.get(ip.version)
+        geoloc = ranges.lookup(ip) if ranges is not None else None
+
+        if geoloc is None and self.http_fallback:
+            source = "http"
+            try:
+                geoloc = await _fetch_geoloc_from_ip(ip)
+            except httpx.HTTPError as exc:
+                log(f"Failed to get geoloc data: {exc!r}", Ansi.LRED)
+
+        expires_at = None
+        if geoloc is None:
+            expires_at = time.monotonic() + self.negative_cache_ttl
+
+        self._cache[ip] = (geoloc, expires_at)
+        self._cache.move_to_end(ip)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        app.metrics.histrogram(
+            "ex_geolocation_lookup_time",
+            time.perf_counter() - started_at,
+            source=source,
+        )
+        return geoloc
+
+
+geoloc_resolver = GeolocationResolver(
+    cache_size=app.settings.GEOLOCATION_CACHE_SIZE,
+    negative_cache_ttl=app.settings.GEOLOCATION_NEGATIVE_CACHE_TTL,
+    http_fallback=app.settings.GEOLOCATION_HTTP_FALLBACK,
+)
+
+
 async def fetch_geoloc(
     ip: IPAddress,
     headers: Mapping[str, str] | None = None,
@@ -131,7 +330,7 @@ async def fetch_geoloc(
         geoloc = _fetch_geoloc_from_headers(headers)
 
     if geoloc is None:
-        geoloc = await _fetch_geoloc_from_ip(ip)
+        geoloc = await geoloc_resolver.resolve(ip)
 
     return geoloc
 
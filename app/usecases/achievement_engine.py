@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import ast
+import bisect
+from collections import defaultdict
+from collections.abc import Callable
+from collections.abc import Container
+from collections.abc import Iterator
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING
+
+import app.repositories.achievements
+import app.repositories.user_achievements
+from app.logging import Ansi
+from app.logging import log
+from app.repositories.achievements import Achievement
+from app.usecases import write_behind as write_behind_usecases
+
+if TYPE_CHECKING:
+    from app.objects.player import Player
+    from app.objects.score import Score
+
+
+@dataclass(frozen=True)
+class ScoreRange:
+    """A `low <= score.<field> [< high]` guard of an achievement's condition."""
+
+    field: str
+    low: float
+    high: float | None
+
+
+@dataclass
+class CompiledAchievement:
+    id: int
+    file: str
+    name: str
+    desc: str
+    cond: str
+    check: Callable[[Score, int], bool]
+
+    # guards which must hold for the condition to be true;
+    # these are used to index the achievements.
+    mode_vn: int | None
+    mods_mask: int | None
+    score_range: ScoreRange | None
+
+
+def _is_number(node: ast.expr) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+    )
+
+
+def _score_attr(node: ast.expr) -> str | None:
+    if (
+        isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == "score"
+    ):
+        return node.attr
+
+    return None
+
+
+def analyse_condition(
+    cond: str,
+) -> tuple[int | None, int | None, ScoreRange | None]:
+    """\
+    Find the mode, mods & score range an achievement's condition is
+    restricted to, from the terms which are and-ed together at its top level.
+    """
+    expr = ast.parse(cond, mode="eval").body
+    if isinstance(expr, ast.BoolOp) and isinstance(expr.op, ast.And):
+        conjuncts = expr.values
+    else:
+        conjuncts = [expr]
+
+    mode_vn: int | None = None
+    mods_mask: int | None = None
+    score_range: ScoreRange | None = None
+
+    for node in conjuncts:
+        # score.mods & <int>
+        if (
+            mods_mask is None
+            and isinstance(node, ast.BinOp)
+            and isinstance(node.op, ast.BitAnd)
+            and _score_attr(node.left) == "mods"
+            and isinstance(node.right, ast.Constant)
+            and type(node.right.value) is int
+            and node.right.value != 0
+        ):
+            mods_mask = node.right.value
+            continue
+
+        if not isinstance(node, ast.Compare):
+            continue
+
+        # mode_vn == <int>
+        if (
+            len(node.ops) == 1
+            and isinstance(node.ops[0], ast.Eq)
+            and isinstance(node.left, ast.Name)
+            and node.left.id == "mode_vn"
+            and _is_number(node.comparators[0])
+        ):
+            mode_vn = ast.literal_eval(node.comparators[0])
+            continue
+
+        # <low> <= score.<field> [< <high>]
+        field = _score_attr(node.comparators[0])
+        if (
+            score_range is not None
+            or field is None
+            or not isinstance(node.ops[0], ast.LtE)
+            or not _is_number(node.left)
+        ):
+            continue
+
+        if len(node.ops) == 1:
+            high = None
+        elif (
+            len(node.ops) == 2
+            and isinstance(node.ops[1], ast.Lt)
+            and _is_number(node.comparators[1])
+        ):
+            high = ast.literal_eval(node.comparators[1])
+        else:
+            continue
+
+        score_range = ScoreRange(field, ast.literal_eval(node.left), high)
+
+    return mode_vn, mods_mask, score_range
+
+
+def compile_achievement(achievement: Achievement) -> CompiledAchievement:
+    """Compile an achievement's condition into a function & find its guards."""
+    cond = achievement["cond"]
+    mode_vn, mods_mask, score_range = analyse_condition(cond)
+
+    code = compile(
+        f"lambda score, mode_vn: {cond}",
+        f"<achievement {achievement['id']}>",
+        "eval",
+    )
+
+    return CompiledAchievement(
+        id=achievement["id"],
+        file=achievement["file"],
+        name=achievement["name"],
+        desc=achievement["desc"],
+        cond=cond,
+        check=eval(code),
+        mode_vn=mode_vn,
+        mods_mask=mods_mask,
+        score_range=score_range,
+    )
+
+
+class AchievementIndex:
+    """\
+    The achievements, indexed by their guards so that only the ones a
+    score could possibly unlock have their conditions evaluated; those
+    which require some mods are also skipped for scores without them.
+
+    Possibly confusing attributes
+    -----------
+    _unranged: `dict[int | None, list[CompiledAchievement]]`
+        The achievements without a score range, by mode (`None` for any).
+
+    _ranged: `dict[tuple[int | None, str], tuple[list[float], list[...]]]`
+        The achievements with a score range (& their ranges), by mode & field;
+        sorted by lower bound, with the bounds in a separate list to bisect.
+    """
+
+    def __init__(self, achievements: Sequence[CompiledAchievement] = ()) -> None:
+        self._unranged: defaultdict[int | None, list[CompiledAchievement]]
+        self._unranged = defaultdict(list)
+
+        ranged: defaultdict[
+            tuple[int | None, str],
+            list[tuple[ScoreRange, CompiledAchievement]],
+        ] = defaultdict(list)
+
+        for achievement in achievements:
+            score_range = achievement.score_range
+            if score_range is None:
+                self._unranged[achievement.mode_vn].append(achievement)
+            else:
+                key = (achievement.mode_vn, score_range.field)
+                ranged[key].append((score_range, achievement))
+
+        self._ranged: dict[
+            tuple[int | None, str],
+            tuple[list[float], list[tuple[ScoreRange, CompiledAchievement]]],
+        ] = {}
+        for key, group in ranged.items():
+            group.sort(key=lambda entry: entry[0].low)
+            self._ranged[key] = ([score_range.low for score_range, _ in group], group)
+
+    def candidates(self, score: Score, mode_vn: int) -> Iterator[CompiledAchievement]:
+        """Yield the achievements whose guards all hold for a score."""
+        for mode_key in (None, mode_vn):
+            for achievement in self._unranged.get(mode_key, ()):
+                if achievement.mods_mask is None or score.mods & achievement.mods_mask:
+                    yield achievement
+
+        for (mode_key, field), (lows, group) in self._ranged.items():
+            if mode_key is not None and mode_key != mode_vn:
+                continue
+
+            value = getattr(score, field)
+            if value is None:
+                continue
+
+            for score_range, achievement in group[: bisect.bisect_right(lows, value)]:
+                if score_range.high is not None and value >= score_range.high:
+                    continue
+
+                if achievement.mods_mask is None or score.mods & achievement.mods_mask:
+                    yield achievement
+
+
+class AchievementEngine:
+    """\
+    Evaluates the server's achievements against submitted scores.
+
+    Conditions are compiled once when (re)loaded from sql, & each online
+    player's unlocked achievements are kept with the player object, so
+    evaluating a score requires no queries after a player's first one.
+
+    Possibly confusing attributes
+    -----------
+    _rows: `tuple[tuple[object, ...], ...]`
+        The achievements' rows as of the last load; reloads only
+        recompile the achievements if these have since changed.
+    """
+
+    def __init__(self) -> None:
+        self.achievements: dict[int, CompiledAchievement] = {}
+        self.index = AchievementIndex()
+
+        self._rows: tuple[tuple[object, ...], ...] | None = None
+
+    def load(self, rows: Sequence[Achievement]) -> bool:
+        """Compile a set of achievements; returns whether they've changed."""
+        row_values = tuple(
+            (row["id"], row["file"], row["name"], row["desc"], row["cond"])
+            for row in rows
+        )
+        if row_values == self._rows:
+            return False
+
+        achievements: dict[int, CompiledAchievement] = {}
+        for row in rows:
+            try:
+                achievement = compile_achievement(row)
+            except SyntaxError as exc:
+                log(f"Failed to compile achievement {row['id']}: {exc}", Ansi.LRED)
+                continue
+
+            achievements[achievement.id] = achievement
+
+        self.achievements = achievements
+        self.index = AchievementIndex(list(achievements.values()))
+        self._rows = row_values
+        return True
+
+    async def reload(self) -> bool:
+        """(Re)load the achievements from sql; returns whether they've changed."""
+        rows = await app.repositories.achievements.fetch_many()
+        changed = self.load(rows)
+        if changed:
+            log(f"Loaded {len(self.achievements)} achievements.", Ansi.LCYAN)
+
+        return changed
+
+    def evaluate(
+        self,
+        score: Score,
+        unlocked: Container[int] = (),
+    ) -> list[CompiledAchievement]:
+        """Find the achievements a score unlocks, excluding `unlocked`."""
+        mode_vn = score.mode.as_vanilla
+
+        return sorted(
+            (
+                achievement
+                for achievement in self.index.candidates(score, mode_vn)
+                if achievement.id not in unlocked
+                and achievement.check(score, mode_vn)
+            ),
+            key=lambda a: a.id,
+        )
+
+    async def fetch_unlocked(self, player: Player) -> set[int]:
+        """Fetch a player's unlocked achievements, caching them on the player."""
+        if player.unlocked_achievements is None:
+            user_achievements = await app.repositories.user_achievements.fetch_many(
+                user_id=player.id,
+            )
+            player.unlocked_achievements = {ua["achid"] for ua in user_achievements}
+
+        return player.unlocked_achievements
+
+    async def unlock(self, score: Score) -> list[CompiledAchievement]:
+        """\
+        Unlock the achievements a player's score earns them; the new
+        unlocks are written to sql in one batch, in the background.
+        """
+        assert score.player is not None
+
+        if self._rows is None:
+            await self.reload()
+
+        unlocked = await self.fetch_unlocked(score.player)
+        achievements = self.evaluate(score, unlocked)
+        if not achievements:
+            return []
+
+        achievement_ids = [achievement.id for achievement in achievements]
+        unlocked.update(achievement_ids)
+
+        await write_behind_usecases.pipeline.submit(
+            "achievements",
+            partial(
+                app.repositories.user_achievements.create_many,
+                score.player.id,
+                achievement_ids,
+            ),
+        )
+
+        return achievements
+
+
+engine = AchievementEngine()
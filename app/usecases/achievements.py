@@ -3,6 +3,7 @@ from __future__ import annotations
 import app.repositories.achievements
 from app.repositories.achievements import Achievement
 from app.repositories import user_achievements
+from app.usecases import achievement_engine
 
 
 async def create(
@@ -17,6 +18,7 @@ async def create(
         desc,
         cond,
     )
+    await achievement_engine.engine.reload()
     return achievement
 
 
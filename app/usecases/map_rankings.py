@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Literal
+
+import app.state.services
+from app.constants.gamemodes import GameMode
+
+# each map's rankings in a mode are a sorted set of the best
+# scores of unrestricted players, by user id; like the global
+# bancho:leaderboard:* keys, but scored by the map's metric.
+KEY_PREFIX = "bancho:map_rankings"
+
+# a sorted set can't be empty, so a sentinel member marks the
+# rankings of a map as built; with a score of -inf, it's never
+# counted as better than any real score.
+BUILT_SENTINEL = "-"
+
+
+def make_key(map_md5: str, mode: GameMode) -> str:
+    return f"{KEY_PREFIX}:{mode.value}:{map_md5}"
+
+
+def scoring_metric(mode: GameMode) -> Literal["pp", "score"]:
+    return "pp" if mode >= GameMode.RELAX_OSU else "score"
+
+
+async def build(map_md5: str, mode: GameMode) -> None:
+    """Build the rankings of a map in a mode from sql."""
+    metric = scoring_metric(mode)
+    rows = await app.state.services.database.fetch_all(
+        f"SELECT s.userid, s.{metric} AS _score FROM scores s "
+        "INNER JOIN users u ON u.id = s.userid "
+        "WHERE s.map_md5 = :map_md5 AND s.mode = :mode "
+        "AND s.status = 2 AND u.priv & 1",
+        {"map_md5": map_md5, "mode": mode},
+    )
+
+    mapping: dict[str, float] = {str(row["userid"]): row["_score"] for row in rows}
+    mapping[BUILT_SENTINEL] = float("-inf")
+
+    # (nx) any scores added while we were reading are newer than ours
+    await app.state.services.redis.zadd(make_key(map_md5, mode), mapping, nx=True)
+
+
+async def count_better_scores(map_md5: str, mode: GameMode, score: float) -> int:
+    """Count the unrestricted best scores on a map better than `score`."""
+    key = make_key(map_md5, mode)
+
+    async with app.state.services.redis.pipeline(transaction=False) as pipe:
+        pipe.zscore(key, BUILT_SENTINEL)
+        pipe.zcount(key, f"({score}", "+inf")
+        is_built, num_better_scores = await pipe.execute()
+
+    if is_built is None:
+        await build(map_md5, mode)
+        num_better_scores = await app.state.services.redis.zcount(
+            key,
+            f"({score}",
+            "+inf",
+        )
+
+    return num_better_scores
+
+
+async def add_score(
+    map_md5: str,
+    mode: GameMode,
+    user_id: int,
+    score: float,
+) -> None:
+    """Set a player's best score on a map, replacing their previous best."""
+    await app.state.services.redis.zadd(
+        make_key(map_md5, mode),
+        {str(user_id): score},
+    )
+
+
+async def delete(map_md5: str, mode: GameMode | None = None) -> None:
+    """Delete a map's rankings in `mode` (or all modes), to be rebuilt on use."""
+    modes = (mode,) if mode is not None else tuple(GameMode)
+    await app.state.services.redis.delete(*[make_key(map_md5, m) for m in modes])
+
+
+async def _fetch_user_best_scores(
+    user_id: int,
+    mode: GameMode | None = None,
+) -> list[dict[str, Any]]:
+    query = (
+        "SELECT map_md5, mode, pp, score FROM scores "
+        "WHERE userid = :user_id AND status = 2"
+    )
+    params: dict[str, Any] = {"user_id": user_id}
+
+    if mode is not None:
+        query += " AND mode = :mode"
+        params["mode"] = mode
+
+    return await app.state.services.database.fetch_all(query, params)
+
+
+async def add_user(user_id: int) -> None:
+    """Add all of a player's best scores to the rankings (e.g. on unrestriction)."""
+    rows = await _fetch_user_best_scores(user_id)
+
+    async with app.state.services.redis.pipeline(transaction=False) as pipe:
+        for row in rows:
+            mode = GameMode(row["mode"])
+            pipe.zadd(
+                make_key(row["map_md5"], mode),
+                {str(user_id): row[scoring_metric(mode)]},
+            )
+        await pipe.execute()
+
+
+async def remove_user(user_id: int, mode: GameMode | None = None) -> None:
+    """\
+    Remove all of a player's best scores in `mode` (or all modes) from the
+    rankings, e.g. on restriction; must be called before any scores are deleted.
+    """
+    rows = await _fetch_user_best_scores(user_id, mode)
+
+    async with app.state.services.redis.pipeline(transaction=False) as pipe:
+        for row in rows:
+            pipe.zrem(make_key(row["map_md5"], GameMode(row["mode"])), str(user_id))
+        await pipe.execute()
@@ -1,13 +1,27 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import math
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
+from pathlib import Path
 from typing import TypedDict
 
 from akatsuki_pp_py import Beatmap
 from akatsuki_pp_py import Calculator
+from akatsuki_pp_py import DifficultyAttributes
 
+import app.metrics
+import app.settings
+from app._typing import UNSET
+from app._typing import _UnsetSentinel
 from app.constants.mods import Mods
 
 
@@ -57,6 +71,60 @@ class PerformanceResult(TypedDict):
     difficulty: DifficultyRating
 
 
+# parsed beatmaps & their difficulty attributes are cached per-process,
+# so each of the engine's workers keeps its own copies of the hot maps.
+_beatmaps: OrderedDict[str, tuple[tuple[int, int], str, Beatmap]] = OrderedDict()
+_difficulties: OrderedDict[tuple[str, int, int], DifficultyAttributes] = OrderedDict()
+
+
+def _load_beatmap(osu_file_path: str) -> tuple[str, Beatmap]:
+    """\
+    Get the md5 & parsed beatmap for an .osu file from the cache,
+    (re-)parsing it if it's missing or the file has since been rewritten.
+    """
+    stat = os.stat(osu_file_path)
+    file_version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _beatmaps.get(osu_file_path)
+    if cached is not None and cached[0] == file_version:
+        _beatmaps.move_to_end(osu_file_path)
+        return cached[1], cached[2]
+
+    osu_file_data = Path(osu_file_path).read_bytes()
+    map_md5 = hashlib.md5(osu_file_data).hexdigest()
+    calc_bmap = Beatmap(content=osu_file_data)
+
+    _beatmaps[osu_file_path] = (file_version, map_md5, calc_bmap)
+    _beatmaps.move_to_end(osu_file_path)
+    if len(_beatmaps) > app.settings.PP_CALC_BEATMAP_CACHE_SIZE:
+        _beatmaps.popitem(last=False)
+
+    return map_md5, calc_bmap
+
+
+def _get_difficulty(
+    map_md5: str,
+    calc_bmap: Beatmap,
+    mode: int,
+    mods: int,
+) -> DifficultyAttributes:
+    """Get the difficulty attributes of a map for a mode & mods from the cache."""
+    key = (map_md5, mode, mods)
+
+    difficulty = _difficulties.get(key)
+    if difficulty is not None:
+        _difficulties.move_to_end(key)
+        return difficulty
+
+    difficulty = Calculator(mode=mode, mods=mods).difficulty(calc_bmap)
+
+    _difficulties[key] = difficulty
+    if len(_difficulties) > app.settings.PP_CALC_DIFFICULTY_CACHE_SIZE:
+        _difficulties.popitem(last=False)
+
+    return difficulty
+
+
 def calculate_performances(
     osu_file_path: str,
     scores: Iterable[ScoreParams],
@@ -70,7 +138,7 @@ def calculate_performances(
     implemented here to handle cases where e.g. the beatmap file is invalid
     or there an issue during calculation.
     """
-    calc_bmap = Beatmap(path=osu_file_path)
+    map_md5, calc_bmap = _load_beatmap(osu_file_path)
 
     results: list[PerformanceResult] = []
 
@@ -99,6 +167,9 @@ def calculate_performances(
             n_katu=score.nkatu,
             n_misses=score.nmiss,
         )
+        calculator.set_difficulty(
+            _get_difficulty(map_md5, calc_bmap, score.mode, score.mods or 0),
+        )
         result = calculator.performance(calc_bmap)
 
         pp = result.pp
@@ -136,3 +207,145 @@ def calculate_performances(
         )
 
     return results
+
+
+class PerformanceEngine:
+    """\
+    Runs performance calculations on a pool of worker processes,
+    keeping beatmap parsing & difficulty calculation off the event loop.
+
+    At most `max_workers + max_queue_size` calculations may be submitted
+    to the pool at once; further callers wait for a free slot, and both
+    the wait and the calculation itself are bounded by `timeout` seconds
+    (unless the caller passes its own, e.g. `None` for score submissions).
+
+    Possibly confusing attributes
+    -----------
+    _slots: `asyncio.Semaphore | None`
+        Limits the number of calculations submitted to the pool. A slot is
+        only released once its calculation finishes, even if the caller
+        has already timed out, since a running calculation can't be stopped.
+
+    _pool: `ProcessPoolExecutor | None`
+        The worker processes; created on first use so importing this module
+        (or running tools which never calculate) doesn't spawn any, & again
+        after a worker dies, since that leaves the whole pool unusable.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue_size: int,
+        timeout: float,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+
+        self._slots: asyncio.Semaphore | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self.pending = 0
+
+    def _start(self) -> None:
+        # workers are spawned rather than forked, since forking
+        # a process with a running event loop & threads is unsafe.
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue_size)
+
+    async def calculate(
+        self,
+        osu_file_path: str,
+        scores: Iterable[ScoreParams],
+        timeout: float | None | _UnsetSentinel = UNSET,
+    ) -> list[PerformanceResult]:
+        """\
+        Calculate performance for multiple scores on a single beatmap.
+
+        Raises `TimeoutError` if no result is available within `timeout`
+        seconds (the engine's own by default, or never if `None`), and
+        `BrokenProcessPool` if a worker died; the pool is then replaced
+        for subsequent calls. Errors raised during calculation are propagated.
+        """
+        if isinstance(timeout, _UnsetSentinel):
+            timeout = self.timeout
+
+        if self._pool is None:
+            self._start()
+
+        assert self._pool is not None
+        assert self._slots is not None
+        pool = self._pool
+        slots = self._slots
+
+        loop = asyncio.get_running_loop()
+        scores = list(scores)
+
+        self.pending += 1
+        app.metrics.set_value("ex_pp_calc_pending", self.pending)
+        enqueued_at = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                await slots.acquire()
+                started_at = time.perf_counter()
+                app.metrics.histrogram(
+                    "ex_pp_calc_wait_time",
+                    started_at - enqueued_at,
+                )
+
+                if self._pool is not pool:
+                    # broken & replaced while we were waiting for a slot
+                    if self._pool is None:
+                        self._start()
+
+                    assert self._pool is not None
+                    pool = self._pool
+
+                try:
+                    future = loop.run_in_executor(
+                        pool,
+                        calculate_performances,
+                        osu_file_path,
+                        scores,
+                    )
+                except BaseException:
+                    # the pool refused the calculation outright
+                    slots.release()
+                    raise
+
+                future.add_done_callback(lambda _: slots.release())
+
+                # shield the calculation so a timeout doesn't
+                # release its slot while it's still running.
+                results = await asyncio.shield(future)
+        except TimeoutError:
+            app.metrics.increment("ex_pp_calc_timeouts")
+            raise
+        except BrokenProcessPool:
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            raise
+        finally:
+            self.pending -= 1
+            app.metrics.set_value("ex_pp_calc_pending", self.pending)
+
+        app.metrics.histrogram("ex_pp_calc_time", time.perf_counter() - started_at)
+        return results
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling any queued calculations."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._slots = None
+
+
+engine = PerformanceEngine(
+    max_workers=app.settings.PP_CALC_WORKERS,
+    max_queue_size=app.settings.PP_CALC_MAX_QUEUE_SIZE,
+    timeout=app.settings.PP_CALC_TIMEOUT,
+)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import app.state.services
+from app.constants.gamemodes import GameMode
+
+# each mode's rankings are a sorted set of unrestricted players
+# by pp, both globally and per country.
+KEY_PREFIX = "bancho:leaderboard"
+
+# ranks are read far more often than they change, so reads of the
+# same player's ranks (e.g. a profile being refreshed) within this
+# window share one round-trip; our own writes always update the memo.
+RANKS_MEMO_TTL = 1.0  # seconds
+RANKS_MEMO_MAX_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class Ranks:
+    """A player's global & country rank in a mode; 0 if unranked."""
+
+    global_rank: int = 0
+    country_rank: int = 0
+
+
+# {(user id, mode, country): (expires at, ranks)}
+_memo: dict[tuple[int, GameMode, str], tuple[float, Ranks]] = {}
+
+
+def make_key(mode: GameMode, country: str | None = None) -> str:
+    if country is None:
+        return f"{KEY_PREFIX}:{mode.value}"
+
+    return f"{KEY_PREFIX}:{mode.value}:{country}"
+
+
+def _remember(
+    user_id: int,
+    mode: GameMode,
+    country: str,
+    global_rank: int | None,
+    country_rank: int | None,
+) -> Ranks:
+    now = time.monotonic()
+
+    if len(_memo) >= RANKS_MEMO_MAX_SIZE:
+        for key, (expires_at, _) in list(_memo.items()):
+            if expires_at <= now:
+                del _memo[key]
+
+        if len(_memo) >= RANKS_MEMO_MAX_SIZE:
+            _memo.clear()
+
+    ranks = Ranks(
+        global_rank=global_rank + 1 if global_rank is not None else 0,
+        country_rank=country_rank + 1 if country_rank is not None else 0,
+    )
+    _memo[(user_id, mode, country)] = (now + RANKS_MEMO_TTL, ranks)
+    return ranks
+
+
+def _forget(user_id: int, modes: Iterable[GameMode], country: str) -> None:
+    for mode in modes:
+        _memo.pop((user_id, mode, country), None)
+
+
+async def fetch(
+    user_id: int,
+    country: str,
+    modes: Iterable[GameMode] = GameMode,
+) -> dict[GameMode, Ranks]:
+    """Fetch a player's global & country ranks in `modes`, in one round-trip."""
+    modes = tuple(modes)
+    now = time.monotonic()
+
+    ranks: dict[GameMode, Ranks] = {}
+    missing: list[GameMode] = []
+
+    for mode in modes:
+        memo = _memo.get((user_id, mode, country))
+        if memo is not None and memo[0] > now:
+            ranks[mode] = memo[1]
+        else:
+            missing.append(mode)
+
+    if missing:
+        async with app.state.services.redis.pipeline(transaction=False) as pipe:
+            for mode in missing:
+                pipe.zrevrank(make_key(mode), str(user_id))
+                pipe.zrevrank(make_key(mode, country), str(user_id))
+            results = await pipe.execute()
+
+        for mode, global_rank, country_rank in zip(
+            missing,
+            results[0::2],
+            results[1::2],
+        ):
+            ranks[mode] = _remember(user_id, mode, country, global_rank, country_rank)
+
+    return {mode: ranks[mode] for mode in modes}
+
+
+async def update(
+    user_id: int,
+    country: str,
+    pps: Mapping[GameMode, float],
+) -> dict[GameMode, Ranks]:
+    """Set a player's pp in each mode, returning their new ranks, in one round-trip."""
+    async with app.state.services.redis.pipeline(transaction=False) as pipe:
+        for mode, pp in pps.items():
+            pipe.zadd(make_key(mode), {str(user_id): pp})
+            pipe.zadd(make_key(mode, country), {str(user_id): pp})
+            pipe.zrevrank(make_key(mode), str(user_id))
+            pipe.zrevrank(make_key(mode, country), str(user_id))
+        results = await pipe.execute()
+
+    return {
+        mode: _remember(user_id, mode, country, global_rank, country_rank)
+        for mode, global_rank, country_rank in zip(
+            pps,
+            results[2::4],
+            results[3::4],
+        )
+    }
+
+
+async def remove(
+    user_id: int,
+    country: str,
+    modes: Iterable[GameMode] = GameMode,
+) -> None:
+    """Remove a player from the rankings in `modes`, e.g. on restriction."""
+    modes = tuple(modes)
+
+    async with app.state.services.redis.pipeline(transaction=False) as pipe:
+        for mode in modes:
+            pipe.zrem(make_key(mode), str(user_id))
+            pipe.zrem(make_key(mode, country), str(user_id))
+        await pipe.execute()
+
+    _forget(user_id, modes, country)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import weakref
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+import orjson
+
+import app.state.services
+from app.constants.gamemodes import GameMode
+
+# the weight of the 1000th score is 0.95**1000 ~= 5e-23, so any
+# further scores can't affect a player's total pp or accuracy.
+TOP_SCORES_LIMIT = 1000
+
+# aggregates of inactive players eventually expire from redis.
+RANKED_SCORES_TTL = 60 * 60 * 24 * 7  # 1 week
+
+# incremented whenever scores may have become (un)ranked in bulk,
+# e.g. when a map's status changes or its scores are deleted.
+GENERATION_KEY = "bancho:ranked_scores:generation"
+
+# a lock is only kept while some update holds or awaits it.
+_locks: weakref.WeakValueDictionary[tuple[int, GameMode], asyncio.Lock]
+_locks = weakref.WeakValueDictionary()
+
+
+def _get_lock(user_id: int, mode: GameMode) -> asyncio.Lock:
+    """Get the lock serializing updates to a player's ranked scores in a mode."""
+    lock = _locks.get((user_id, mode))
+    if lock is None:
+        lock = _locks[(user_id, mode)] = asyncio.Lock()
+
+    return lock
+
+
+@dataclass
+class RankedScores:
+    """\
+    A player's best scores on ranked & approved maps in a mode, from
+    which their total pp & accuracy are calculated.
+
+    Possibly confusing attributes
+    -----------
+    count: `int`
+        The total number of the player's ranked best scores, which
+        bonus pp is based on; this may exceed `len(top_scores)`.
+
+    top_scores: `list[tuple[float, float, int]]`
+        The (pp, acc, score id) of the player's best scores in descending
+        order of pp, up to `TOP_SCORES_LIMIT` scores.
+
+    generation: `int`
+        The value of `GENERATION_KEY` when these scores were read from sql;
+        if it has since changed, they must be read again.
+    """
+
+    count: int = 0
+    top_scores: list[tuple[float, float, int]] = field(default_factory=list)
+    generation: int = 0
+
+    @classmethod
+    def from_rows(cls, count: int, rows: Any, generation: int = 0) -> RankedScores:
+        """Create from score rows (with pp, acc & id), sorted by pp descending."""
+        return cls(
+            count=count,
+            top_scores=[
+                (row["pp"], row["acc"], row["id"]) for row in rows[:TOP_SCORES_LIMIT]
+            ],
+            generation=generation,
+        )
+
+    @property
+    def pp(self) -> int:
+        """The player's total weighted pp, including bonus pp."""
+        weighted_pp = sum(pp * 0.95**i for i, (pp, _, _) in enumerate(self.top_scores))
+        bonus_pp = 416.6667 * (1 - 0.9994**self.count)
+        return round(weighted_pp + bonus_pp)
+
+    @property
+    def acc(self) -> float:
+        """The player's total weighted accuracy."""
+        if self.count == 0:
+            return 0.0
+
+        weighted_acc = sum(
+            acc * 0.95**i for i, (_, acc, _) in enumerate(self.top_scores)
+        )
+        bonus_acc = 100.0 / (20 * (1 - 0.95**self.count))
+        return (weighted_acc * bonus_acc) / 100
+
+    def replace_best(
+        self,
+        score_id: int,
+        pp: float,
+        acc: float,
+        prev_best_id: int | None,
+    ) -> None:
+        """Add a new best score, replacing the previous best on its map (if any)."""
+        if prev_best_id is None:
+            self.count += 1
+        else:
+            # the previous best may not be among our top scores
+            for i, (_, _, top_score_id) in enumerate(self.top_scores):
+                if top_score_id == prev_best_id:
+                    del self.top_scores[i]
+                    break
+
+        bisect.insort(self.top_scores, (pp, acc, score_id), key=lambda s: -s[0])
+        del self.top_scores[TOP_SCORES_LIMIT:]
+
+    def serialize(self) -> bytes:
+        return orjson.dumps(
+            {
+                "count": self.count,
+                "top_scores": self.top_scores,
+                "generation": self.generation,
+            },
+        )
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> RankedScores:
+        obj = orjson.loads(data)
+        return cls(
+            count=obj["count"],
+            top_scores=[tuple(s) for s in obj["top_scores"]],
+            generation=obj["generation"],
+        )
+
+
+def make_key(user_id: int, mode: GameMode) -> str:
+    return f"bancho:ranked_scores:{mode.value}:{user_id}"
+
+
+async def fetch_from_sql(
+    user_id: int,
+    mode: GameMode,
+    generation: int,
+    database: Any = None,
+) -> RankedScores:
+    """\
+    Read a player's ranked scores from sql; `database` may be
+    overridden by tools which manage their own connections.
+    """
+    if database is None:
+        database = app.state.services.database
+
+    params = {"user_id": user_id, "mode": mode}
+
+    count = await database.fetch_val(
+        "SELECT COUNT(*) FROM scores s "
+        "INNER JOIN maps m ON s.map_md5 = m.md5 "
+        "WHERE s.userid = :user_id AND s.mode = :mode "
+        "AND s.status = 2 AND m.status IN (2, 3)",  # ranked, approved
+        params,
+    )
+    top_scores = await database.fetch_all(
+        "SELECT s.id, s.pp, s.acc FROM scores s "
+        "INNER JOIN maps m ON s.map_md5 = m.md5 "
+        "WHERE s.userid = :user_id AND s.mode = :mode "
+        "AND s.status = 2 AND m.status IN (2, 3) "  # ranked, approved
+        f"ORDER BY s.pp DESC LIMIT {TOP_SCORES_LIMIT}",
+        params,
+    )
+
+    return RankedScores.from_rows(count, top_scores, generation)
+
+
+async def _fetch_from_redis(
+    user_id: int,
+    mode: GameMode,
+) -> tuple[RankedScores | None, int]:
+    """Fetch a player's ranked scores (if up to date) & the current generation."""
+    data, generation = await app.state.services.redis.mget(
+        make_key(user_id, mode),
+        GENERATION_KEY,
+    )
+    generation = int(generation or 0)
+
+    if data is not None:
+        ranked_scores = RankedScores.deserialize(data)
+        if ranked_scores.generation == generation:
+            return ranked_scores, generation
+
+    return None, generation
+
+
+async def store(user_id: int, mode: GameMode, ranked_scores: RankedScores) -> None:
+    await app.state.services.redis.set(
+        make_key(user_id, mode),
+        ranked_scores.serialize(),
+        ex=RANKED_SCORES_TTL,
+    )
+
+
+async def fetch(user_id: int, mode: GameMode) -> RankedScores:
+    """Fetch a player's ranked scores, reading them from sql if necessary."""
+    ranked_scores, generation = await _fetch_from_redis(user_id, mode)
+    if ranked_scores is None:
+        ranked_scores = await fetch_from_sql(user_id, mode, generation)
+        await store(user_id, mode, ranked_scores)
+
+    return ranked_scores
+
+
+async def update_best_score(
+    user_id: int,
+    mode: GameMode,
+    score_id: int,
+    pp: float,
+    acc: float,
+    prev_best_id: int | None,
+) -> RankedScores:
+    """\
+    Update a player's ranked scores with a new best score, which
+    must already be saved to sql (along with its previous best's status).
+    """
+    async with _get_lock(user_id, mode):
+        ranked_scores, generation = await _fetch_from_redis(user_id, mode)
+        if ranked_scores is not None:
+            ranked_scores.replace_best(score_id, pp, acc, prev_best_id)
+        else:
+            # sql already reflects the new score
+            ranked_scores = await fetch_from_sql(user_id, mode, generation)
+
+        await store(user_id, mode, ranked_scores)
+
+    return ranked_scores
+
+
+async def invalidate(user_id: int, mode: GameMode) -> None:
+    """Invalidate a player's ranked scores, e.g. after their scores are wiped."""
+    await app.state.services.redis.delete(make_key(user_id, mode))
+
+
+async def invalidate_all() -> None:
+    """Invalidate all players' ranked scores, e.g. after a map's status changes."""
+    await app.state.services.redis.incr(GENERATION_KEY)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+from app.utils import DATA_PATH
+
+REPLAYS_PATH = DATA_PATH / "osr"
+
+# replays are sharded into 256 * 256 directories by the low bytes of
+# their score id, so sequential ids spread evenly & no directory
+# ever holds more than a few hundred files.
+SHARD_BITS = 8
+SHARD_MASK = (1 << SHARD_BITS) - 1
+
+READ_CHUNK_SIZE = 64 * 1024  # bytes
+
+
+def get_path(score_id: int, replays_path: Path = REPLAYS_PATH) -> Path:
+    """The path a score's replay is stored at."""
+    outer = score_id & SHARD_MASK
+    inner = (score_id >> SHARD_BITS) & SHARD_MASK
+    return replays_path / f"{outer:02x}" / f"{inner:02x}" / f"{score_id}.osr"
+
+
+def get_legacy_path(score_id: int, replays_path: Path = REPLAYS_PATH) -> Path:
+    """The path a score's replay was stored at before sharding."""
+    return replays_path / f"{score_id}.osr"
+
+
+def _find(score_id: int, replays_path: Path) -> Path | None:
+    for path in (
+        get_path(score_id, replays_path),
+        get_legacy_path(score_id, replays_path),
+    ):
+        if path.is_file():
+            return path
+
+    return None
+
+
+def _write(path: Path, replay_data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # write to a temporary file first, so readers never see partial replays
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(replay_data)
+    os.replace(tmp_path, path)
+
+
+async def find(score_id: int, replays_path: Path = REPLAYS_PATH) -> Path | None:
+    """\
+    Find a score's replay on disk; replays which haven't been
+    migrated to the sharded layout are still found.
+    """
+    return await asyncio.to_thread(_find, score_id, replays_path)
+
+
+async def save(
+    score_id: int,
+    replay_data: bytes,
+    replays_path: Path = REPLAYS_PATH,
+) -> None:
+    """Save a score's replay (the raw frames submitted by the client)."""
+    await asyncio.to_thread(_write, get_path(score_id, replays_path), replay_data)
+
+
+async def iter_chunks(
+    path: Path,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """Read a replay in chunks, without blocking the event loop."""
+    f = await asyncio.to_thread(path.open, "rb")
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import defaultdict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import app.metrics
+import app.settings
+import app.state.services
+from app.logging import Ansi
+from app.logging import log
+
+
+@dataclass
+class Job:
+    stage: str
+    func: Callable[[], Awaitable[object]]
+    enqueued_at: float
+
+
+class WriteBehindPipeline:
+    """\
+    Runs the non-critical side effects of requests (e.g. of score
+    submission) on a pool of background workers, so that responses
+    only wait for the writes they actually depend on.
+
+    Possibly confusing attributes
+    -----------
+    _queue: `asyncio.Queue[Job] | None`
+        The jobs waiting for a worker. It's bounded, and when full, jobs
+        are run by their caller instead; this slows requests down rather
+        than letting a backlog grow without bound or dropping writes.
+
+    _map_plays: `defaultdict[str, list[int]]`
+        The [plays, passes] of each map since the last flush; these are
+        aggregated and written in one batch every `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queue_size: int,
+        flush_interval: float,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+
+        self._queue: asyncio.Queue[Job] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        self._map_plays: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+
+    def _start(self) -> None:
+        self._queue = asyncio.Queue(self.max_queue_size)
+        self._tasks = [
+            asyncio.create_task(self._work(self._queue))
+            for _ in range(self.max_workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._flush_periodically()))
+
+    async def submit(self, stage: str, func: Callable[[], Awaitable[object]]) -> None:
+        """\
+        Run `func` in the background; its latency (including time spent
+        queued) is recorded under `stage`, and any errors are logged.
+        """
+        if self._queue is None:
+            self._start()
+
+        assert self._queue is not None
+
+        job = Job(stage, func, time.perf_counter())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            app.metrics.increment("ex_write_behind_inline_jobs")
+            await self._run(job)
+        else:
+            app.metrics.set_value("ex_write_behind_pending", self._queue.qsize())
+
+    def add_map_play(self, map_md5: str, passed: bool) -> None:
+        """Count a play (& maybe a pass) of a map, to be written on the next flush."""
+        if self._queue is None:
+            self._start()
+
+        plays = self._map_plays[map_md5]
+        plays[0] += 1
+        plays[1] += passed
+
+    async def flush_map_plays(self) -> None:
+        """Write the plays & passes counted since the last flush to sql."""
+        if not self._map_plays:
+            return
+
+        map_plays, self._map_plays = self._map_plays, defaultdict(lambda: [0, 0])
+
+        started_at = time.perf_counter()
+        try:
+            # all or none of the counts are written, so on failure
+            # they can all be retried without counting any twice.
+            async with app.state.services.database.transaction():
+                await app.state.services.database.execute_many(
+                    "UPDATE maps SET plays = plays + :plays, "
+                    "passes = passes + :passes WHERE md5 = :map_md5",
+                    [
+                        {"plays": plays, "passes": passes, "map_md5": map_md5}
+                        for map_md5, (plays, passes) in map_plays.items()
+                    ],
+                )
+        except Exception:
+            # keep the counts for the next flush
+            for map_md5, (plays, passes) in map_plays.items():
+                self._map_plays[map_md5][0] += plays
+                self._map_plays[map_md5][1] += passes
+            raise
+
+        app.metrics.histrogram(
+            "ex_write_behind_time",
+            time.perf_counter() - started_at,
+            stage="map_plays",
+        )
+
+    async def _run(self, job: Job) -> None:
+        try:
+            await job.func()
+        except Exception as exc:
+            log(f"Failed to run {job.stage} in the background: {exc!r}", Ansi.LRED)
+
+        app.metrics.histrogram(
+            "ex_write_behind_time",
+            time.perf_counter() - job.enqueued_at,
+            stage=job.stage,
+        )
+
+    async def _work(self, queue: asyncio.Queue[Job]) -> None:
+        while True:
+            job = await queue.get()
+            app.metrics.set_value("ex_write_behind_pending", queue.qsize())
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_map_plays()
+            except Exception as exc:
+                log(f"Failed to flush map plays: {exc!r}", Ansi.LRED)
+
+    async def shutdown(self) -> None:
+        """Finish all queued jobs & flush map plays, then stop the workers."""
+        if self._queue is None:
+            return
+
+        await self._queue.join()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        self._queue = None
+        self._tasks = []
+
+        await self.flush_map_plays()
+
+
+pipeline = WriteBehindPipeline(
+    max_workers=app.settings.WRITE_BEHIND_WORKERS,
+    max_queue_size=app.settings.WRITE_BEHIND_MAX_QUEUE_SIZE,
+    flush_interval=app.settings.WRITE_BEHIND_FLUSH_INTERVAL,
+)
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import copy
+from collections import defaultdict
 from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
 
 import httpx
 import pytest
@@ -10,6 +14,9 @@ from asgi_lifespan._types import ASGIApp
 from fastapi import status
 
 from app.api.init_api import asgi_app
+from app.constants.gamemodes import GameMode
+from app.state import services
+from app.usecases.map_rankings import scoring_metric
 
 # TODO: fixtures for postgres database connection(s) for itests
 
@@ -54,4 +61,191 @@ async def http_client(app: ASGIApp) -> AsyncIterator[httpx.AsyncClient]:
         yield client
 
 
+class FakeRedis:
+    """Just enough of a sorted-set redis for the rankings, counting round-trips."""
+
+    def __init__(self) -> None:
+        self.sets: defaultdict[str, dict[str, float]] = defaultdict(dict)
+        self.round_trips = 0
+
+    async def zadd(
+        self,
+        key: str,
+        mapping: dict[str, float],
+        nx: bool = False,
+    ) -> int:
+        self.round_trips += 1
+        return self._zadd(key, mapping, nx)
+
+    async def zcount(self, key: str, min: str, max: str) -> int:
+        self.round_trips += 1
+        return self._zcount(key, min, max)
+
+    async def zrevrank(self, key: str, member: str) -> int | None:
+        self.round_trips += 1
+        return self._zrevrank(key, member)
+
+    async def delete(self, *keys: str) -> int:
+        self.round_trips += 1
+        return sum(self.sets.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def _zadd(self, key: str, mapping: dict[str, float], nx: bool = False) -> int:
+        added = mapping.keys() - self.sets[key].keys()
+        if nx:
+            mapping = {member: mapping[member] for member in added}
+
+        self.sets[key].update(mapping)
+        return len(added)
+
+    def _zscore(self, key: str, member: str) -> float | None:
+        return self.sets.get(key, {}).get(member)
+
+    def _zcount(self, key: str, min: str, max: str) -> int:
+        assert max == "+inf"
+        if min.startswith("("):
+            low = float(min[1:])
+            return sum(score > low for score in self.sets.get(key, {}).values())
+
+        low = float(min)
+        return sum(score >= low for score in self.sets.get(key, {}).values())
+
+    def _zrevrank(self, key: str, member: str) -> int | None:
+        if member not in self.sets[key]:
+            return None
+
+        ranked = sorted(self.sets[key].items(), key=lambda m: (-m[1], m[0]))
+        return [m for m, _ in ranked].index(member)
+
+    def _zrem(self, key: str, member: str) -> int:
+        return int(self.sets[key].pop(member, None) is not None)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: list[tuple[str, tuple[Any, ...]]] = []
+
+    async def __aenter__(self) -> FakePipeline:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self) -> list[Any]:
+        self.redis.round_trips += 1
+        return [getattr(self.redis, f"_{name}")(*args) for name, args in self.commands]
+
+
+class FakeDatabase:
+    """\
+    Just enough of the database for the scores and map plays queries.
+
+    Possibly confusing attributes
+    -----------
+    queries: `int`
+        The number of scores queries made.
+
+    batches: `list[list[dict[str, Any]]]`
+        The params of each `execute_many`, i.e. each map plays flush.
+
+    fail_after: `int | None`
+        If set, `execute_many` fails (mid-transaction) at this row.
+    """
+
+    def __init__(self) -> None:
+        self.scores: list[dict[str, Any]] = []
+        self.queries = 0
+
+        self.plays: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+        self.batches: list[list[dict[str, Any]]] = []
+        self.fail_after: int | None = None
+
+    def add_score(
+        self,
+        user_id: int,
+        map_md5: str = "a" * 32,
+        mode: GameMode = GameMode.VANILLA_OSU,
+        score: int = 0,
+        pp: float = 0.0,
+        status: int = 2,
+        restricted: bool = False,
+    ) -> None:
+        self.scores.append(
+            {
+                "userid": user_id,
+                "map_md5": map_md5,
+                "mode": mode,
+                "score": score,
+                "pp": pp,
+                "status": status,
+                "restricted": restricted,
+            },
+        )
+
+    async def fetch_all(
+        self,
+        query: str,
+        params: dict[str, Any],
+    ) -> list[dict[str, Any]]:
+        # a map's rankings, or a player's best scores
+        self.queries += 1
+        best_scores = [row for row in self.scores if row["status"] == 2]
+
+        if "user_id" in params:
+            return [
+                row
+                for row in best_scores
+                if row["userid"] == params["user_id"]
+                and ("mode" not in params or row["mode"] == params["mode"])
+            ]
+
+        metric = scoring_metric(GameMode(params["mode"]))
+        return [
+            {"userid": row["userid"], "_score": row[metric]}
+            for row in best_scores
+            if row["map_md5"] == params["map_md5"]
+            and row["mode"] == params["mode"]
+            and not row["restricted"]
+        ]
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        plays = copy.deepcopy(self.plays)
+        try:
+            yield
+        except BaseException:
+            self.plays = plays
+            raise
+
+    async def execute_many(self, query: str, params: list[dict[str, Any]]) -> None:
+        # the map plays flush
+        self.batches.append(params)
+        for i, row in enumerate(params):
+            if i == self.fail_after:
+                raise ConnectionError("lost connection to the database")
+
+            self.plays[row["map_md5"]][0] += row["plays"]
+            self.plays[row["map_md5"]][1] += row["passes"]
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(services, "redis", redis)
+    return redis
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch) -> FakeDatabase:
+    database = FakeDatabase()
+    monkeypatch.setattr(services, "database", database)
+    return database
+
+
 pytest_plugins = []
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import random
+import re
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import app.repositories.user_achievements
+from app.constants.gamemodes import GameMode
+from app.repositories.achievements import Achievement
+from app.usecases import achievement_engine
+from app.usecases.achievement_engine import AchievementEngine
+from app.usecases.achievement_engine import ScoreRange
+from app.usecases.achievement_engine import analyse_condition
+
+BASE_SQL_PATH = Path(__file__).parents[2] / "migrations/base.sql"
+
+
+def load_base_achievements() -> list[Achievement]:
+    achievements: list[Achievement] = []
+    for line in BASE_SQL_PATH.read_text().splitlines():
+        match = re.match(
+            r"insert into achievements .* values \((\d+), '([^']+)', .*, '([^']+)'\);$",
+            line,
+        )
+        if match is not None:
+            achievements.append(
+                {
+                    "id": int(match[1]),
+                    "file": match[2],
+                    "name": match[2],
+                    "desc": "",
+                    "cond": match[3],
+                },
+            )
+
+    return achievements
+
+
+def make_score(
+    mode: GameMode = GameMode.VANILLA_OSU,
+    mods: int = 0,
+    sr: float = 0.0,
+    max_combo: int = 0,
+    perfect: bool = False,
+    player: Any = None,
+) -> Any:
+    return SimpleNamespace(
+        mode=mode,
+        mods=mods,
+        sr=sr,
+        max_combo=max_combo,
+        perfect=perfect,
+        player=player,
+    )
+
+
+@pytest.mark.parametrize(
+    ("cond", "expected"),
+    [
+        (
+            "(score.mods & 1 == 0) and 4 <= score.sr < 5 and mode_vn == 2",
+            (2, None, ScoreRange("sr", 4, 5)),
+        ),
+        (
+            "2000 <= score.max_combo and mode_vn == 0",
+            (0, None, ScoreRange("max_combo", 2000, None)),
+        ),
+        ("score.mods & 8", (None, 8, None)),
+        ("score.mods == 32", (None, None, None)),
+        # guards nested under an `or` don't restrict the condition
+        ("score.perfect or (mode_vn == 1 and 1 <= score.sr)", (None, None, None)),
+    ],
+)
+def test_analyse_condition(cond: str, expected: tuple[Any, ...]):
+    assert analyse_condition(cond) == expected
+
+
+def test_indexed_evaluation_matches_evaluating_every_condition():
+    base_achievements = load_base_achievements()
+    assert len(base_achievements) == 83
+
+    engine = AchievementEngine()
+    assert engine.load(base_achievements)
+
+    naive_checks = [
+        (a["id"], eval(f"lambda score, mode_vn: {a['cond']}"))
+        for a in base_achievements
+    ]
+
+    rng = random.Random(0)
+    for _ in range(5_000):
+        score = make_score(
+            mode=rng.choice(list(GameMode)),
+            mods=rng.choice([0, 1, 8, 16, 24, 32, 64, 72, 1024, 16384]),
+            sr=rng.uniform(0, 12),
+            max_combo=rng.randrange(0, 3000),
+            perfect=rng.random() < 0.3,
+        )
+        mode_vn = score.mode.as_vanilla
+
+        expected = [id for id, check in naive_checks if check(score, mode_vn)]
+        assert [a.id for a in engine.evaluate(score)] == expected
+
+
+def test_unchanged_achievements_are_not_recompiled():
+    base_achievements = load_base_achievements()
+
+    engine = AchievementEngine()
+    assert engine.load(base_achievements)
+    index = engine.index
+
+    assert not engine.load(list(base_achievements))
+    assert engine.index is index
+
+    changed = [{**base_achievements[0], "cond": "score.mods & 2"}]
+    assert engine.load(changed)  # type: ignore[arg-type]
+    assert engine.evaluate(make_score(mods=2))[0].id == base_achievements[0]["id"]
+
+
+def test_invalid_conditions_are_skipped():
+    engine = AchievementEngine()
+    engine.load(
+        [
+            {"id": 1, "file": "a", "name": "a", "desc": "", "cond": "score.mods &"},
+            {"id": 2, "file": "b", "name": "b", "desc": "", "cond": "score.mods & 8"},
+        ],
+    )
+
+    assert list(engine.achievements) == [2]
+
+
+async def test_unlocks_are_cached_and_written_in_one_batch(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    fetches: list[int] = []
+    writes: list[tuple[int, list[int]]] = []
+
+    async def fetch_many(user_id: int) -> list[dict[str, int]]:
+        fetches.append(user_id)
+        return [{"userid": user_id, "achid": 74}]
+
+    async def create_many(user_id: int, achievement_ids: list[int]) -> None:
+        writes.append((user_id, list(achievement_ids)))
+
+    async def submit(stage: str, func: Any) -> None:
+        await func()
+
+    monkeypatch.setattr(app.repositories.user_achievements, "fetch_many", fetch_many)
+    monkeypatch.setattr(app.repositories.user_achievements, "create_many", create_many)
+    monkeypatch.setattr(achievement_engine.write_behind_usecases.pipeline, "submit", submit)
+
+    engine = AchievementEngine()
+    engine.load(load_base_achievements())
+
+    player = SimpleNamespace(id=3, unlocked_achievements=None)
+
+    # hidden (74) was already unlocked; hardrock (76) & a 4* pass (4) are new
+    score = make_score(mods=8 | 16, sr=4.5, player=player)
+    assert [a.id for a in await engine.unlock(score)] == [4, 76]
+    assert [a.id for a in await engine.unlock(score)] == []
+
+    assert fetches == [3]
+    assert writes == [(3, [4, 76])]
+    assert player.unlocked_achievements == {4, 74, 76}
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.api.domains import osu
+from app.constants.gamemodes import GameMode
+
+
+class FakeRepos:
+    """Maps & scores repositories which count their queries."""
+
+    def __init__(self, num_maps: int) -> None:
+        self.maps = [
+            {
+                "id": i,
+                "set_id": i // 4,
+                "md5": f"{i:032x}",
+                "status": 2,
+                "filename": f"Artist - Title ({i}) [Insane].osu",
+            }
+            for i in range(num_maps)
+        ]
+        self.queries = 0
+
+    async def fetch_maps(self, filenames: list[str]) -> list[dict[str, Any]]:
+        self.queries += 1
+        filenames = [filename.lower() for filename in filenames]
+        return [m for m in self.maps if m["filename"].lower() in filenames]
+
+    async def fetch_scores(self, map_md5s: list[str], **kwargs: Any) -> list[Any]:
+        self.queries += 1
+        return [{"map_md5": map_md5s[0], "grade": "S"}]
+
+
+@pytest.fixture
+def repos(monkeypatch: pytest.MonkeyPatch) -> FakeRepos:
+    repos = FakeRepos(num_maps=2000)
+    monkeypatch.setattr(osu.maps_repo, "fetch_many", repos.fetch_maps)
+    monkeypatch.setattr(osu.scores_repo, "fetch_many", repos.fetch_scores)
+    return repos
+
+
+async def test_filenames_are_resolved_in_bulk(repos: FakeRepos):
+    player = SimpleNamespace(id=3, status=SimpleNamespace(mode=GameMode.RELAX_OSU))
+    filenames = [m["filename"] for m in repos.maps]
+    filenames[1] = "Not A Map.osu"
+    filenames[2] = filenames[2].upper()
+
+    response = b"".join(
+        [chunk async for chunk in osu.resolve_beatmap_info(filenames, player)],
+    )
+    lines = response.decode().split("\n")
+
+    # two queries per chunk, rather than two per map
+    assert repos.queries == 2 * (2000 // osu.BEATMAP_INFO_CHUNK_SIZE)
+
+    assert len(lines) == 1999
+    assert lines[0] == f"0|0|0|{0:032x}|1|S|N|N|N"
+    assert lines[1] == f"2|2|0|{2:032x}|1|N|N|N|N"
+    assert lines[-1].startswith("1999|1999|499|")
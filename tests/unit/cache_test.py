@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+
+from app.constants.gamemodes import GameMode
+from app.objects.beatmap import Beatmap
+from app.objects.beatmap import BeatmapSet
+from app.state.cache import BeatmapCache
+from app.state.cache import Leaderboard
+from app.state.cache import LeaderboardCache
+from app.state.cache import ReplayHeader
+from app.state.cache import ReplayHeaderCache
+from app.state.cache import SearchCache
+
+
+def make_set(bsid: int, num_maps: int = 2, checked_ago: timedelta = timedelta()) -> BeatmapSet:
+    bmap_set = BeatmapSet(id=bsid, last_osuapi_check=datetime.now() - checked_ago)
+    for i in range(num_maps):
+        bmap_id = bsid * 100 + i
+        bmap_set.maps.append(
+            Beatmap(
+                map_set=bmap_set,
+                md5=f"{bmap_id:032x}",
+                id=bmap_id,
+                set_id=bsid,
+                last_update=datetime.now(),
+            ),
+        )
+    return bmap_set
+
+
+def test_lookups():
+    cache = BeatmapCache(max_sets=10, max_bytes=2**30)
+    bmap_set = make_set(1)
+    cache.add_set(bmap_set)
+
+    bmap = bmap_set.maps[0]
+    assert cache.get_map(bmap.md5) is bmap
+    assert cache.get_map(bmap.id) is bmap
+    assert cache.get_set(1) is bmap_set
+    assert cache.get_map("missing") is None
+
+    # the mapping views used throughout the codebase
+    assert bmap.md5 in cache.maps
+    assert cache.maps[bmap.id] is bmap
+    assert cache.maps.get(12345) is None
+    assert 1 in cache.sets
+    assert cache.sets[1] is bmap_set
+
+
+def test_lru_eviction_keeps_indexes_consistent():
+    cache = BeatmapCache(max_sets=2, max_bytes=2**30)
+    first, second, third = make_set(1), make_set(2), make_set(3)
+    cache.add_set(first)
+    cache.add_set(second)
+
+    cache.get_map(first.maps[0].md5)  # make `second` least recently used
+    cache.add_set(third)
+
+    assert list(cache.sets) == [1, 3]
+    for bmap in second.maps:
+        assert bmap.md5 not in cache.maps
+        assert bmap.id not in cache.maps
+    assert len(cache.maps) == 2 * 4
+
+
+def test_byte_budget():
+    size = BeatmapCache(max_sets=10, max_bytes=2**30)
+    size.add_set(make_set(1))
+    set_size = size.size_bytes
+
+    cache = BeatmapCache(max_sets=100, max_bytes=set_size * 3)
+    for bsid in range(1, 11):
+        cache.add_set(make_set(bsid))
+
+    assert cache.size_bytes <= set_size * 3
+    assert list(cache.sets) == [8, 9, 10]
+
+
+def test_refresh_reindexes_changed_maps():
+    cache = BeatmapCache(max_sets=10, max_bytes=2**30)
+    bmap_set = make_set(1)
+    cache.add_set(bmap_set)
+    size = cache.size_bytes
+
+    # e.g. a map was updated on the osu!api.
+    bmap = bmap_set.maps[0]
+    old_md5 = bmap.md5
+    bmap.md5 = "f" * 32
+    cache.add_set(bmap_set)
+
+    assert old_md5 not in cache.maps
+    assert cache.get_map("f" * 32) is bmap
+    assert cache.size_bytes == size
+
+
+def test_evict_expired():
+    cache = BeatmapCache(max_sets=10, max_bytes=2**30)
+    cache.add_set(make_set(1))
+    cache.add_set(make_set(2, checked_ago=timedelta(days=2)))
+
+    assert cache.evict_expired() == 1
+    assert list(cache.sets) == [1]
+    assert 201 not in cache.maps
+
+
+def test_remove_set():
+    cache = BeatmapCache(max_sets=10, max_bytes=2**30)
+    cache.add_set(make_set(1))
+
+    cache.remove_set(1)
+    cache.remove_set(1)
+
+    assert len(cache) == 0
+    assert len(cache.maps) == 0
+    assert cache.size_bytes == 0
+
+
+def make_leaderboard(user_ids: list[int], complete: bool = True) -> Leaderboard:
+    return Leaderboard(
+        scores=[
+            {"id": i, "userid": user_id, "_score": 1000 - i}
+            for i, user_id in enumerate(user_ids)
+        ],
+        complete=complete,
+    )
+
+
+def test_leaderboard_invalidate_map():
+    cache = LeaderboardCache(max_leaderboards=10)
+    cache.add(("a" * 32, 0, "score"), make_leaderboard([1, 2]), cache.generation)
+    cache.add(("a" * 32, 4, "pp"), make_leaderboard([1, 2]), cache.generation)
+    cache.add(("b" * 32, 0, "score"), make_leaderboard([1, 2]), cache.generation)
+
+    cache.invalidate_map("a" * 32, GameMode.VANILLA_OSU)
+    assert cache.get(("a" * 32, 0, "score")) is None
+    assert cache.get(("a" * 32, 4, "pp")) is not None
+
+    cache.invalidate_map("a" * 32)
+    assert cache.get(("a" * 32, 4, "pp")) is None
+    assert cache.get(("b" * 32, 0, "score")) is not None
+
+
+def test_leaderboard_invalidate_user():
+    cache = LeaderboardCache(max_leaderboards=10)
+    cache.add(("a" * 32, 0, "score"), make_leaderboard([1, 2]), cache.generation)
+    cache.add(("b" * 32, 0, "score"), make_leaderboard([2, 3]), cache.generation)
+    cache.add(("c" * 32, 0, "score"), make_leaderboard([3, 4]), cache.generation)
+
+    cache.invalidate_user(2)
+    assert cache.get(("a" * 32, 0, "score")) is None
+    assert cache.get(("b" * 32, 0, "score")) is None
+    assert cache.get(("c" * 32, 0, "score")) is not None
+
+    # the removed leaderboards are no longer indexed by their other players
+    assert 1 not in cache._user_keys
+    assert cache._user_keys[3] == {("c" * 32, 0, "score")}
+
+
+def test_leaderboard_stale_reads_are_not_cached():
+    cache = LeaderboardCache(max_leaderboards=10)
+
+    # a score is submitted while the leaderboard is being read from sql
+    generation = cache.generation
+    cache.invalidate_map("a" * 32, GameMode.VANILLA_OSU)
+    cache.add(("a" * 32, 0, "score"), make_leaderboard([1]), generation)
+
+    assert cache.get(("a" * 32, 0, "score")) is None
+
+
+def test_leaderboard_lru_eviction():
+    cache = LeaderboardCache(max_leaderboards=2)
+    for i in range(3):
+        cache.add((f"{i:032x}", 0, "score"), make_leaderboard([i]), cache.generation)
+
+    assert len(cache) == 2
+    assert cache.get((f"{0:032x}", 0, "score")) is None
+    assert 0 not in cache._user_keys
+
+
+def make_replay_header(user_id: int, map_md5: str) -> ReplayHeader:
+    return ReplayHeader(
+        user_id=user_id,
+        map_md5=map_md5,
+        data=b"header",
+        content_disposition='attachment; filename="replay.osr"',
+    )
+
+
+def test_replay_header_cache_evicts_least_recently_used():
+    cache = ReplayHeaderCache(max_headers=2)
+    for score_id in (1, 2):
+        cache.add(score_id, make_replay_header(3, "a" * 32), cache.generation)
+
+    assert cache.get(1) is not None
+    cache.add(3, make_replay_header(3, "a" * 32), cache.generation)
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+
+
+def test_replay_header_cache_invalidation():
+    cache = ReplayHeaderCache(max_headers=10)
+    cache.add(1, make_replay_header(3, "a" * 32), cache.generation)
+    cache.add(2, make_replay_header(4, "a" * 32), cache.generation)
+    cache.add(3, make_replay_header(4, "b" * 32), cache.generation)
+
+    cache.invalidate_user(4)
+    assert cache.get(1) is not None
+    assert cache.get(2) is None
+    assert cache.get(3) is None
+
+    cache.invalidate_map("a" * 32)
+    assert len(cache) == 0
+    assert not cache._user_score_ids and not cache._map_score_ids
+
+
+def test_replay_header_cache_ignores_invalidated_reads():
+    cache = ReplayHeaderCache(max_headers=10)
+
+    generation = cache.generation
+    cache.invalidate_user(3)  # e.g. renamed while reading from sql
+    cache.add(1, make_replay_header(3, "a" * 32), generation)
+
+    assert cache.get(1) is None
+
+
+class SearchBuilder:
+    def __init__(self, response: bytes | None = b"response") -> None:
+        self.response = response
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self) -> bytes | None:
+        self.calls += 1
+        await self.release.wait()
+        return self.response
+
+
+async def test_search_cache_serves_responses_until_they_expire():
+    cache = SearchCache(max_responses=10, ttl=60)
+    build = SearchBuilder()
+
+    for _ in range(3):
+        assert await cache.get_or_build("newest", build) == b"response"
+    assert build.calls == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    expired = SearchCache(max_responses=10, ttl=0)
+    for _ in range(3):
+        assert await expired.get_or_build("newest", build) == b"response"
+    assert build.calls == 4
+
+
+async def test_search_cache_coalesces_concurrent_searches():
+    cache = SearchCache(max_responses=10, ttl=60)
+    build = SearchBuilder()
+    build.release.clear()
+
+    searches = [
+        asyncio.create_task(cache.get_or_build("newest", build)) for _ in range(50)
+    ]
+    await asyncio.sleep(0)
+
+    # a requester disconnecting doesn't cancel the search for the others
+    searches[0].cancel()
+
+    build.release.set()
+    responses = await asyncio.gather(*searches[1:])
+
+    assert responses == [b"response"] * 49
+    assert build.calls == 1
+    assert (cache.hits, cache.misses) == (49, 1)
+
+
+async def test_search_cache_doesnt_cache_failures():
+    cache = SearchCache(max_responses=10, ttl=60)
+    build = SearchBuilder(response=None)
+
+    assert await cache.get_or_build("newest", build) is None
+    assert await cache.get_or_build("newest", build) is None
+    assert build.calls == 2
+    assert len(cache) == 0
+
+    async def fail() -> bytes | None:
+        raise RuntimeError("mirror is down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_build("newest", fail)
+
+    assert await cache.get_or_build("newest", SearchBuilder()) == b"response"
+
+
+async def test_search_cache_evicts_least_recently_used():
+    cache = SearchCache(max_responses=2, ttl=60)
+
+    for key in ("a", "b", "a", "c"):
+        await cache.get_or_build(key, SearchBuilder(key.encode()))
+
+    build = SearchBuilder()
+    assert await cache.get_or_build("a", build) == b"a"
+    assert await cache.get_or_build("b", build) == b"response"
+    assert build.calls == 1
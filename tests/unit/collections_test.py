@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import app.packets
+from app.constants.gamemodes import GameMode
+from app.constants.privileges import Privileges
+from app.objects.collections import Players
+from app.objects.player import ModeData
+from app.objects.player import Player
+
+
+def make_player(id: int, name: str | None = None, **kwargs) -> Player:
+    return Player(
+        id=id,
+        name=name or f"player {id}",
+        priv=kwargs.pop("priv", Privileges.UNRESTRICTED),
+        pw_bcrypt=None,
+        token=kwargs.pop("token", Player.generate_token()),
+        **kwargs,
+    )
+
+
+def make_players(n: int) -> Players:
+    players = Players()
+    for i in range(n):
+        players.append(make_player(i + 1, irc_key=f"irc-{i + 1}"))
+    return players
+
+
+def test_get_by_each_key():
+    players = make_players(10)
+    target = players[4]
+
+    assert players.get(token=target.token) is target
+    assert players.get(id=target.id) is target
+    assert players.get(name="PLAYER 5") is target
+    assert players.get(irc_key="irc-5") is target
+    assert players.get(id=1000) is None
+    assert players.get() is None
+
+
+def test_contains():
+    players = make_players(3)
+
+    assert players[0] in players
+    assert "player 1" in players
+    assert make_player(1000) not in players
+    assert "nobody" not in players
+
+    # names are compared exactly, not by their safe names
+    assert "Player 1" not in players
+    assert "player_1" not in players
+
+
+def test_remove_unindexes():
+    players = make_players(3)
+    target = players[1]
+
+    players.remove(target)
+
+    assert players.get(token=target.token) is None
+    assert players.get(id=target.id) is None
+    assert players.get(name=target.name) is None
+    assert players.get(irc_key="irc-2") is None
+    assert target not in players
+
+
+def test_remove_after_logout_clears_token():
+    players = make_players(3)
+    target = players[1]
+    token = target.token
+
+    # `Player.logout()` wipes the token before removal.
+    target.token = ""
+    players.remove(target)
+
+    assert players.get(token=token) is None
+    assert players.get(token="") is None
+
+
+def test_reindex_after_rename():
+    players = make_players(3)
+    target = players[0]
+
+    target.name = "new name"
+    players.reindex(target)
+
+    assert players.get(name="player 1") is None
+    assert players.get(name="new name") is target
+
+
+def test_reindex_after_token_change():
+    players = make_players(3)
+    target = players[0]
+    old_token = target.token
+
+    target.token = Player.generate_token()
+    players.reindex(target)
+
+    assert players.get(token=old_token) is None
+    assert players.get(token=target.token) is target
+
+
+def test_reindex_ignores_offline_players():
+    players = make_players(1)
+    offline = make_player(1000)
+
+    players.reindex(offline)
+
+    assert offline not in players
+
+
+def test_shared_keys_promote_next_session():
+    # tourney clients may log in multiple sessions under one account.
+    players = Players()
+    first = make_player(1, name="cmyui")
+    second = make_player(1, name="cmyui")
+    players.append(first)
+    players.append(second)
+
+    assert players.get(id=1) is first
+
+    players.remove(first)
+
+    assert players.get(id=1) is second
+    assert players.get(name="cmyui") is second
+
+
+def test_shared_keys_are_indexed_per_key():
+    players = Players()
+    sessions = [make_player(1, name="cmyui") for _ in range(3)]
+    for session in sessions:
+        players.append(session)
+
+    assert players._by_id[1] == sessions
+    assert players._by_safe_name["cmyui"] == sessions
+
+    players.remove(sessions[1])
+    assert players._by_id[1] == [sessions[0], sessions[2]]
+    assert players.get(id=1) is sessions[0]
+
+    players.remove(sessions[0])
+    players.remove(sessions[2])
+    assert 1 not in players._by_id
+    assert "cmyui" not in players._by_safe_name
+
+
+def test_ids():
+    players = make_players(5)
+    assert players.ids == {1, 2, 3, 4, 5}
+
+
+def test_privilege_partitions():
+    players = Players()
+    normal = make_player(1)
+    staff = make_player(2, priv=Privileges.UNRESTRICTED | Privileges.MODERATOR)
+    restricted = make_player(3, priv=Privileges(0))
+    for player in (normal, staff, restricted):
+        players.append(player)
+
+    assert players.unrestricted == {normal, staff}
+    assert players.restricted == {restricted}
+    assert players.staff == {staff}
+    assert players.unrestricted_count == 2
+    assert players.restricted_count == 1
+    assert players.staff_count == 1
+
+
+def test_privilege_partitions_follow_priv_changes():
+    players = make_players(2)
+    target = players[0]
+
+    target.priv &= ~Privileges.UNRESTRICTED
+    players.reindex(target)
+
+    assert target in players.restricted
+    assert target not in players.unrestricted
+
+    target.priv |= Privileges.UNRESTRICTED | Privileges.ADMINISTRATOR
+    players.reindex(target)
+
+    assert target in players.unrestricted
+    assert target in players.staff
+    assert target not in players.restricted
+
+
+def test_privilege_partitions_are_snapshots():
+    players = make_players(2)
+    unrestricted = players.unrestricted
+
+    players.remove(players[0])
+
+    # a caller's set doesn't change under it (e.g. across an await)
+    assert len(unrestricted) == 2
+    assert players.unrestricted_count == 1
+
+
+def test_privilege_partitions_follow_removal():
+    players = make_players(2)
+    target = players[0]
+
+    players.remove(target)
+
+    assert target not in players.unrestricted
+    assert players.unrestricted_count == 1
+
+
+def test_enqueue_shares_one_buffer():
+    players = make_players(3)
+    data = b"\x05\x00\x00\x04\x00\x00\x00\x01\x00\x00\x00"
+
+    players.enqueue(bytearray(data))
+
+    buffers = [player._packet_queue[0] for player in players]
+    assert all(buffer is buffers[0] for buffer in buffers)
+    assert all(player.dequeue() == data for player in players)
+
+
+def test_enqueue_immune():
+    players = make_players(3)
+
+    players.enqueue(b"data", immune=[players[0]])
+
+    assert players[0].dequeue() is None
+    assert players[1].dequeue() == b"data"
+    assert players[2].dequeue() == b"data"
+
+
+def test_dequeue_preserves_order():
+    players = make_players(1)
+    player = players[0]
+
+    player.enqueue(b"first")
+    players.enqueue(b"second")
+    player.enqueue(b"third")
+
+    assert player.dequeue() == b"firstsecondthird"
+    assert player.dequeue() is None
+
+
+def make_stats(user_id: int, value: int) -> bytes:
+    return app.packets.write(
+        app.packets.ServerPackets.USER_STATS,
+        (user_id, app.packets.osuTypes.i32),
+        (value, app.packets.osuTypes.u8),
+    )
+
+
+def test_enqueue_coalesces_superseded_packets():
+    player = make_player(1)
+
+    player.enqueue(make_stats(2, 1))
+    player.enqueue(app.packets.channel_info("#osu", "topic", 1))
+    player.enqueue(make_stats(3, 1))
+    player.enqueue(make_stats(2, 2))
+    player.enqueue(app.packets.channel_info("#osu", "topic", 2))
+
+    assert player.dequeue() == (
+        make_stats(3, 1)
+        + make_stats(2, 2)
+        + app.packets.channel_info("#osu", "topic", 2)
+    )
+
+
+def test_enqueue_coalescing_preserves_ordering():
+    player = make_player(1)
+    message = app.packets.send_message("cmyui", "hi", "#osu", 2)
+
+    player.enqueue(make_stats(2, 1))
+    player.enqueue(message)
+    player.enqueue(app.packets.logout(2))
+    player.enqueue(make_stats(2, 2))
+    player.enqueue(message)
+
+    # the newest stats must still follow the logout.
+    assert player.dequeue() == (
+        message + app.packets.logout(2) + make_stats(2, 2) + message
+    )
+
+    # the coalescing state is reset along with the queue.
+    player.enqueue(make_stats(2, 3))
+    assert player.dequeue() == make_stats(2, 3)
+
+
+def make_online_player(id: int, **kwargs) -> Player:
+    player = make_player(id, **kwargs)
+    player.stats[GameMode.VANILLA_OSU] = ModeData(
+        tscore=0,
+        rscore=0,
+        pp=id,
+        acc=100.0,
+        plays=0,
+        playtime=0,
+        max_combo=0,
+        total_hits=0,
+        rank=id,
+        grades={},
+    )
+    return player
+
+
+def roster_entry(player: Player) -> bytes:
+    return app.packets.user_presence(player) + app.packets.user_stats(player)
+
+
+def test_roster_contains_unrestricted_players():
+    players = Players()
+    normal = make_online_player(1)
+    restricted = make_online_player(2, priv=Privileges(0))
+    players.append(normal)
+    players.append(restricted)
+
+    assert players.roster == roster_entry(normal)
+
+    joined = make_online_player(3)
+    players.append(joined)
+
+    assert players.roster == roster_entry(normal) + roster_entry(joined)
+
+
+def test_roster_follows_changes():
+    players = Players()
+    first = make_online_player(1)
+    second = make_online_player(2)
+    players.append(first)
+    players.append(second)
+    players.roster
+
+    second.status.info_text = "gaming"
+
+    assert players.roster == roster_entry(first) + roster_entry(second)
+
+    first.priv &= ~Privileges.UNRESTRICTED
+    players.reindex(first)
+
+    assert players.roster == roster_entry(second)
+
+    players.remove(second)
+
+    assert players.roster == b""
+
+
+def test_roster_buffer_is_reused_until_packets_change():
+    players = Players()
+    online = [make_online_player(i + 1) for i in range(3)]
+    for player in online:
+        players.append(player)
+
+    roster = players.roster
+    assert players.roster is roster
+
+    # logins only serialize the players who joined since the last one
+    entries = dict(players._roster)
+    joined = make_online_player(4)
+    players.append(joined)
+
+    assert players.roster == roster + roster_entry(joined)
+    assert all(players._roster[player] is entries[player] for player in online)
+
+    # stats changed anywhere (e.g. a new rank) are picked up without
+    # any explicit invalidation, & only the changed player's is rebuilt
+    roster = players.roster
+    online[0].stats[GameMode.VANILLA_OSU].rank = 1000
+
+    assert players.roster is not roster
+    assert players.roster == b"".join(map(roster_entry, [*online, joined]))
+    assert all(players._roster[player] is entries[player] for player in online[1:])
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import ipaddress
+from pathlib import Path
+
+import pytest
+
+import app.state.services
+from app._typing import IPAddress
+from app.state.services import Geolocation
+from app.state.services import GeolocationRanges
+from app.state.services import GeolocationResolver
+from app.state.services import load_geoloc_database
+
+GEOLOC_DATABASE = """\
+network,country_code,latitude,longitude
+1.0.0.0/24,au,-33.49,143.21
+2001:db8::/32,jp,35.69,139.69
+8.8.8.0/24,zz,0,0
+"""
+
+GEOLOC_RANGES_DATABASE = """\
+16777472,16778239,cn,34.77,113.72
+5.0.0.0,5.0.0.255,DE,51.3,9.49
+"""
+
+
+def make_geoloc(country_code: str) -> Geolocation:
+    return {
+        "latitude": 0.0,
+        "longitude": 0.0,
+        "country": {
+            "acronym": country_code,
+            "numeric": app.state.services.country_codes[country_code],
+        },
+    }
+
+
+@pytest.fixture
+def database_path(tmp_path: Path) -> Path:
+    path = tmp_path / "geoloc.csv"
+    path.write_text(GEOLOC_DATABASE + GEOLOC_RANGES_DATABASE)
+    return path
+
+
+@pytest.fixture
+def http_lookups(monkeypatch: pytest.MonkeyPatch) -> list[IPAddress]:
+    http_lookups: list[IPAddress] = []
+
+    async def fetch_geoloc_from_ip(ip: IPAddress) -> Geolocation | None:
+        http_lookups.append(ip)
+        return make_geoloc("us") if str(ip).startswith("3.") else None
+
+    monkeypatch.setattr(
+        app.state.services,
+        "_fetch_geoloc_from_ip",
+        fetch_geoloc_from_ip,
+    )
+    return http_lookups
+
+
+def lookup(ranges: dict[int, GeolocationRanges], ip: str) -> str | None:
+    address = ipaddress.ip_address(ip)
+    geoloc = ranges[address.version].lookup(address)
+    return geoloc["country"]["acronym"] if geoloc is not None else None
+
+
+def test_load_geoloc_database(database_path: Path):
+    ranges = load_geoloc_database(database_path)
+
+    # the header & the unknown country are skipped
+    assert len(ranges[4]) == 3
+    assert len(ranges[6]) == 1
+
+    assert lookup(ranges, "0.255.255.255") is None
+    assert lookup(ranges, "1.0.0.0") == "au"
+    assert lookup(ranges, "1.0.0.255") == "au"
+    assert lookup(ranges, "1.0.1.0") == "cn"
+    assert lookup(ranges, "1.0.3.255") == "cn"
+    assert lookup(ranges, "1.0.4.0") is None
+    assert lookup(ranges, "5.0.0.128") == "de"
+    assert lookup(ranges, "8.8.8.8") is None
+    assert lookup(ranges, "2001:db8::1") == "jp"
+    assert lookup(ranges, "2001:db9::1") is None
+
+
+async def test_database_lookups_skip_the_http_api(
+    database_path: Path,
+    http_lookups: list[IPAddress],
+):
+    resolver = GeolocationResolver(
+        cache_size=100,
+        negative_cache_ttl=300,
+        http_fallback=True,
+    )
+    await resolver.load_database(database_path)
+
+    geoloc = await resolver.resolve(ipaddress.ip_address("1.0.0.1"))
+    assert geoloc is not None
+    assert geoloc["country"] == {"acronym": "au", "numeric": 16}
+    assert geoloc["latitude"] == -33.49
+
+    geoloc = await resolver.resolve(ipaddress.ip_address("3.0.0.1"))
+    assert geoloc is not None
+    assert geoloc["country"]["acronym"] == "us"
+
+    assert http_lookups == [ipaddress.ip_address("3.0.0.1")]
+
+
+async def test_results_are_cached(http_lookups: list[IPAddress]):
+    resolver = GeolocationResolver(
+        cache_size=100,
+        negative_cache_ttl=300,
+        http_fallback=True,
+    )
+
+    for _ in range(3):
+        assert await resolver.resolve(ipaddress.ip_address("3.0.0.1")) is not None
+        # failed lookups are cached too
+        assert await resolver.resolve(ipaddress.ip_address("4.0.0.1")) is None
+
+    assert http_lookups == [
+        ipaddress.ip_address("3.0.0.1"),
+        ipaddress.ip_address("4.0.0.1"),
+    ]
+
+
+async def test_failed_lookups_expire(http_lookups: list[IPAddress]):
+    resolver = GeolocationResolver(
+        cache_size=100,
+        negative_cache_ttl=0,
+        http_fallback=True,
+    )
+
+    for _ in range(2):
+        assert await resolver.resolve(ipaddress.ip_address("4.0.0.1")) is None
+        assert await resolver.resolve(ipaddress.ip_address("3.0.0.1")) is not None
+
+    assert http_lookups == [
+        ipaddress.ip_address("4.0.0.1"),
+        ipaddress.ip_address("3.0.0.1"),
+        ipaddress.ip_address("4.0.0.1"),
+    ]
+
+
+async def test_least_recently_used_results_are_evicted(http_lookups: list[IPAddress]):
+    resolver = GeolocationResolver(
+        cache_size=2,
+        negative_cache_ttl=300,
+        http_fallback=True,
+    )
+
+    for ip in ("3.0.0.1", "3.0.0.2", "3.0.0.1", "3.0.0.3", "3.0.0.1", "3.0.0.2"):
+        await resolver.resolve(ipaddress.ip_address(ip))
+
+    assert http_lookups == [
+        ipaddress.ip_address("3.0.0.1"),
+        ipaddress.ip_address("3.0.0.2"),
+        ipaddress.ip_address("3.0.0.3"),
+        ipaddress.ip_address("3.0.0.2"),
+    ]
+
+
+async def test_http_fallback_can_be_disabled(
+    database_path: Path,
+    http_lookups: list[IPAddress],
+):
+    resolver = GeolocationResolver(
+        cache_size=100,
+        negative_cache_ttl=300,
+        http_fallback=False,
+    )
+    await resolver.load_database(database_path)
+
+    assert await resolver.resolve(ipaddress.ip_address("1.0.0.1")) is not None
+    assert await resolver.resolve(ipaddress.ip_address("3.0.0.1")) is None
+    assert http_lookups == []
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from app.constants.gamemodes import GameMode
+from app.usecases import map_rankings
+from app.usecases.map_rankings import BUILT_SENTINEL
+from app.usecases.map_rankings import make_key
+from app.usecases.map_rankings import scoring_metric
+from tests.conftest import FakeDatabase
+from tests.conftest import FakeRedis
+
+MAP_MD5 = "a" * 32
+OTHER_MAP_MD5 = "b" * 32
+
+
+def test_keys_are_per_map_and_mode():
+    md5 = "a" * 32
+    keys = {make_key(md5, mode) for mode in GameMode}
+    assert len(keys) == len(GameMode)
+    other_md5 = "b" * 32
+    assert make_key(md5, GameMode.VANILLA_OSU) != make_key(other_md5, GameMode.VANILLA_OSU)
+
+
+def test_scoring_metric():
+    assert scoring_metric(GameMode.VANILLA_MANIA) == "score"
+    assert scoring_metric(GameMode.RELAX_OSU) == "pp"
+    assert scoring_metric(GameMode.AUTOPILOT_OSU) == "pp"
+
+
+async def test_count_builds_rankings_on_miss(redis: FakeRedis, database: FakeDatabase):
+    database.add_score(1, score=300)
+    database.add_score(2, score=200)
+    database.add_score(3, score=1000, restricted=True)
+    database.add_score(4, score=1000, status=1)
+    database.add_score(5, score=1000, mode=GameMode.VANILLA_TAIKO)
+
+    mode = GameMode.VANILLA_OSU
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 150) == 2
+    assert redis.sets[make_key(MAP_MD5, mode)] == {
+        "1": 300,
+        "2": 200,
+        BUILT_SENTINEL: float("-inf"),
+    }
+
+    # once built, the rankings are counted from redis alone
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 250) == 1
+    assert database.queries == 1
+
+
+async def test_sentinel_is_never_counted(redis: FakeRedis, database: FakeDatabase):
+    mode = GameMode.VANILLA_OSU
+
+    # a map without scores is still only built once
+    for _ in range(2):
+        assert await map_rankings.count_better_scores(MAP_MD5, mode, 0) == 0
+    assert redis.sets[make_key(MAP_MD5, mode)] == {BUILT_SENTINEL: float("-inf")}
+    assert database.queries == 1
+
+    await map_rankings.add_score(MAP_MD5, mode, 1, 0)
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, -1) == 1
+
+
+async def test_count_excludes_ties(redis: FakeRedis, database: FakeDatabase):
+    database.add_score(1, mode=GameMode.RELAX_OSU, pp=200.5)
+    database.add_score(2, mode=GameMode.RELAX_OSU, pp=200.5)
+    database.add_score(3, mode=GameMode.RELAX_OSU, pp=100)
+
+    mode = GameMode.RELAX_OSU
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 200.5) == 0
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 200.4) == 2
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 100) == 2
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 99.9) == 3
+
+
+async def test_build_keeps_newer_scores(redis: FakeRedis, database: FakeDatabase):
+    mode = GameMode.VANILLA_OSU
+    database.add_score(1, score=300)
+    database.add_score(2, score=200)
+
+    # submitted while the rankings were being read from sql
+    redis._zadd(make_key(MAP_MD5, mode), {"1": 500})
+
+    await map_rankings.build(MAP_MD5, mode)
+
+    assert redis.sets[make_key(MAP_MD5, mode)] == {
+        "1": 500,
+        "2": 200,
+        BUILT_SENTINEL: float("-inf"),
+    }
+
+
+async def test_add_score_replaces_previous_best(
+    redis: FakeRedis,
+    database: FakeDatabase,
+):
+    mode = GameMode.VANILLA_OSU
+    database.add_score(1, score=300)
+    database.add_score(2, score=400)
+    await map_rankings.build(MAP_MD5, mode)
+
+    await map_rankings.add_score(MAP_MD5, mode, 1, 500)
+
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 450) == 1
+    assert await map_rankings.count_better_scores(MAP_MD5, mode, 250) == 2
+    assert len(redis.sets[make_key(MAP_MD5, mode)]) == 3
+
+
+async def test_remove_and_add_user(redis: FakeRedis, database: FakeDatabase):
+    database.add_score(1, score=300, pp=30)
+    database.add_score(1, map_md5=OTHER_MAP_MD5, mode=GameMode.RELAX_OSU, pp=40)
+    database.add_score(1, map_md5=OTHER_MAP_MD5, score=100, status=1)
+    database.add_score(2, score=200)
+
+    vn_key = make_key(MAP_MD5, GameMode.VANILLA_OSU)
+    rx_key = make_key(OTHER_MAP_MD5, GameMode.RELAX_OSU)
+    await map_rankings.build(MAP_MD5, GameMode.VANILLA_OSU)
+    await map_rankings.build(OTHER_MAP_MD5, GameMode.RELAX_OSU)
+
+    await map_rankings.remove_user(1)
+
+    assert "1" not in redis.sets[vn_key]
+    assert "1" not in redis.sets[rx_key]
+    assert "2" in redis.sets[vn_key]
+
+    # each best score is added back with its mode's metric
+    await map_rankings.add_user(1)
+
+    assert redis.sets[vn_key]["1"] == 300
+    assert redis.sets[rx_key]["1"] == 40
+    assert make_key(OTHER_MAP_MD5, GameMode.VANILLA_OSU) not in redis.sets
+
+
+async def test_remove_user_in_one_mode(redis: FakeRedis, database: FakeDatabase):
+    database.add_score(1, score=300)
+    database.add_score(1, mode=GameMode.RELAX_OSU, pp=40)
+
+    await map_rankings.build(MAP_MD5, GameMode.VANILLA_OSU)
+    await map_rankings.build(MAP_MD5, GameMode.RELAX_OSU)
+
+    await map_rankings.remove_user(1, GameMode.RELAX_OSU)
+
+    assert "1" in redis.sets[make_key(MAP_MD5, GameMode.VANILLA_OSU)]
+    assert "1" not in redis.sets[make_key(MAP_MD5, GameMode.RELAX_OSU)]
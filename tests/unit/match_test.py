@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+from app.constants.gamemodes import GameMode
+from app.constants.mods import Mods
+from app.constants.privileges import Privileges
+from app.objects import match as match_module
+from app.objects.beatmap import Beatmap
+from app.objects.match import Match
+from app.objects.match import MatchTeams
+from app.objects.match import MatchTeamTypes
+from app.objects.match import MatchWinConditions
+from app.objects.match import SlotStatus
+from app.objects.player import Player
+from app.objects.score import Score
+
+MAP_MD5 = "a" * 32
+
+
+def make_match(team_type: MatchTeamTypes, num_players: int = 16) -> Match:
+    match = Match(
+        id=1,
+        name="test match",
+        password="",
+        has_public_history=False,
+        map_name="test map",
+        map_id=1,
+        map_md5=MAP_MD5,
+        host_id=1,
+        mode=GameMode.VANILLA_OSU,
+        mods=Mods.NOMOD,
+        win_condition=MatchWinConditions.score,
+        team_type=team_type,
+        freemods=False,
+        seed=0,
+        chat_channel=None,  # type: ignore[arg-type]
+    )
+
+    for i, slot in enumerate(match.slots[:num_players]):
+        slot.player = Player(
+            id=i + 1,
+            name=f"player {i + 1}",
+            priv=Privileges.UNRESTRICTED,
+            pw_bcrypt=None,
+            token=Player.generate_token(),
+        )
+        slot.status = SlotStatus.complete
+        slot.team = MatchTeams.blue if i % 2 else MatchTeams.red
+
+    return match
+
+
+def submit_score(player: Player, score_value: int, map_md5: str = MAP_MD5) -> Score:
+    score = Score()
+    score.bmap = Beatmap(map_set=None, md5=map_md5)  # type: ignore[arg-type]
+    score.player = player
+    score.mode = GameMode.VANILLA_OSU
+    score.score = score_value
+    score.server_time = datetime.now()
+
+    player.recent_scores[score.mode] = score
+    if player.match is not None:
+        player.match.add_submitted_score(score)
+
+    return score
+
+
+@pytest.fixture(autouse=True)
+def beatmap(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def from_md5(md5: str, set_id: int = -1) -> Beatmap:
+        return Beatmap(map_set=None, md5=md5, total_length=120)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(match_module.Beatmap, "from_md5", from_md5)
+
+
+async def test_scores_are_collected_as_soon_as_the_last_lands():
+    match = make_match(MatchTeamTypes.head_to_head)
+    was_playing = [s for s in match.slots if s.player]
+    for s in was_playing:
+        assert s.player is not None
+        s.player.match = match
+
+    async def play(player: Player, score_value: int) -> None:
+        await asyncio.sleep(random.uniform(0, 0.05))
+        submit_score(player, score_value)
+
+    started_at = time.perf_counter()
+    (scores, didnt_submit), *_ = await asyncio.gather(
+        match.await_submissions(was_playing),
+        *[play(s.player, 1000 * (i + 1)) for i, s in enumerate(was_playing)],  # type: ignore[arg-type]
+    )
+
+    # far sooner than the previous 0.5s polling interval per player
+    assert time.perf_counter() - started_at < 0.5
+    assert didnt_submit == []
+    assert scores == {s.player: 1000 * (i + 1) for i, s in enumerate(was_playing)}
+    assert match._submission_waiters == {}
+
+
+async def test_team_scores_are_summed():
+    match = make_match(MatchTeamTypes.team_vs)
+    was_playing = [s for s in match.slots if s.player]
+
+    # scores submitted before the match completed are used
+    for s in was_playing:
+        assert s.player is not None
+        submit_score(s.player, 100 if s.team == MatchTeams.red else 200)
+
+    scores, didnt_submit = await match.await_submissions(was_playing)
+
+    assert didnt_submit == []
+    assert scores == {MatchTeams.red: 800, MatchTeams.blue: 1600}
+
+
+async def test_missing_scores_time_out_together(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(match_module, "SUBMISSION_TIMEOUT", 0.1)
+
+    match = make_match(MatchTeamTypes.head_to_head)
+    was_playing = [s for s in match.slots if s.player]
+    for s in was_playing:
+        assert s.player is not None
+        s.player.match = match
+
+    task = asyncio.create_task(match.await_submissions(was_playing))
+    await asyncio.sleep(0)
+
+    # half of the players submit, one of them on another map
+    for s in was_playing[:8]:
+        assert s.player is not None
+        submit_score(s.player, 1000)
+    assert was_playing[8].player is not None
+    submit_score(was_playing[8].player, 1000, map_md5="b" * 32)
+
+    started_at = time.perf_counter()
+    scores, didnt_submit = await task
+
+    # one deadline for all players, rather than one per player
+    assert time.perf_counter() - started_at < 0.5
+    assert len(scores) == 8
+    assert didnt_submit == [s.player for s in was_playing[8:]]
+    assert match._submission_waiters == {}
@@ -1,8 +1,21 @@
 from __future__ import annotations
 
+import struct
+import timeit
+from types import SimpleNamespace
+from typing import Any
+
 import pytest
 
 import app.packets
+from app.constants.gamemodes import GameMode
+from app.constants.privileges import Privileges
+from app.objects.player import ModeData
+from app.objects.player import Player
+from app.packets import BanchoPacketReader
+from app.packets import ClientPackets
+from app.packets import ServerPackets
+from app.packets import osuTypes
 
 
 @pytest.mark.parametrize(
@@ -667,3 +680,384 @@ def test_write_match_abort():
 )
 def test_write_switch_tournament_server(test_input, expected):
     assert app.packets.switch_tournament_server(test_input) == expected
+
+
+def test_coalesce_key():
+    stats = app.packets.write(
+        app.packets.ServerPackets.USER_STATS,
+        (1001, app.packets.osuTypes.i32),
+    )
+    info = app.packets.channel_info("#osu", "general chat", 5)
+
+    assert app.packets.coalesce_key(stats) == (11, 1001)
+    assert app.packets.coalesce_key(info) == (65, b"#osu")
+    assert app.packets.coalesce_key(app.packets.logout(1001)) is None
+    # bundled packets are never coalesced.
+    assert app.packets.coalesce_key(stats + stats) is None
+
+
+def make_player_with_stats() -> Player:
+    player = Player(
+        id=1001,
+        name="cmyui",
+        priv=Privileges.UNRESTRICTED,
+        pw_bcrypt=None,
+        token="token",
+    )
+    player.stats[GameMode.VANILLA_OSU] = ModeData(
+        tscore=0,
+        rscore=0,
+        pp=100,
+        acc=95.0,
+        plays=1,
+        playtime=0,
+        max_combo=0,
+        total_hits=0,
+        rank=42,
+        grades={},
+    )
+    return player
+
+
+def test_user_stats_is_cached_until_changed():
+    player = make_player_with_stats()
+
+    packet = app.packets.user_stats(player)
+    assert app.packets.user_stats(player) is packet
+
+    player.status.info_text = "gaming"
+    changed = app.packets.user_stats(player)
+    assert changed != packet
+    assert app.packets.user_stats(player) is changed
+
+    player.gm_stats.pp = 200
+    assert app.packets.user_stats(player) != changed
+
+
+def test_user_presence_is_cached_until_changed():
+    player = make_player_with_stats()
+
+    packet = app.packets.user_presence(player)
+    assert app.packets.user_presence(player) is packet
+
+    player.utc_offset = 2
+    changed = app.packets.user_presence(player)
+    assert changed != packet
+
+    player.geoloc = {
+        "latitude": 1.0,
+        "longitude": 1.0,
+        "country": {"acronym": "ca", "numeric": 38},
+    }
+    assert app.packets.user_presence(player) != changed
+
+
+def make_client_packet(packet_id: int, data: bytes) -> bytes:
+    return struct.pack("<HxI", packet_id, len(data)) + data
+
+
+def read_packets(body: bytes, handlers: dict[ClientPackets, Any]) -> list[Any]:
+    packet_map = {
+        packet_id: type(f"Packet{packet_id}", (), {"__init__": init, "handle": None})
+        for packet_id, init in handlers.items()
+    }
+    with memoryview(body) as body_view:
+        return list(BanchoPacketReader(body_view, packet_map))  # type: ignore[arg-type]
+
+
+def test_reader_primitives():
+    data = (
+        struct.pack("<bBhHiIqQfd", -1, 255, -2, 65535, -3, 2**32 - 1, -4, 2**64 - 1, 1.5, 2.5)
+        + app.packets.write_string("cmyui")
+        + app.packets.write_string("")
+        + struct.pack("<H3I", 3, 1, 2, 3)
+    )
+
+    def init(self, reader):
+        self.values = [
+            reader.read_i8(),
+            reader.read_u8(),
+            reader.read_i16(),
+            reader.read_u16(),
+            reader.read_i32(),
+            reader.read_u32(),
+            reader.read_i64(),
+            reader.read_u64(),
+            reader.read_f32(),
+            reader.read_f64(),
+            reader.read_string(),
+            reader.read_string(),
+            reader.read_i32_list_i16l(),
+        ]
+
+    (packet,) = read_packets(
+        make_client_packet(ClientPackets.PING, data),
+        {ClientPackets.PING: init},
+    )
+    assert packet.values == [
+        -1,
+        255,
+        -2,
+        65535,
+        -3,
+        2**32 - 1,
+        -4,
+        2**64 - 1,
+        1.5,
+        2.5,
+        "cmyui",
+        "",
+        (1, 2, 3),
+    ]
+
+
+def test_reader_skips_unhandled_and_unread_data():
+    def init(self, reader):
+        self.value = reader.read_i32()
+
+    body = (
+        make_client_packet(ClientPackets.LOGOUT, b"\x00" * 4)
+        + make_client_packet(0xFFFF, b"\x01" * 10)  # unknown packet id
+        + make_client_packet(ClientPackets.PING, struct.pack("<ii", 1, 2))
+        + make_client_packet(ClientPackets.PING, struct.pack("<i", 3))
+    )
+
+    packets = read_packets(body, {ClientPackets.PING: init})
+
+    assert [packet.value for packet in packets] == [1, 3]
+
+
+def make_match_body(freemods: bool) -> bytes:
+    statuses = [4, 1, 4] + [2] * 13  # two slots occupied (status & 124)
+    teams = [0] * 16
+    data = struct.pack("<hbbi", 3, 1, 0, 64)
+    data += app.packets.write_string("match name")
+    data += app.packets.write_string("")
+    data += app.packets.write_string("artist - title [diff]")
+    data += struct.pack("<i", 1723723)
+    data += app.packets.write_string("60b725f10c9c85c70d97880dfe8191b3")
+    data += struct.pack("<16b16b", *statuses, *teams)
+    data += struct.pack("<ii", 1001, 1002)
+    data += struct.pack("<ibbbb", 1001, 0, 1, 2, freemods)
+    if freemods:
+        data += struct.pack("<16i", *range(16))
+    data += struct.pack("<i", 1337)
+    return data
+
+
+@pytest.mark.parametrize("freemods", [False, True])
+def test_reader_match(freemods):
+    def init(self, reader):
+        self.match = reader.read_match()
+
+    (packet,) = read_packets(
+        make_client_packet(ClientPackets.MATCH_CHANGE_SETTINGS, make_match_body(freemods)),
+        {ClientPackets.MATCH_CHANGE_SETTINGS: init},
+    )
+    match = packet.match
+
+    assert (match.id, match.in_progress, match.mods) == (3, True, 64)
+    assert (match.name, match.passwd) == ("match name", "")
+    assert (match.map_id, match.map_md5) == (1723723, "60b725f10c9c85c70d97880dfe8191b3")
+    assert match.slot_statuses == [4, 1, 4] + [2] * 13
+    assert match.slot_ids == [1001, 1002]
+    assert (match.host_id, match.win_condition, match.team_type) == (1001, 1, 2)
+    assert match.freemods is freemods
+    assert match.slot_mods == (list(range(16)) if freemods else [])
+    assert match.seed == 1337
+
+
+def make_frame_bundle_body(framecount: int) -> bytes:
+    data = struct.pack("<iH", 0, framecount)
+    for i in range(framecount):
+        data += struct.pack("<BBffi", 1, 0, 256.0, 192.0, i * 16)
+    data += struct.pack("<B", 0)
+    data += app.packets.SCOREFRAME_FMT.pack(
+        *(1000, 0, 10, 1, 0, 2, 1, 0, 12345, 11, 11, False, 200, 0, False),
+    )
+    data += struct.pack("<H", 7)
+    return data
+
+
+def test_reader_replayframe_bundle():
+    def init(self, reader):
+        self.bundle = reader.read_replayframe_bundle()
+
+    data = make_frame_bundle_body(framecount=30)
+    (packet,) = read_packets(
+        make_client_packet(ClientPackets.SPECTATE_FRAMES, data),
+        {ClientPackets.SPECTATE_FRAMES: init},
+    )
+    bundle = packet.bundle
+
+    assert len(bundle.replay_frames) == 30
+    assert bundle.replay_frames[2] == app.packets.ReplayFrame(1, 0, 256.0, 192.0, 32)
+    assert bundle.score_frame.total_score == 12345
+    assert bundle.sequence == 7
+    assert bytes(bundle.raw_data) == data
+
+
+def test_reader_throughput():
+    """Report packets/sec over a recorded-style mix of client bodies."""
+    change_action = (
+        struct.pack("<B", 2)
+        + app.packets.write_string("artist - title [diff]")
+        + app.packets.write_string("60b725f10c9c85c70d97880dfe8191b3")
+        + struct.pack("<IBi", 64, 0, 1723723)
+    )
+    message = (
+        app.packets.write_string("")
+        + app.packets.write_string("hello world")
+        + app.packets.write_string("#osu")
+        + struct.pack("<i", 0)
+    )
+    body = (
+        make_client_packet(ClientPackets.CHANGE_ACTION, change_action)
+        + make_client_packet(ClientPackets.SEND_PUBLIC_MESSAGE, message)
+        + make_client_packet(ClientPackets.SPECTATE_FRAMES, make_frame_bundle_body(30))
+        + make_client_packet(ClientPackets.MATCH_CHANGE_SETTINGS, make_match_body(True))
+        + make_client_packet(ClientPackets.PING, b"")
+    ) * 20
+
+    def change_action_init(self, reader):
+        self.values = (
+            reader.read_u8(),
+            reader.read_string(),
+            reader.read_string(),
+            reader.read_u32(),
+            reader.read_u8(),
+            reader.read_i32(),
+        )
+
+    handlers = {
+        ClientPackets.CHANGE_ACTION: change_action_init,
+        ClientPackets.SEND_PUBLIC_MESSAGE: lambda self, r: setattr(self, "value", r.read_message()),
+        ClientPackets.SPECTATE_FRAMES: lambda self, r: setattr(self, "value", r.read_replayframe_bundle()),
+        ClientPackets.MATCH_CHANGE_SETTINGS: lambda self, r: setattr(self, "value", r.read_match()),
+        ClientPackets.PING: lambda self, r: None,
+    }
+    assert len(read_packets(body, handlers)) == 100
+
+    elapsed = min(timeit.repeat(lambda: read_packets(body, handlers), number=20, repeat=3))
+    print(f"BanchoPacketReader: {100 * 20 / elapsed:,.0f} packets/sec")
+
+
+def make_match() -> Any:
+    slots = [
+        SimpleNamespace(status=4 if i < 2 else 1, team=0, mods=0, player=None)
+        for i in range(16)
+    ]
+    slots[0].player = SimpleNamespace(id=1001)
+    slots[1].player = SimpleNamespace(id=1002)
+    return SimpleNamespace(
+        id=3,
+        in_progress=False,
+        mods=64,
+        name="match name",
+        passwd="secret",
+        map_name="artist - title [diff]",
+        map_id=1723723,
+        map_md5="60b725f10c9c85c70d97880dfe8191b3",
+        slots=slots,
+        host=slots[0].player,
+        mode=0,
+        win_condition=0,
+        team_type=0,
+        freemods=False,
+        seed=1337,
+    )
+
+
+@pytest.mark.parametrize("send_pw", [True, False])
+def test_encoder_update_match(send_pw):
+    match = make_match()
+    assert app.packets.update_match(match, send_pw) == app.packets.write(
+        ServerPackets.UPDATE_MATCH,
+        ((match, send_pw), osuTypes.match),
+    )
+
+
+def test_encoder_spectate_frames():
+    data = make_frame_bundle_body(framecount=3)
+    assert app.packets.spectate_frames(data) == app.packets.write(
+        ServerPackets.SPECTATE_FRAMES,
+        (data, osuTypes.raw),
+    )
+
+
+def test_encoder_layouts():
+    # fixed-size only (constant length)
+    encode = app.packets.compile_encoder(ServerPackets.USER_ID, osuTypes.i32)
+    assert encode(1001) == app.packets.login_reply(1001)
+
+    # variable-size field first, long strings (multi-byte uleb128)
+    encode = app.packets.compile_encoder(
+        ServerPackets.NOTIFICATION,
+        osuTypes.string,
+        osuTypes.u8,
+    )
+    for text in ("", "a", "x" * 200, "é" * 20_000):
+        assert encode(text, 1) == app.packets.write(
+            ServerPackets.NOTIFICATION,
+            (text, osuTypes.string),
+            (1, osuTypes.u8),
+        )
+
+    # composite types
+    encode = app.packets.compile_encoder(ServerPackets.CHANNEL_INFO, osuTypes.channel)
+    assert encode("#osu", "topic", 5) == app.packets.channel_info("#osu", "topic", 5)
+
+    # fields are taken flat, so miscounts can't go unnoticed
+    with pytest.raises(TypeError):
+        encode("#osu", "topic")
+    with pytest.raises(TypeError):
+        encode("#osu", "topic", 5, 6)
+
+
+def test_encoder_benchmark():
+    """Report encode ns/packet for hot packets, via write() vs. compiled encoders."""
+    stats_args = (1001, 2, "gaming", "60b725f10c9c85c70d97880dfe8191b3", 64, 0, 1723723)
+    stats_args += (1_238_917_112, 0.9232, 3821, 3_812_428_392, 42, 8291)
+    stats_layout = (
+        osuTypes.i32,
+        osuTypes.u8,
+        osuTypes.string,
+        osuTypes.string,
+        osuTypes.i32,
+        osuTypes.u8,
+        osuTypes.i32,
+        osuTypes.i64,
+        osuTypes.f32,
+        osuTypes.i32,
+        osuTypes.i64,
+        osuTypes.i32,
+        osuTypes.u16,
+    )
+    message_args = ("cmyui", "woah woah crazy!!", "#osu", 1001)
+
+    cases = {
+        "user_stats": (
+            lambda: app.packets.write(
+                ServerPackets.USER_STATS,
+                *zip(stats_args, stats_layout),
+            ),
+            lambda: app.packets._encode_user_stats(*stats_args),
+        ),
+        "send_message": (
+            lambda: app.packets.write(
+                ServerPackets.SEND_MESSAGE,
+                (message_args, osuTypes.message),
+            ),
+            lambda: app.packets.send_message(*message_args),
+        ),
+    }
+
+    for name, (before, after) in cases.items():
+        assert before() == after()
+
+        n = 10_000
+        before_ns = min(timeit.repeat(before, number=n, repeat=3)) / n * 1e9
+        after_ns = min(timeit.repeat(after, number=n, repeat=3)) / n * 1e9
+        print(f"{name}: {before_ns:.0f}ns/packet -> {after_ns:.0f}ns/packet")
+
+        assert after_ns < before_ns
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+from akatsuki_pp_py import Beatmap
+from akatsuki_pp_py import Calculator
+
+import app.objects.score
+from app.constants.gamemodes import GameMode
+from app.constants.mods import Mods
+from app.objects.score import Score
+from app.usecases import performance
+from app.usecases.performance import PerformanceEngine
+from app.usecases.performance import ScoreParams
+from app.usecases.performance import calculate_performances
+
+OSU_FILE = """\
+osu file format v14
+
+[General]
+Mode: 0
+
+[Difficulty]
+HPDrainRate:5
+CircleSize:4
+OverallDifficulty:8
+ApproachRate:9
+SliderMultiplier:1.4
+SliderTickRate:1
+
+[TimingPoints]
+0,500,4,2,0,100,1,0
+
+[HitObjects]
+100,100,1000,1,0,0:0:0:0:
+200,200,1500,1,0,0:0:0:0:
+300,100,2000,1,0,0:0:0:0:
+400,300,2500,1,0,0:0:0:0:
+"""
+
+
+@pytest.fixture
+def osu_file_path(tmp_path: Path) -> str:
+    path = tmp_path / "1.osu"
+    path.write_text(OSU_FILE)
+    return str(path)
+
+
+@pytest.fixture
+async def engine():
+    engine = PerformanceEngine(max_workers=2, max_queue_size=2, timeout=30)
+    yield engine
+    engine.shutdown()
+
+
+async def test_engine_matches_inline_calculation(engine, osu_file_path):
+    scores = [ScoreParams(mode=0, acc=acc) for acc in (95.0, 98.0, 100.0)]
+
+    results = await engine.calculate(osu_file_path, scores)
+
+    assert results == calculate_performances(osu_file_path, scores)
+    assert results[-1]["performance"]["pp"] > results[0]["performance"]["pp"]
+
+
+async def test_engine_propagates_errors(engine, tmp_path):
+    with pytest.raises(Exception):
+        await engine.calculate(str(tmp_path / "missing.osu"), [ScoreParams(mode=0)])
+
+    # the failed calculation must not leak its slot
+    assert engine._slots is not None
+    assert engine._slots._value == engine.max_workers + engine.max_queue_size
+
+
+async def test_engine_backpressure(engine, osu_file_path):
+    capacity = engine.max_workers + engine.max_queue_size
+    results = await asyncio.gather(
+        *[
+            engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+            for _ in range(capacity * 4)
+        ],
+    )
+
+    assert len(results) == capacity * 4
+    assert engine.pending == 0
+    assert engine._slots is not None
+    assert engine._slots._value == capacity
+
+
+async def test_engine_timeout_releases_slot_once_finished(osu_file_path):
+    # spawning the worker alone takes far longer than this
+    engine = PerformanceEngine(max_workers=1, max_queue_size=0, timeout=0.001)
+    try:
+        with pytest.raises(TimeoutError):
+            await engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+
+        assert engine.pending == 0
+
+        # the slot is held until the calculation actually finishes
+        engine.timeout = 30
+        results = await engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+        assert results[0]["performance"]["pp"] > 0
+    finally:
+        engine.shutdown()
+
+
+def make_score() -> Score:
+    score = Score()
+    score.mode = GameMode.VANILLA_OSU
+    score.mods = Mods.NOMOD
+    score.max_combo = 4
+    score.n300 = 4
+    score.n100 = score.n50 = score.nmiss = score.ngeki = score.nkatu = 0
+    return score
+
+
+async def test_submission_survives_saturated_engine(
+    monkeypatch,
+    osu_file_path,
+):
+    engine = PerformanceEngine(max_workers=1, max_queue_size=0, timeout=0.001)
+    monkeypatch.setattr(performance, "engine", engine)
+    monkeypatch.setattr(
+        app.objects.score,
+        "BEATMAPS_PATH",
+        Path(osu_file_path).parent,
+    )
+    try:
+        # the only slot is still held by this (timed out) calculation
+        with pytest.raises(TimeoutError):
+            await engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+
+        pp, stars = await make_score().calculate_performance(beatmap_id=1)
+
+        assert pp > 0
+        assert stars > 0
+    finally:
+        engine.shutdown()
+
+
+class BrokenExecutor(Executor):
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+
+async def test_engine_replaces_broken_pool(engine, osu_file_path):
+    engine._start()
+    engine._pool = BrokenExecutor()  # type: ignore[assignment]
+
+    with pytest.raises(BrokenProcessPool):
+        await engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+
+    assert engine._pool is None
+    assert engine._slots is not None
+    assert engine._slots._value == engine.max_workers + engine.max_queue_size
+
+    results = await engine.calculate(osu_file_path, [ScoreParams(mode=0)])
+    assert results[0]["performance"]["pp"] > 0
+
+
+def test_difficulty_is_cached_per_mode_and_mods(osu_file_path):
+    performance._difficulties.clear()
+
+    for _ in range(2):
+        results = calculate_performances(
+            osu_file_path,
+            [
+                ScoreParams(mode=0, mods=0, acc=95.0),
+                ScoreParams(mode=0, mods=0, acc=100.0),
+                ScoreParams(mode=0, mods=64, acc=100.0),
+                ScoreParams(mode=1, mods=0, acc=100.0),
+            ],
+        )
+
+    assert len(performance._difficulties) == 3
+
+    # reusing difficulty attributes mustn't change the result
+    uncached = Calculator(mode=0, mods=64, acc=100.0).performance(
+        Beatmap(path=osu_file_path),
+    )
+    assert results[2]["performance"]["pp"] == round(uncached.pp, 3)
+    assert results[2]["difficulty"]["stars"] == uncached.difficulty.stars
+
+
+def test_rewritten_beatmap_is_reparsed(osu_file_path):
+    before = calculate_performances(osu_file_path, [ScoreParams(mode=0)])
+
+    # drop the last two circles from the map
+    with open(osu_file_path, "w") as f:
+        f.write(OSU_FILE.rsplit("\n", 3)[0] + "\n")
+
+    after = calculate_performances(osu_file_path, [ScoreParams(mode=0)])
+    assert after[0]["performance"]["pp"] < before[0]["performance"]["pp"]
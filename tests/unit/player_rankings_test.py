@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import pytest
+
+from app.constants.gamemodes import GameMode
+from app.usecases import player_rankings
+from app.usecases.player_rankings import Ranks
+from tests.conftest import FakeRedis
+
+
+@pytest.fixture(autouse=True)
+def clear_memo() -> None:
+    player_rankings._memo.clear()
+
+
+async def test_ranks_are_fetched_in_one_round_trip(redis: FakeRedis):
+    for mode in GameMode:
+        redis._zadd(player_rankings.make_key(mode), {"3": 100, "4": 200})
+        redis._zadd(player_rankings.make_key(mode, "ca"), {"3": 100})
+
+    ranks = await player_rankings.fetch(3, "ca")
+
+    assert redis.round_trips == 1
+    assert ranks == {mode: Ranks(global_rank=2, country_rank=1) for mode in GameMode}
+
+    # the same reads made one at a time, as they used to be
+    redis.round_trips = 0
+    for mode in GameMode:
+        await redis.zrevrank(player_rankings.make_key(mode), "3")
+        await redis.zrevrank(player_rankings.make_key(mode, "ca"), "3")
+    assert redis.round_trips == 2 * len(GameMode)
+
+
+async def test_repeated_reads_are_memoized(redis: FakeRedis):
+    await player_rankings.fetch(3, "ca", (GameMode.VANILLA_OSU,))
+    await player_rankings.fetch(3, "ca", (GameMode.VANILLA_OSU,))
+    assert redis.round_trips == 1
+
+    # only the modes which aren't memoized are read
+    ranks = await player_rankings.fetch(
+        3,
+        "ca",
+        (GameMode.VANILLA_OSU, GameMode.RELAX_OSU),
+    )
+    assert redis.round_trips == 2
+    assert list(ranks) == [GameMode.VANILLA_OSU, GameMode.RELAX_OSU]
+
+
+async def test_update_returns_new_ranks(redis: FakeRedis):
+    redis._zadd(player_rankings.make_key(GameMode.VANILLA_OSU), {"4": 200})
+    assert (await player_rankings.fetch(3, "ca"))[GameMode.VANILLA_OSU] == Ranks()
+
+    ranks = await player_rankings.update(3, "ca", {GameMode.VANILLA_OSU: 300})
+    assert redis.round_trips == 2
+    assert ranks[GameMode.VANILLA_OSU] == Ranks(global_rank=1, country_rank=1)
+
+    # the update replaced the memoized (unranked) ranks
+    ranks = await player_rankings.fetch(3, "ca", (GameMode.VANILLA_OSU,))
+    assert redis.round_trips == 2
+    assert ranks[GameMode.VANILLA_OSU] == Ranks(global_rank=1, country_rank=1)
+
+    await player_rankings.remove(3, "ca")
+    ranks = await player_rankings.fetch(3, "ca", (GameMode.VANILLA_OSU,))
+    assert redis.round_trips == 4
+    assert ranks[GameMode.VANILLA_OSU] == Ranks()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import app.packets
+from app.constants.privileges import Privileges
+from app.objects.player import SPECTATOR_FRAME_BUFFER_SIZE
+from app.objects.player import Player
+from app.packets import ReplayAction
+from app.packets import ReplayFrameBundle
+
+
+def make_player(id: int) -> Player:
+    return Player(
+        id=id,
+        name=f"player {id}",
+        priv=Privileges.UNRESTRICTED,
+        pw_bcrypt=None,
+        token=Player.generate_token(),
+    )
+
+
+def make_bundle(
+    sequence: int,
+    action: ReplayAction = ReplayAction.Standard,
+) -> ReplayFrameBundle:
+    raw_data = memoryview(sequence.to_bytes(4, "little") * 8)
+    return ReplayFrameBundle([], None, action, 0, sequence, raw_data)  # type: ignore[arg-type]
+
+
+def frames_of(*bundles: ReplayFrameBundle) -> bytes:
+    return b"".join(app.packets.spectate_frames(b.raw_data) for b in bundles)
+
+
+def spectate(host: Player, spectator: Player) -> None:
+    host.add_spectator(spectator)
+    host.dequeue()
+    spectator.dequeue()
+
+
+def test_relay_shares_one_buffer():
+    host = make_player(1)
+    spectators = [make_player(2), make_player(3)]
+    for spectator in spectators:
+        spectate(host, spectator)
+
+    bundle = make_bundle(1)
+    host.relay_spectator_frames(bundle)
+
+    first, second = (spectator._packet_queue[-1] for spectator in spectators)
+    assert first is second
+    assert first == frames_of(bundle)
+
+
+def test_enqueue_copies_mutable_buffers():
+    player = make_player(1)
+    player.dequeue()
+
+    data = bytearray(b"\x05\x00\x00\x04\x00\x00\x00\x01\x00\x00\x00")
+    player.enqueue(data)
+    data[:] = b"\x00" * len(data)
+
+    assert player.dequeue() == b"\x05\x00\x00\x04\x00\x00\x00\x01\x00\x00\x00"
+
+
+def test_late_spectator_catches_up():
+    host = make_player(1)
+    spectate(host, make_player(2))
+
+    bundles = [make_bundle(i) for i in range(3)]
+    for bundle in bundles:
+        host.relay_spectator_frames(bundle)
+
+    late = make_player(3)
+    host.add_spectator(late)
+
+    assert late.dequeue().endswith(frames_of(*bundles))  # type: ignore[union-attr]
+
+
+def test_catch_up_is_bounded_to_current_play():
+    host = make_player(1)
+    spectate(host, make_player(2))
+
+    host.relay_spectator_frames(make_bundle(0))
+    new_song = make_bundle(1, ReplayAction.NewSong)
+    host.relay_spectator_frames(new_song)
+    bundles = [make_bundle(i) for i in range(2, SPECTATOR_FRAME_BUFFER_SIZE + 5)]
+    for bundle in bundles:
+        host.relay_spectator_frames(bundle)
+
+    assert list(host._spectator_frames) == [
+        frames_of(bundle) for bundle in bundles[-SPECTATOR_FRAME_BUFFER_SIZE:]
+    ]
+
+    host.relay_spectator_frames(make_bundle(100, ReplayAction.SongSelect))
+
+    late = make_player(3)
+    host.add_spectator(late)
+    assert frames_of(bundles[-1]) not in late.dequeue()  # type: ignore[operator]
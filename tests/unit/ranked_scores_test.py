@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import gc
+import random
+
+from app.constants.gamemodes import GameMode
+from app.usecases.ranked_scores import TOP_SCORES_LIMIT
+from app.usecases.ranked_scores import RankedScores
+from app.usecases.ranked_scores import _get_lock
+from app.usecases.ranked_scores import _locks
+
+
+def full_totals(scores: list[tuple[float, float, int]]) -> tuple[int, float]:
+    """The totals as calculated from every best score, for comparison."""
+    scores = sorted(scores, key=lambda s: -s[0])
+
+    weighted_acc = sum(acc * 0.95**i for i, (_, acc, _) in enumerate(scores))
+    bonus_acc = 100.0 / (20 * (1 - 0.95 ** len(scores)))
+
+    weighted_pp = sum(pp * 0.95**i for i, (pp, _, _) in enumerate(scores))
+    bonus_pp = 416.6667 * (1 - 0.9994 ** len(scores))
+
+    return round(weighted_pp + bonus_pp), (weighted_acc * bonus_acc) / 100
+
+
+def make_scores(num_scores: int) -> list[tuple[float, float, int]]:
+    return [
+        (round(random.uniform(1, 800), 3), round(random.uniform(80, 100), 3), i)
+        for i in range(num_scores)
+    ]
+
+
+def test_totals_match_full_calculation():
+    scores = make_scores(3000)
+    rows = [
+        {"pp": pp, "acc": acc, "id": id}
+        for pp, acc, id in sorted(scores, key=lambda s: -s[0])
+    ]
+
+    ranked_scores = RankedScores.from_rows(len(scores), rows)
+    assert len(ranked_scores.top_scores) == TOP_SCORES_LIMIT
+
+    pp, acc = full_totals(scores)
+    assert ranked_scores.pp == pp
+    assert abs(ranked_scores.acc - acc) < 1e-9
+
+
+def test_replace_best_matches_full_calculation():
+    scores = {id: (pp, acc, id) for pp, acc, id in make_scores(1500)}
+    ranked_scores = RankedScores.from_rows(
+        len(scores),
+        [
+            {"pp": pp, "acc": acc, "id": id}
+            for pp, acc, id in sorted(scores.values(), key=lambda s: -s[0])
+        ],
+    )
+
+    next_id = len(scores)
+    for _ in range(500):
+        if random.random() < 0.5:
+            # improve on an existing best score
+            prev_best_id = random.choice(list(scores))
+            new_pp = scores.pop(prev_best_id)[0] + random.uniform(0, 50)
+        else:
+            # first score on a new map
+            prev_best_id = None
+            new_pp = random.uniform(1, 800)
+
+        new_acc = random.uniform(80, 100)
+        scores[next_id] = (new_pp, new_acc, next_id)
+        ranked_scores.replace_best(next_id, new_pp, new_acc, prev_best_id)
+        next_id += 1
+
+    assert ranked_scores.count == len(scores)
+    top_scores = sorted(scores.values(), key=lambda s: -s[0])[:TOP_SCORES_LIMIT]
+    assert ranked_scores.top_scores == top_scores
+
+    pp, acc = full_totals(list(scores.values()))
+    assert ranked_scores.pp == pp
+    assert abs(ranked_scores.acc - acc) < 1e-9
+
+
+def test_serialization_roundtrip():
+    ranked_scores = RankedScores(
+        count=3,
+        top_scores=[(300.5, 99.1, 3), (200.25, 98.0, 1)],
+        generation=7,
+    )
+    assert RankedScores.deserialize(ranked_scores.serialize()) == ranked_scores
+
+
+def test_no_ranked_scores():
+    assert RankedScores().pp == 0
+    assert RankedScores().acc == 0.0
+
+
+async def test_locks_are_dropped_once_unused():
+    lock = _get_lock(1, GameMode.VANILLA_OSU)
+    async with lock:
+        assert _get_lock(1, GameMode.VANILLA_OSU) is lock
+        assert _get_lock(1, GameMode.RELAX_OSU) is not lock
+
+    del lock
+    gc.collect()
+
+    assert (1, GameMode.VANILLA_OSU) not in _locks
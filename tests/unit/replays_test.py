@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from app.usecases import replays
+
+
+def test_sequential_replays_are_spread_across_shards(tmp_path: Path):
+    shards = {replays.get_path(score_id, tmp_path).parent for score_id in range(1024)}
+    assert len(shards) == 1024
+
+    # shards are only ever two levels deep
+    path = replays.get_path(2**40 + 12345, tmp_path)
+    assert path.relative_to(tmp_path).parts == ("39", "30", f"{2**40 + 12345}.osr")
+
+
+async def test_save_and_read(tmp_path: Path):
+    await replays.save(1000, b"replay frames", tmp_path)
+
+    path = await replays.find(1000, tmp_path)
+    assert path == replays.get_path(1000, tmp_path)
+    assert path.read_bytes() == b"replay frames"
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+async def test_unmigrated_replays_are_found(tmp_path: Path):
+    replays.get_legacy_path(1000, tmp_path).write_bytes(b"replay frames")
+
+    path = await replays.find(1000, tmp_path)
+    assert path == replays.get_legacy_path(1000, tmp_path)
+    assert await replays.find(1001, tmp_path) is None
+
+
+async def test_iter_chunks(tmp_path: Path):
+    replay_data = bytes(range(256)) * 10
+    await replays.save(1000, replay_data, tmp_path)
+
+    chunks = [
+        chunk
+        async for chunk in replays.iter_chunks(
+            replays.get_path(1000, tmp_path),
+            chunk_size=1000,
+        )
+    ]
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 560]
+    assert b"".join(chunks) == replay_data
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.usecases.write_behind import WriteBehindPipeline
+from tests.conftest import FakeDatabase
+
+
+async def test_jobs_run_in_the_background():
+    pipeline = WriteBehindPipeline(max_workers=2, max_queue_size=8, flush_interval=60)
+    release = asyncio.Event()
+    finished: list[int] = []
+
+    async def job(i: int) -> None:
+        await release.wait()
+        finished.append(i)
+
+    for i in range(4):
+        await pipeline.submit("test", lambda i=i: job(i))
+
+    # submission doesn't wait for the jobs
+    assert finished == []
+
+    release.set()
+    await pipeline.shutdown()
+    assert sorted(finished) == [0, 1, 2, 3]
+
+
+async def test_jobs_run_inline_when_queue_is_full():
+    pipeline = WriteBehindPipeline(max_workers=1, max_queue_size=1, flush_interval=60)
+    release = asyncio.Event()
+    finished: list[str] = []
+
+    async def blocked_job() -> None:
+        await release.wait()
+        finished.append("blocked")
+
+    async def job() -> None:
+        finished.append("inline")
+
+    await pipeline.submit("test", blocked_job)
+    await asyncio.sleep(0)  # let the worker take the first job
+    await pipeline.submit("test", blocked_job)  # fills the queue
+
+    await pipeline.submit("test", job)
+    assert finished == ["inline"]
+
+    release.set()
+    await pipeline.shutdown()
+
+
+async def test_failed_jobs_dont_stop_workers():
+    pipeline = WriteBehindPipeline(max_workers=1, max_queue_size=8, flush_interval=60)
+    finished: list[int] = []
+
+    async def failing_job() -> None:
+        raise RuntimeError("failed")
+
+    async def job() -> None:
+        finished.append(1)
+
+    await pipeline.submit("test", failing_job)
+    await pipeline.submit("test", job)
+
+    await pipeline.shutdown()
+    assert finished == [1]
+
+
+async def test_map_plays_are_aggregated(database: FakeDatabase):
+    pipeline = WriteBehindPipeline(max_workers=1, max_queue_size=8, flush_interval=60)
+
+    for passed in (True, False, True):
+        pipeline.add_map_play("a" * 32, passed)
+    pipeline.add_map_play("b" * 32, False)
+
+    await pipeline.shutdown()
+
+    assert database.batches == [
+        [
+            {"plays": 3, "passes": 2, "map_md5": "a" * 32},
+            {"plays": 1, "passes": 0, "map_md5": "b" * 32},
+        ],
+    ]
+
+
+async def test_failed_map_plays_flush_is_retried_once(database: FakeDatabase):
+    pipeline = WriteBehindPipeline(max_workers=1, max_queue_size=8, flush_interval=60)
+
+    pipeline.add_map_play("a" * 32, True)
+    pipeline.add_map_play("b" * 32, False)
+
+    # the first map's counts are written before the flush fails
+    database.fail_after = 1
+    with pytest.raises(ConnectionError):
+        await pipeline.flush_map_plays()
+
+    pipeline.add_map_play("a" * 32, False)
+
+    database.fail_after = None
+    await pipeline.shutdown()
+
+    assert database.plays == {"a" * 32: [2, 1], "b" * 32: [1, 0]}
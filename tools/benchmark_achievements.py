@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.11
+"""\
+Benchmark evaluating the achievements in migrations/base.sql against
+random scores; re-evaluating every condition from source per score, as
+the server used to, against the compiled & indexed achievement engine.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections.abc import Callable
+from collections.abc import Sequence
+from types import SimpleNamespace
+from typing import Any
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    from app.constants.gamemodes import GameMode
+    from app.repositories.achievements import Achievement
+    from app.usecases.achievement_engine import AchievementEngine
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+def load_achievements() -> list[Achievement]:
+    achievements: list[Achievement] = []
+    with open("migrations/base.sql") as f:
+        for line in f:
+            match = re.match(
+                r"insert into achievements .* values \((\d+), '([^']+)', .*, '([^']+)'\);$",
+                line,
+            )
+            if match is not None:
+                achievements.append(
+                    {
+                        "id": int(match[1]),
+                        "file": match[2],
+                        "name": match[2],
+                        "desc": "",
+                        "cond": match[3],
+                    },
+                )
+
+    return achievements
+
+
+def make_scores(num_scores: int) -> list[Any]:
+    rng = random.Random(0)
+    return [
+        SimpleNamespace(
+            mode=rng.choice(list(GameMode)),
+            mods=rng.choice([0, 8, 16, 24, 64, 72, 1024]),
+            sr=rng.uniform(0, 10),
+            max_combo=rng.randrange(0, 3000),
+            perfect=rng.random() < 0.2,
+        )
+        for _ in range(num_scores)
+    ]
+
+
+def measure(name: str, scores: list[Any], func: Callable[[Any], object]) -> None:
+    started_at = time.perf_counter()
+    for score in scores:
+        func(score)
+    elapsed = time.perf_counter() - started_at
+
+    print(f"{name:<12} {len(scores) / elapsed:>12,.0f} evaluations/s")
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--scores", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    achievements = load_achievements()
+    scores = make_scores(args.scores)
+
+    def evaluate_from_source(score: Any) -> list[int]:
+        mode_vn = score.mode.as_vanilla
+        return [
+            a["id"]
+            for a in achievements
+            if eval(f"lambda score, mode_vn: {a['cond']}")(score, mode_vn)
+        ]
+
+    engine = AchievementEngine()
+    engine.load(achievements)
+    compiled = list(engine.achievements.values())
+
+    def evaluate_compiled(score: Any) -> list[int]:
+        mode_vn = score.mode.as_vanilla
+        return [a.id for a in compiled if a.check(score, mode_vn)]
+
+    print(f"{len(achievements)} achievements, {len(scores):,} scores")
+    measure("from source", scores, evaluate_from_source)
+    measure("compiled", scores, evaluate_compiled)
+    measure("indexed", scores, engine.evaluate)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3.11
+"""\
+Benchmark resolving beatmap info for a library of filenames (as sent
+to /web/osu-getbeatmapinfo.php) per map, against the bulk resolver.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections.abc import Sequence
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    import app.state.services
+    from app.api.domains.osu import resolve_beatmap_info
+    from app.constants.gamemodes import GameMode
+    from app.objects.score import SubmissionStatus
+    from app.repositories import maps as maps_repo
+    from app.repositories import scores as scores_repo
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+async def resolve_per_map(filenames: list[str], user_id: int) -> None:
+    """The previous implementation; two queries per map."""
+    for map_filename in filenames:
+        beatmap = await maps_repo.fetch_one(filename=map_filename)
+        if not beatmap:
+            continue
+
+        await scores_repo.fetch_many(
+            map_md5=beatmap["md5"],
+            user_id=user_id,
+            mode=GameMode.VANILLA_OSU,
+            status=SubmissionStatus.BEST,
+        )
+
+
+async def resolve_in_bulk(filenames: list[str], user_id: int) -> None:
+    player = SimpleNamespace(id=user_id, status=SimpleNamespace(mode=GameMode(0)))
+    async for _ in resolve_beatmap_info(filenames, player):  # type: ignore[arg-type]
+        pass
+
+
+async def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--filenames", type=int, default=2000)
+    parser.add_argument("-u", "--user-id", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    await app.state.services.database.connect()
+
+    rows = await app.state.services.database.fetch_all(
+        "SELECT filename FROM maps ORDER BY RAND() LIMIT :limit",
+        {"limit": args.filenames},
+    )
+    filenames = [row["filename"] for row in rows]
+
+    for name, resolve in (("per map", resolve_per_map), ("bulk", resolve_in_bulk)):
+        started_at = time.perf_counter()
+        await resolve(filenames, args.user_id)
+        elapsed = time.perf_counter() - started_at
+        print(f"{name:<8} {len(filenames):,} filenames in {elapsed * 1000:,.1f}ms")
+
+    await app.state.services.database.disconnect()
+    await app.state.services.http_client.aclose()
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3.11
+"""Benchmark operations on the online players collection as it grows."""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import timeit
+from collections.abc import Sequence
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    import app.packets
+    from app.constants.gamemodes import GameMode
+    from app.constants.privileges import Privileges
+    from app.objects.collections import Players
+    from app.objects.player import ModeData
+    from app.objects.player import Player
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+def make_player(id: int) -> Player:
+    return Player(
+        id=id,
+        name=f"player {id}",
+        priv=Privileges.UNRESTRICTED,
+        pw_bcrypt=None,
+        token=Player.generate_token(),
+        irc_key=f"irc-{id}",
+    )
+
+
+def make_online_player(id: int) -> Player:
+    player = make_player(id)
+    player.stats[GameMode.VANILLA_OSU] = ModeData(
+        tscore=0,
+        rscore=0,
+        pp=id,
+        acc=100.0,
+        plays=0,
+        playtime=0,
+        max_combo=0,
+        total_hits=0,
+        rank=id,
+        grades={},
+    )
+    return player
+
+
+def make_players(n: int) -> Players:
+    players = Players()
+    for i in range(n):
+        players.append(make_player(i + 1))
+    return players
+
+
+def benchmark_lookups(sizes: Sequence[int]) -> None:
+    """Time looking up the last player to log in, by each key."""
+    for n in sizes:
+        players = make_players(n)
+        target = players[-1]
+
+        for key, kwargs in (
+            ("token", {"token": target.token}),
+            ("id", {"id": target.id}),
+            ("name", {"name": target.name}),
+            ("irc key", {"irc_key": target.irc_key}),
+        ):
+            elapsed = min(
+                timeit.repeat(lambda: players.get(**kwargs), number=1000, repeat=5),
+            )
+            print(f"get({key}) @ {n:>6,} online: {elapsed * 1e3:>8.3f}us/lookup")
+
+
+def benchmark_broadcasts(sizes: Sequence[int]) -> None:
+    """Time broadcasting small & large packets to all online players."""
+    for n in sizes:
+        players = make_players(n)
+
+        for payload_size in (64, 64 * 1024):
+            payload = b"\x00" * payload_size
+
+            def broadcast() -> None:
+                players.enqueue(payload)
+                for player in players:
+                    player._packet_queue.clear()
+
+            elapsed = min(timeit.repeat(broadcast, number=5, repeat=3)) / 5
+            print(
+                f"enqueue({payload_size:>6,}B) @ {n:>6,} online: "
+                f"{elapsed * 1e3:>8.3f}ms/broadcast",
+            )
+
+
+def benchmark_logins(sizes: Sequence[int], logins: int = 200) -> None:
+    """\
+    Time the roster part of logins during a login storm, against
+    re-serializing every online player for each login.
+    """
+    for n in sizes:
+        players = Players()
+        for i in range(n):
+            players.append(make_online_player(i + 1))
+
+        timings = []
+        for i in range(logins):
+            player = make_online_player(n + i + 1)
+            started_at = time.perf_counter()
+
+            user_data = app.packets.user_presence(player)
+            user_data += app.packets.user_stats(player)
+            players.enqueue(user_data)
+            data = bytearray(user_data)
+            data += players.roster
+            players.append(player)
+
+            timings.append(time.perf_counter() - started_at)
+
+            for other in players:
+                other._packet_queue.clear()
+                other._coalesced.clear()
+
+        quantiles = statistics.quantiles(timings, n=100)
+
+        online = list(players)
+
+        def serialize_roster() -> bytes:
+            for player in online:
+                player._stats_packet = player._presence_packet = None
+            return b"".join(
+                app.packets.user_presence(p) + app.packets.user_stats(p)
+                for p in online
+            )
+
+        naive = min(timeit.repeat(serialize_roster, number=1, repeat=3))
+
+        print(
+            f"login @ {n:>6,} online: p50 {quantiles[49] * 1e6:,.1f}us, "
+            f"p99 {quantiles[98] * 1e6:,.1f}us "
+            f"(re-serializing: {naive * 1e6:,.1f}us)",
+        )
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--online",
+        help="Numbers of online players to benchmark with",
+        type=int,
+        nargs="+",
+        default=[10, 1_000, 10_000],
+    )
+    args = parser.parse_args(argv)
+
+    benchmark_lookups(args.online)
+    benchmark_broadcasts(args.online)
+    benchmark_logins(args.online)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
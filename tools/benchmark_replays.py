@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.11
+"""\
+Benchmark replay writes & reads through the replay store, against
+blocking writes on the event loop into a single flat directory.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Sequence
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    from app.usecases import replays
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+async def measure(
+    name: str,
+    num_replays: int,
+    concurrency: int,
+    func: Callable[[int], Awaitable[object]],
+) -> None:
+    """Run `func` for each score id, while measuring how long the loop stalls."""
+    max_stall = 0.0
+    done = False
+
+    async def watch_loop() -> None:
+        nonlocal max_stall
+        while not done:
+            started_at = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, time.perf_counter() - started_at - 0.001)
+
+    async def worker(score_ids: range) -> None:
+        for score_id in score_ids:
+            await func(score_id)
+
+    watcher = asyncio.create_task(watch_loop())
+    started_at = time.perf_counter()
+    await asyncio.gather(
+        *[worker(range(i, num_replays, concurrency)) for i in range(concurrency)],
+    )
+    elapsed = time.perf_counter() - started_at
+    done = True
+    await watcher
+
+    print(
+        f"{name:<16} {num_replays / elapsed:>10,.0f} replays/s "
+        f"(max loop stall {max_stall * 1000:,.1f}ms)",
+    )
+
+
+async def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--replays", type=int, default=20_000)
+    parser.add_argument(
+        "-s",
+        "--size",
+        help="Replay size in bytes",
+        type=int,
+        default=100_000,
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    replay_data = os.urandom(args.size)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        flat_path = Path(tmp_dir) / "flat"
+        flat_path.mkdir()
+        sharded_path = Path(tmp_dir) / "sharded"
+
+        async def write_flat(score_id: int) -> None:
+            replays.get_legacy_path(score_id, flat_path).write_bytes(replay_data)
+
+        async def read_flat(score_id: int) -> None:
+            replays.get_legacy_path(score_id, flat_path).read_bytes()
+
+        async def write_store(score_id: int) -> None:
+            await replays.save(score_id, replay_data, sharded_path)
+
+        async def read_store(score_id: int) -> None:
+            path = await replays.find(score_id, sharded_path)
+            assert path is not None
+            async for _ in replays.iter_chunks(path):
+                pass
+
+        n, c = args.replays, args.concurrency
+        await measure("write (on loop)", n, c, write_flat)
+        await measure("write (store)", n, c, write_store)
+        await measure("read (on loop)", n, c, read_flat)
+        await measure("read (store)", n, c, read_store)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
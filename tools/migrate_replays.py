@@ -0,0 +1,66 @@
+#!/usr/bin/env python3.11
+"""Move replays from the flat .data/osr directory into its sharded layout."""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from collections.abc import Sequence
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    from app.usecases import replays
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+def migrate_replays(dry_run: bool) -> int:
+    migrated = 0
+    started_at = time.perf_counter()
+
+    # scandir doesn't read the whole (possibly huge) directory up front
+    with os.scandir(replays.REPLAYS_PATH) as entries:
+        for entry in entries:
+            score_id, ext = os.path.splitext(entry.name)
+            if ext != ".osr" or not score_id.isdigit() or not entry.is_file():
+                continue
+
+            new_path = replays.get_path(int(score_id))
+            if not dry_run:
+                new_path.parent.mkdir(parents=True, exist_ok=True)
+                # a rename within the same filesystem; replays aren't copied
+                os.replace(entry.path, new_path)
+
+            migrated += 1
+            if migrated % 10_000 == 0:
+                rate = migrated / (time.perf_counter() - started_at)
+                print(f"Migrated {migrated:,} replays ({rate:,.0f} replays/s)")
+
+    return migrated
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dry-run",
+        help="Count the replays to migrate without moving them",
+        action="store_true",
+    )
+    args = parser.parse_args(argv)
+
+    migrated = migrate_replays(args.dry_run)
+
+    verb = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{verb} {migrated:,} replays into {replays.REPLAYS_PATH}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.11
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections.abc import Sequence
+
+import databases
+from redis import asyncio as aioredis
+
+sys.path.insert(0, os.path.abspath(os.pardir))
+os.chdir(os.path.abspath(os.pardir))
+
+try:
+    import app.settings
+    from app.constants.gamemodes import GameMode
+    from app.usecases import map_rankings
+except ModuleNotFoundError:
+    print("\x1b[;91mMust run from tools/ directory\x1b[m")
+    raise
+
+
+async def delete_all_rankings(redis: aioredis.Redis) -> int:
+    deleted = 0
+    pattern = f"{map_rankings.KEY_PREFIX}:*"
+    async for key in redis.scan_iter(match=pattern, count=1000):
+        deleted += await redis.delete(key)
+
+    return deleted
+
+
+async def rebuild_rankings(
+    db: databases.Database,
+    redis: aioredis.Redis,
+    batch_size: int,
+) -> int:
+    """Rebuild the rankings of every map from all unrestricted best scores."""
+    last_id = 0
+    rebuilt = 0
+    started_at = time.perf_counter()
+
+    while True:
+        # keyset pagination over the primary key
+        rows = await db.fetch_all(
+            "SELECT s.id, s.map_md5, s.mode, s.userid, s.pp, s.score "
+            "FROM scores s "
+            "INNER JOIN users u ON u.id = s.userid "
+            "WHERE s.id > :last_id AND s.status = 2 AND u.priv & 1 "
+            "ORDER BY s.id LIMIT :limit",
+            {"last_id": last_id, "limit": batch_size},
+        )
+        if not rows:
+            break
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                mode = GameMode(row["mode"])
+                key = map_rankings.make_key(row["map_md5"], mode)
+                pipe.zadd(
+                    key,
+                    {
+                        str(row["userid"]): row[map_rankings.scoring_metric(mode)],
+                        map_rankings.BUILT_SENTINEL: float("-inf"),
+                    },
+                )
+            await pipe.execute()
+
+        last_id = rows[-1]["id"]
+        rebuilt += len(rows)
+
+        rate = rebuilt / (time.perf_counter() - started_at)
+        print(f"Added {rebuilt:,} scores to map rankings ({rate:,.0f} scores/s)")
+
+    return rebuilt
+
+
+async def main(argv: Sequence[str] | None = None) -> int:
+    argv = argv if argv is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the per-map score rankings stored in redis",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        help="Number of scores to read & add at a time",
+        type=int,
+        default=10_000,
+    )
+    args = parser.parse_args(argv)
+
+    db = databases.Database(app.settings.DB_DSN)
+    await db.connect()
+
+    redis = await aioredis.from_url(app.settings.REDIS_DSN)  # type: ignore[no-untyped-call]
+
+    deleted = await delete_all_rankings(redis)
+    print(f"Deleted {deleted:,} existing map rankings")
+
+    await rebuild_rankings(db, redis, args.batch_size)
+
+    await db.disconnect()
+    await redis.aclose()
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -3,21 +3,18 @@ from __future__ import annotations
 
 import argparse
 import asyncio
-import math
+import json
 import os
 import sys
+import time
 from collections.abc import Awaitable
-from collections.abc import Iterator
 from collections.abc import Sequence
 from dataclasses import dataclass
-from dataclasses import field
+from datetime import timedelta
 from pathlib import Path
 from typing import Any
-from typing import TypeVar
 
 import databases
-from akatsuki_pp_py import Beatmap
-from akatsuki_pp_py import Calculator
 from redis import asyncio as aioredis
 
 sys.path.insert(0, os.path.abspath(os.pardir))
@@ -27,96 +24,156 @@ try:
     import app.settings
     import app.state.services
     from app.constants.gamemodes import GameMode
-    from app.constants.mods import Mods
     from app.constants.privileges import Privileges
     from app.objects.beatmap import ensure_osu_file_is_available
+    from app.usecases import map_rankings
+    from app.usecases import player_rankings
+    from app.usecases import ranked_scores
+    from app.usecases.performance import PerformanceEngine
+    from app.usecases.performance import ScoreParams
 except ModuleNotFoundError:
     print("\x1b[;91mMust run from tools/ directory\x1b[m")
     raise
 
-T = TypeVar("T")
-
 debug_mode_enabled = True
 
-DEBUG = True
-
 BEATMAPS_PATH = Path.cwd() / ".data/osu"
+CHECKPOINT_PATH = Path.cwd() / ".data/recalc_checkpoint.json"
 
 
 @dataclass
 class Context:
     database: databases.Database
     redis: aioredis.Redis
-    beatmaps: dict[int, Beatmap] = field(default_factory=dict)
+    engine: PerformanceEngine
 
 
-def divide_chunks(values: list[T], n: int) -> Iterator[list[T]]:
-    for i in range(0, len(values), n):
-        yield values[i : i + n]
-
-async def recalculate_score(
-    score: dict[str, Any],
+async def calculate_map_scores(
+    scores: list[dict[str, Any]],
     beatmap_path: Path,
     ctx: Context,
-) -> None:
-    try:
-        beatmap = ctx.beatmaps.get(score["map_id"])
-        if beatmap is None:
-            beatmap = Beatmap(path=str(beatmap_path))
-            ctx.beatmaps[score["map_id"]] = beatmap
-
-        calculator = Calculator(
-            mode=GameMode(score["mode"]).as_vanilla,
-            mods=score["mods"],
-            combo=score["max_combo"],
-            n_geki=score["ngeki"],  # Mania 320s
-            n300=score["n300"],
-            n_katu=score["nkatu"],  # Mania 200s, Catch tiny droplets
-            n100=score["n100"],
-            n50=score["n50"],
-            n_misses=score["nmiss"],
-        )
-        attrs = calculator.performance(beatmap)
+) -> list[tuple[int, float]]:
+    results = await ctx.engine.calculate(
+        str(beatmap_path),
+        [
+            ScoreParams(
+                mode=GameMode(score["mode"]).as_vanilla,
+                mods=score["mods"],
+                combo=score["max_combo"],
+                ngeki=score["ngeki"],  # Mania 320s
+                n300=score["n300"],
+                nkatu=score["nkatu"],  # Mania 200s, Catch tiny droplets
+                n100=score["n100"],
+                n50=score["n50"],
+                nmiss=score["nmiss"],
+            )
+            for score in scores
+        ],
+    )
 
-        new_pp: float = attrs.pp
-        if math.isnan(new_pp) or math.isinf(new_pp):
-            new_pp = 0.0
-
-        await ctx.database.execute(
-            "UPDATE scores SET pp = :new_pp WHERE id = :id",
-            {"new_pp": new_pp, "id": score["id"]},
-        )
+    new_pps: list[tuple[int, float]] = []
+    for score, result in zip(scores, results):
+        new_pp = result["performance"]["pp"]
+        new_pps.append((score["id"], new_pp))
 
         if debug_mode_enabled:
             print(
                 f"Recalculated score ID {score['id']} ({score['pp']:.3f}pp -> {new_pp:.3f}pp)",
             )
-            
-    except Exception as e:
-        # Log the error and continue processing other scores
-        print(f"Failed to recalculate score ID {score['id']}: {e}")
 
+    return new_pps
+
+
+async def update_score_pps(new_pps: list[tuple[int, float]], ctx: Context) -> None:
+    """Update the pp of many scores in a single statement."""
+    if not new_pps:
+        return
 
-async def process_score_chunk(
-    chunk: list[dict[str, Any]],
+    params: dict[str, Any] = {}
+    for i, (score_id, new_pp) in enumerate(new_pps):
+        params[f"id_{i}"] = score_id
+        params[f"pp_{i}"] = new_pp
+
+    cases = " ".join(f"WHEN :id_{i} THEN :pp_{i}" for i in range(len(new_pps)))
+    ids = ", ".join(f":id_{i}" for i in range(len(new_pps)))
+
+    await ctx.database.execute(
+        f"UPDATE scores SET pp = CASE id {cases} END WHERE id IN ({ids})",
+        params,
+    )
+
+
+def failed_range(scores: list[dict[str, Any]], reason: str) -> dict[str, Any]:
+    """Describe the range of a map's scores which couldn't be recalculated."""
+    print(f"Failed to recalculate scores on map ID {scores[0]['map_id']}: {reason}")
+    return {
+        "map_md5": scores[0]["map_md5"],
+        "map_id": scores[0]["map_id"],
+        "first_score_id": scores[0]["id"],
+        "last_score_id": scores[-1]["id"],
+        "reason": reason,
+    }
+
+
+async def process_score_batch(
+    batch: list[dict[str, Any]],
     ctx: Context,
-) -> None:
-    tasks: list[Awaitable[None]] = []
-    for score in chunk:
+) -> list[dict[str, Any]]:
+    """\
+    Recalculate & update a batch of scores (of a single mode), returning
+    the ranges of scores on any maps which couldn't be recalculated.
+    """
+    # calculate all scores on a map together, so
+    # each map is only parsed once per batch.
+    map_scores: dict[int, list[dict[str, Any]]] = {}
+    for score in batch:
+        map_scores.setdefault(score["map_id"], []).append(score)
+
+    failed: list[dict[str, Any]] = []
+    calculated: list[list[dict[str, Any]]] = []
+    tasks: list[Awaitable[list[tuple[int, float]]]] = []
+    for map_id, scores in map_scores.items():
         osu_file_available = await ensure_osu_file_is_available(
-            score["map_id"],
-            expected_md5=score["map_md5"],
+            map_id,
+            expected_md5=scores[0]["map_md5"],
+        )
+        if not osu_file_available:
+            failed.append(failed_range(scores, ".osu file unavailable"))
+            continue
+
+        calculated.append(scores)
+        tasks.append(
+            calculate_map_scores(
+                scores,
+                BEATMAPS_PATH / f"{map_id}.osu",
+                ctx,
+            ),
+        )
+
+    new_pps: list[tuple[int, float]] = []
+    updated_maps: set[str] = set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for scores, result in zip(calculated, results):
+        if isinstance(result, Exception):
+            failed.append(failed_range(scores, repr(result)))
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            new_pps.extend(result)
+            updated_maps.add(scores[0]["map_md5"])
+
+    async with ctx.database.transaction():
+        await update_score_pps(new_pps, ctx)
+
+    # the rankings of maps scored by pp are
+    # rebuilt from sql by the server on next use.
+    mode = GameMode(batch[0]["mode"])
+    if updated_maps and map_rankings.scoring_metric(mode) == "pp":
+        await ctx.redis.delete(
+            *[map_rankings.make_key(map_md5, mode) for map_md5 in updated_maps],
         )
-        if osu_file_available:
-            tasks.append(
-                recalculate_score(
-                    score,
-                    BEATMAPS_PATH / f"{score['map_id']}.osu",
-                    ctx,
-                ),
-            )
 
-    await asyncio.gather(*tasks)
+    return failed
 
 
 async def recalculate_user(
@@ -124,28 +181,18 @@ async def recalculate_user(
     game_mode: GameMode,
     ctx: Context,
 ) -> None:
-    best_scores = await ctx.database.fetch_all(
-        "SELECT s.pp, s.acc FROM scores s "
-        "INNER JOIN maps m ON s.map_md5 = m.md5 "
-        "WHERE s.userid = :user_id AND s.mode = :mode "
-        "AND s.status = 2 AND m.status IN (2, 3) "  # ranked, approved
-        "ORDER BY s.pp DESC",
-        {"user_id": id, "mode": game_mode},
+    generation = int(await ctx.redis.get(ranked_scores.GENERATION_KEY) or 0)
+    user_ranked_scores = await ranked_scores.fetch_from_sql(
+        id,
+        game_mode,
+        generation,
+        database=ctx.database,
     )
-
-    total_scores = len(best_scores)
-    if not total_scores:
+    if not user_ranked_scores.count:
         return
 
-    # calculate new total weighted accuracy
-    weighted_acc = sum(row["acc"] * 0.95**i for i, row in enumerate(best_scores))
-    bonus_acc = 100.0 / (20 * (1 - 0.95**total_scores))
-    acc = (weighted_acc * bonus_acc) / 100
-
-    # calculate new total weighted pp
-    weighted_pp = sum(row["pp"] * 0.95**i for i, row in enumerate(best_scores))
-    bonus_pp = 416.6667 * (1 - 0.9994**total_scores)
-    pp = round(weighted_pp + bonus_pp)
+    pp = user_ranked_scores.pp
+    acc = user_ranked_scores.acc
 
     await ctx.database.execute(
         "UPDATE stats SET pp = :pp, acc = :acc WHERE id = :id AND mode = :mode",
@@ -159,62 +206,197 @@ async def recalculate_user(
     if user_info is None:
         raise Exception(f"Unknown user ID {id}?")
 
-    if user_info["priv"] & Privileges.UNRESTRICTED:
-        await ctx.redis.zadd(
-            f"bancho:leaderboard:{game_mode.value}",
-            {str(id): pp},
-        )
+    # keep the server's aggregate in sync with the new pp values
+    await ctx.redis.set(
+        ranked_scores.make_key(id, game_mode),
+        user_ranked_scores.serialize(),
+        ex=ranked_scores.RANKED_SCORES_TTL,
+    )
 
-        await ctx.redis.zadd(
-            f"bancho:leaderboard:{game_mode.value}:{user_info['country']}",
-            {str(id): pp},
-        )
+    if user_info["priv"] & Privileges.UNRESTRICTED:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(player_rankings.make_key(game_mode), {str(id): pp})
+            pipe.zadd(
+                player_rankings.make_key(game_mode, user_info["country"]),
+                {str(id): pp},
+            )
+            await pipe.execute()
         
     if debug_mode_enabled:
         print(f"Recalculated user ID {id} ({pp:.3f}pp, {acc:.3f}%)")
 
-async def process_user_chunk(
-    chunk: list[int],
-    game_mode: GameMode,
+async def recalculate_mode_users(mode: GameMode, ctx: Context) -> None:
+    last_id = 0
+    while True:
+        user_ids = [
+            row["id"]
+            for row in await ctx.database.fetch_all(
+                "SELECT id FROM users WHERE id > :last_id ORDER BY id LIMIT 100",
+                {"last_id": last_id},
+            )
+        ]
+        if not user_ids:
+            break
+
+        await asyncio.gather(*[recalculate_user(id, mode, ctx) for id in user_ids])
+        last_id = user_ids[-1]
+
+
+# scores are streamed in (map md5, id) order, which is covered
+# by the scores_map_md5_index (secondary indexes include the id).
+SCORES_QUERY = """\
+    SELECT scores.id, scores.mode, scores.mods, scores.map_md5,
+      scores.pp, scores.acc, scores.max_combo,
+      scores.ngeki, scores.n300, scores.nkatu, scores.n100, scores.n50, scores.nmiss,
+      maps.id as `map_id`
+    FROM scores
+    INNER JOIN maps ON scores.map_md5 = maps.md5
+    WHERE scores.status = 2
+      AND scores.mode = :mode
+      AND (scores.map_md5 > :map_md5 OR (scores.map_md5 = :map_md5 AND scores.id > :score_id))
+    ORDER BY scores.map_md5, scores.id
+    LIMIT :limit
+"""
+
+FAILED_SCORES_QUERY = """\
+    SELECT scores.id, scores.mode, scores.mods, scores.map_md5,
+      scores.pp, scores.acc, scores.max_combo,
+      scores.ngeki, scores.n300, scores.nkatu, scores.n100, scores.n50, scores.nmiss,
+      maps.id as `map_id`
+    FROM scores
+    INNER JOIN maps ON scores.map_md5 = maps.md5
+    WHERE scores.status = 2
+      AND scores.mode = :mode
+      AND scores.map_md5 = :map_md5
+      AND scores.id BETWEEN :first_score_id AND :last_score_id
+    ORDER BY scores.id
+"""
+
+SCORES_COUNT_QUERY = """\
+    SELECT COUNT(*)
+    FROM scores
+    INNER JOIN maps ON scores.map_md5 = maps.md5
+    WHERE scores.status = 2
+      AND scores.mode = :mode
+      AND (scores.map_md5 > :map_md5 OR (scores.map_md5 = :map_md5 AND scores.id > :score_id))
+"""
+
+
+def load_checkpoint() -> dict[str, Any]:
+    if not CHECKPOINT_PATH.exists():
+        return {}
+
+    return json.loads(CHECKPOINT_PATH.read_text())
+
+
+def save_checkpoint(checkpoint: dict[str, Any]) -> None:
+    # write to a temporary file first so
+    # an interruption can't corrupt it.
+    temp_path = CHECKPOINT_PATH.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(checkpoint))
+    temp_path.replace(CHECKPOINT_PATH)
+
+
+def format_eta(seconds: float) -> str:
+    return str(timedelta(seconds=round(seconds)))
+
+
+async def invalidate_ranked_scores(ctx: Context) -> None:
+    # players' ranked scores cached in redis still have the old
+    # pp values; the server reads them from sql again on next use.
+    await ctx.redis.incr(ranked_scores.GENERATION_KEY)
+
+
+async def recalculate_mode_scores(
+    mode: GameMode,
     ctx: Context,
-) -> None:
-    tasks: list[Awaitable[None]] = []
-    for id in chunk:
-        tasks.append(recalculate_user(id, game_mode, ctx))
-
-    await asyncio.gather(*tasks)
+    checkpoint: dict[str, Any],
+    batch_size: int,
+) -> bool:
+    """\
+    Recalculate the pp of a mode's best scores, retrying the ranges which
+    previously failed first; returns whether every score was recalculated.
+    """
+    progress = checkpoint.setdefault(
+        str(mode.value),
+        {"map_md5": "", "score_id": 0, "done": False, "failed": []},
+    )
 
+    failed: list[dict[str, Any]] = []
+    for failure in progress.get("failed", []):
+        print(f"{mode!r}: retrying scores on map ID {failure['map_id']}")
+        batch = [
+            dict(row)
+            for row in await ctx.database.fetch_all(
+                FAILED_SCORES_QUERY,
+                {
+                    "mode": mode,
+                    "map_md5": failure["map_md5"],
+                    "first_score_id": failure["first_score_id"],
+                    "last_score_id": failure["last_score_id"],
+                },
+            )
+        ]
+        if batch:
+            failed.extend(await process_score_batch(batch, ctx))
+
+    progress["failed"] = failed
+    save_checkpoint(checkpoint)
+
+    if progress["done"]:
+        print(f"Scores for {mode!r} already recalculated, skipping")
+        await invalidate_ranked_scores(ctx)
+        return not progress["failed"]
+
+    remaining = await ctx.database.fetch_val(
+        SCORES_COUNT_QUERY,
+        {
+            "mode": mode,
+            "map_md5": progress["map_md5"],
+            "score_id": progress["score_id"],
+        },
+    )
 
-async def recalculate_mode_users(mode: GameMode, ctx: Context) -> None:
-    user_ids = [
-        row["id"] for row in await ctx.database.fetch_all("SELECT id FROM users")
-    ]
-
-    for id_chunk in divide_chunks(user_ids, 100):
-        await process_user_chunk(id_chunk, mode, ctx)
-
-
-async def recalculate_mode_scores(mode: GameMode, ctx: Context) -> None:
-    scores = [
-        dict(row)
-        for row in await ctx.database.fetch_all(
-            """\
-            SELECT scores.id, scores.mode, scores.mods, scores.map_md5,
-              scores.pp, scores.acc, scores.max_combo,
-              scores.ngeki, scores.n300, scores.nkatu, scores.n100, scores.n50, scores.nmiss,
-              maps.id as `map_id`
-            FROM scores
-            INNER JOIN maps ON scores.map_md5 = maps.md5
-            WHERE scores.status = 2
-              AND scores.mode = :mode
-            ORDER BY scores.pp DESC
-            """,
-            {"mode": mode},
+    recalculated = 0
+    started_at = time.perf_counter()
+
+    while True:
+        batch = [
+            dict(row)
+            for row in await ctx.database.fetch_all(
+                SCORES_QUERY,
+                {
+                    "mode": mode,
+                    "map_md5": progress["map_md5"],
+                    "score_id": progress["score_id"],
+                    "limit": batch_size,
+                },
+            )
+        ]
+        if not batch:
+            break
+
+        # maps which failed are recorded, to be retried on --resume
+        progress["failed"].extend(await process_score_batch(batch, ctx))
+
+        # only advance the checkpoint once the batch has been committed
+        progress["map_md5"] = batch[-1]["map_md5"]
+        progress["score_id"] = batch[-1]["id"]
+        save_checkpoint(checkpoint)
+
+        recalculated += len(batch)
+        rate = recalculated / (time.perf_counter() - started_at)
+        eta = max(remaining - recalculated, 0) / rate
+        print(
+            f"{mode!r}: {recalculated:,}/{remaining:,} scores "
+            f"({rate:,.0f} scores/s, ETA {format_eta(eta)})",
         )
-    ]
 
-    for score_chunk in divide_chunks(scores, 100):
-        await process_score_chunk(score_chunk, ctx)
+    progress["done"] = True
+    save_checkpoint(checkpoint)
+
+    await invalidate_ranked_scores(ctx)
+    return not progress["failed"]
 
 
 async def main(argv: Sequence[str] | None = None) -> int:
@@ -230,6 +412,34 @@ async def main(argv: Sequence[str] | None = None) -> int:
         help="Enable debug logging",
         action="store_true",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes to calculate performance with",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--timeout",
+        help="Seconds to wait for each map's scores to be calculated",
+        type=float,
+        default=60.0,
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        help="Number of scores to recalculate & update at a time",
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        "--resume",
+        help=(
+            "Resume score recalculation from the last checkpoint, "
+            "retrying any maps which failed"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--no-scores",
         help="Disable recalculating scores",
@@ -260,22 +470,47 @@ async def main(argv: Sequence[str] | None = None) -> int:
 
     redis = await aioredis.from_url(app.settings.REDIS_DSN)  # type: ignore[no-untyped-call]
 
-    ctx = Context(db, redis)
+    engine = PerformanceEngine(
+        max_workers=args.jobs,
+        max_queue_size=args.jobs * 4,
+        timeout=args.timeout,
+    )
+
+    ctx = Context(db, redis, engine)
+
+    checkpoint = load_checkpoint() if args.resume else {}
+    succeeded = True
 
     for mode in args.mode:
         mode = GameMode(int(mode))
 
         if not args.no_scores:
-            await recalculate_mode_scores(mode, ctx)
+            if not await recalculate_mode_scores(
+                mode,
+                ctx,
+                checkpoint,
+                args.batch_size,
+            ):
+                succeeded = False
 
         if not args.no_stats:
             await recalculate_mode_users(mode, ctx)
 
+    if succeeded:
+        # every requested mode is done; start over next time
+        CHECKPOINT_PATH.unlink(missing_ok=True)
+    else:
+        print(
+            f"Some scores couldn't be recalculated; see {CHECKPOINT_PATH} "
+            "and retry them with --resume",
+        )
+
+    engine.shutdown()
     await app.state.services.http_client.aclose()
     await db.disconnect()
     await redis.aclose()
 
-    return 0
+    return 0 if succeeded else 1
 
 
 if __name__ == "__main__":